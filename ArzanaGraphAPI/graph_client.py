@@ -0,0 +1,183 @@
+"""
+Throttled Microsoft Graph requests for the monitor
+Every Graph call goes through graph_request, which keeps the monitor inside the
+per-mailbox limits (concurrent requests and request rate) and retries throttled
+calls after the Retry-After delay Graph sends back.
+"""
+
+import time
+import random
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+import requests
+
+# Graph allows 4 concurrent requests and 10,000 requests per 10 minutes per mailbox
+MAX_CONCURRENT_REQUESTS = 4
+REQUESTS_PER_SECOND = 10.0
+
+# Statuses Graph uses for throttling / transient overload
+RETRY_STATUSES = (429, 503, 504)
+MAX_RETRIES = 5
+
+
+class MailboxRateLimiter:
+    """Token bucket plus a concurrency cap, shared by all threads talking to one mailbox."""
+
+    def __init__(self, rate: float = REQUESTS_PER_SECOND, burst: int = 20,
+                 max_concurrent: int = MAX_CONCURRENT_REQUESTS):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+
+    def acquire(self):
+        """Wait for a request token and a concurrency slot (release the slot with release())."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                wait = max(self._blocked_until - now, 0.0)
+                if wait == 0.0:
+                    if self._tokens >= 1.0:
+                        self._tokens -= 1.0
+                        break
+                    wait = (1.0 - self._tokens) / self.rate
+            time.sleep(wait)
+        self.acquire_slot()
+
+    def acquire_slot(self):
+        """Take a concurrency slot without spending a request token (open streams)."""
+        self._slots.acquire()
+
+    def release(self):
+        self._slots.release()
+
+    def block_for(self, seconds: float):
+        """Pause every thread on this mailbox (Graph throttles the mailbox, not the request)."""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(mailbox: str = 'me') -> MailboxRateLimiter:
+    """Shared limiter for a mailbox."""
+    with _limiters_lock:
+        if mailbox not in _limiters:
+            _limiters[mailbox] = MailboxRateLimiter()
+        return _limiters[mailbox]
+
+
+def _retry_after(response: Optional[requests.Response], attempt: int) -> float:
+    """Seconds to wait before retrying: Retry-After when present, else exponential backoff with jitter."""
+    if response is not None:
+        header = response.headers.get('Retry-After')
+        if header:
+            try:
+                return max(float(header), 0.0)
+            except ValueError:
+                pass
+    return min(2 ** attempt, 60) + random.uniform(0, 1)
+
+
+def graph_request(method: str, url: str, token: str, mailbox: str = 'me', headers: Optional[dict] = None,
+                  **kwargs) -> requests.Response:
+    """
+    Make a Graph request with rate limiting and throttling retries.
+
+    Args:
+        method: HTTP method
+        url: Full Graph URL
+        token: Access token
+        mailbox: Limiter key (the mailbox the request targets)
+        headers: Extra headers
+        **kwargs: Passed to requests.request (params, json, stream, ...)
+
+    Returns:
+        The response (not raised for status; callers decide)
+    """
+    limiter = get_rate_limiter(mailbox)
+    request_headers = {'Authorization': f'Bearer {token}'}
+    request_headers.update(headers or {})
+    kwargs.setdefault('timeout', 60)
+
+    for attempt in range(MAX_RETRIES + 1):
+        limiter.acquire()
+        try:
+            response = requests.request(method, url, headers=request_headers, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            if attempt == MAX_RETRIES:
+                raise
+            delay = _retry_after(None, attempt)
+            logging.warning(f"Graph request failed ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+            continue
+        finally:
+            limiter.release()
+
+        if response.status_code not in RETRY_STATUSES or attempt == MAX_RETRIES:
+            return response
+
+        delay = _retry_after(response, attempt)
+        logging.warning(f"Graph throttled ({response.status_code}), retrying in {delay:.1f}s")
+        limiter.block_for(delay)
+        response.close()
+    return response
+
+
+class GraphStream:
+    """An open Graph response body that holds one of the mailbox's concurrency slots."""
+
+    def __init__(self, response: requests.Response, limiter: MailboxRateLimiter):
+        self.response = response
+        self._limiter = limiter
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def iter_content(self, chunk_size: int) -> Iterator[bytes]:
+        """Body chunks; the slot is released as soon as the last chunk is read."""
+        try:
+            yield from self.response.iter_content(chunk_size=chunk_size)
+        finally:
+            self.close()
+
+    def close(self):
+        """Close the response and release the slot (safe to call more than once)."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self.response.close()
+        self._limiter.release()
+
+
+@contextmanager
+def graph_stream(url: str, token: str, mailbox: str = 'me') -> Iterator[GraphStream]:
+    """
+    Stream a Graph response body (e.g. an attachment's $value).
+
+    The body is read after graph_request returns, so the stream holds one of the
+    mailbox's concurrency slots until the body has been read or the block exits,
+    whichever comes first.
+
+    Yields:
+        The stream, its response already checked with raise_for_status()
+    """
+    limiter = get_rate_limiter(mailbox)
+    response = graph_request('GET', url, token, mailbox=mailbox, stream=True, timeout=(10, 120))
+    limiter.acquire_slot()
+    stream = GraphStream(response, limiter)
+    try:
+        response.raise_for_status()
+        yield stream
+    finally:
+        stream.close()
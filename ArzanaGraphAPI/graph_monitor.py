@@ -7,10 +7,16 @@ import json
 import time
 import requests
 import logging
-import base64
-from datetime import datetime
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from pathlib import Path
-from msal import PublicClientApplication
+from urllib.parse import urlparse
+from sync_state import MailSyncState
+from token_manager import TokenManager
+from graph_client import graph_request, graph_stream
+from graph_webhooks import NotificationReceiver, SubscriptionManager
 
 # Setup logging
 logging.basicConfig(
@@ -32,6 +38,27 @@ CLIENT_ID = config['client_id']
 FLASK_SERVER_URL = config['flask_server_url']
 CHECK_INTERVAL = config['check_interval_seconds']
 USER_EMAIL = config['user_email']
+# Graph API root (point at a local stub for testing)
+GRAPH_BASE_URL = config.get('graph_base_url', 'https://graph.microsoft.com/v1.0').rstrip('/')
+# Push mode: public HTTPS URL forwarded to the local webhook port (unset = polling only)
+WEBHOOK_PUBLIC_URL = config.get('webhook_public_url')
+WEBHOOK_LISTEN_PORT = config.get('webhook_listen_port', 8765)
+# With push mode a delta round still runs this often to catch missed notifications
+RECONCILE_INTERVAL = config.get('reconcile_interval_seconds', 900)
+# First delta round (no saved deltaLink) only looks this far back
+INITIAL_SYNC_DAYS = config.get('initial_sync_days', 7)
+# Processed ids older than this are forgotten
+PROCESSED_RETENTION_DAYS = config.get('processed_retention_days', 180)
+# A claimed email not finished within this long is treated as abandoned (uploads take up to 300 s)
+STALE_CLAIM_SECONDS = config.get('stale_claim_seconds', 900)
+# Emails processed at once (attachment fetch, upload and tagging run in a worker pool)
+MAX_CONCURRENT_EMAILS = config.get('max_concurrent_emails', 4)
+# Hold new uploads while the Flask server has this many uploads in flight
+MAX_SERVER_QUEUE_DEPTH = config.get('max_server_queue_depth', 4)
+# Larger attachments are skipped (the Flask server rejects uploads over 16 MB)
+MAX_ATTACHMENT_BYTES = config.get('max_attachment_mb', 16) * 1024 * 1024
+# Bytes per chunk when relaying an attachment from Graph to the Flask server
+UPLOAD_CHUNK_SIZE = 256 * 1024
 
 # Microsoft Graph scopes - for personal accounts (don't include openid/profile, MSAL adds them)
 SCOPES = [
@@ -40,146 +67,144 @@ SCOPES = [
     'https://graph.microsoft.com/User.Read'
 ]
 
-# Token cache
-CACHE_FILE = Path(__file__).parent / 'token_cache.json'
+# Token cache (encrypted with the OS facility, see token_manager)
+CACHE_FILE = Path(__file__).parent / 'token_cache.bin'
 
-# Processed emails tracker
-processed_emails = set()
+# Delta checkpoint + processed message ids (survives restarts)
+STATE_DB = Path(__file__).parent / config.get('state_db', 'monitor_state.db')
 
-# Initialize MSAL app - use 'common' for personal Microsoft accounts
-app = PublicClientApplication(
+# Status categories the monitor sets; tagged messages are never reprocessed
+STATUS_CATEGORIES = ['Approved', 'Pending Approval', 'Missing Info']
+
+MESSAGE_SELECT = 'id,subject,from,receivedDateTime,hasAttachments,bodyPreview,categories,body'
+
+# Access tokens: cached in memory, refreshed ahead of expiry, MSAL cache persisted encrypted
+token_manager = TokenManager(
     CLIENT_ID,
+    SCOPES,
+    CACHE_FILE,
     authority="https://login.microsoftonline.com/common",  # Works for both AAD + MSA
+    allow_plaintext_cache=config.get('allow_plaintext_token_cache', False)
 )
 
 def get_access_token():
-    """Get access token using device code flow"""
-    # Try to get token silently from cache first
-    accounts = app.get_accounts()
-    if accounts:
-        result = app.acquire_token_silent(SCOPES, account=accounts[0])
-        if result and 'access_token' in result:
-            logging.info("Token acquired from cache")
-            return result['access_token']
-    
-    # Need to authenticate
-    logging.info("Starting device code flow authentication...")
-    flow = app.initiate_device_flow(scopes=SCOPES)
-    
-    if 'user_code' not in flow:
-        error_msg = flow.get('error_description', flow.get('error', 'Unknown error'))
-        raise Exception(f"Failed to create device flow: {error_msg}")
-    
-    print("\n" + "="*50)
-    print("USER LOGIN REQUIRED")
-    print("="*50)
-    print(f"\n1. Go to: {flow['verification_uri']}")
-    print(f"2. Enter code: {flow['user_code']}")
-    print("\nWaiting for you to complete sign-in...")
-    print("(This will continue automatically once you sign in)\n")
-    
-    result = app.acquire_token_by_device_flow(flow)
-    
-    if 'access_token' in result:
-        logging.info("Authentication successful!")
-        return result['access_token']
-    else:
-        raise Exception(f"Authentication failed: {result.get('error_description', 'Unknown error')}")
+    """Get access token (device code flow only when nothing usable is cached)"""
+    return token_manager.get_token()
 
-def load_token_cache():
-    """Load token cache from file"""
-    # MSAL handles token caching automatically in newer versions
-    # Just check if we have cached accounts
-    return None
+class DeltaResetRequired(Exception):
+    """The saved deltaLink is no longer valid; start a new sync round."""
 
-def save_token_cache():
-    """Save token cache to file"""
-    try:
-        # MSAL's token_cache doesn't need explicit serialization in newer versions
-        # The cache is automatically managed
-        logging.info("Token cache saved")
-    except Exception as e:
-        logging.error(f"Failed to save token cache: {e}")
 
-def get_inbox_emails(token):
-    """Get emails from inbox"""
-    # Decode token to check contents
-    import base64
-    try:
-        token_parts = token.split('.')
-        payload = token_parts[1]
-        # Add padding if needed
-        payload += '=' * (4 - len(payload) % 4)
-        decoded = base64.b64decode(payload)
-        token_data = json.loads(decoded)
-        logging.info(f"Token audience: {token_data.get('aud')}")
-        logging.info(f"Token scopes: {token_data.get('scp', token_data.get('roles'))}")
-        logging.info(f"Token expires: {token_data.get('exp')}")
-    except Exception as e:
-        logging.warning(f"Could not decode token: {e}")
-    
-    headers = {
-        'Authorization': f'Bearer {token}',
-        'Content-Type': 'application/json'
-    }
+def get_inbox_delta(token, delta_link=None):
+    """
+    Get new or changed inbox messages since the last delta round.
     
-    # Try /me endpoint first, but log the user info
-    try:
-        user_url = 'https://graph.microsoft.com/v1.0/me'
-        user_response = requests.get(user_url, headers=headers)
-        logging.info(f"User endpoint status: {user_response.status_code}")
-        if user_response.ok:
-            user_data = user_response.json()
-            logging.info(f"User: {user_data.get('userPrincipalName')} / {user_data.get('mail')}")
-        else:
-            logging.error(f"User endpoint failed: {user_response.text}")
-    except Exception as e:
-        logging.error(f"User endpoint error: {e}")
+    Args:
+        token: Access token
+        delta_link: deltaLink from the previous round, or None for an initial sync
+        
+    Returns:
+        (messages, delta_link) - removed messages are omitted; delta_link checkpoints this round
+    """
+    headers = {'Prefer': 'odata.maxpagesize=50'}
     
-    url = 'https://graph.microsoft.com/v1.0/me/mailFolders/inbox/messages'
-    params = {
-        '$top': 50,
-        '$orderby': 'receivedDateTime desc',
-        '$select': 'id,subject,from,receivedDateTime,hasAttachments,bodyPreview,categories,body'
-    }
+    if delta_link:
+        url, params = delta_link, None
+    else:
+        since = datetime.utcnow() - timedelta(days=INITIAL_SYNC_DAYS)
+        url = f'{GRAPH_BASE_URL}/me/mailFolders/inbox/messages/delta'
+        params = {
+            '$select': MESSAGE_SELECT,
+            '$filter': f"receivedDateTime ge {since.strftime('%Y-%m-%dT%H:%M:%SZ')}"
+        }
     
-    try:
-        response = requests.get(url, headers=headers, params=params)
+    messages = []
+    while True:
+        response = graph_request('GET', url, token, headers=headers, params=params)
+        if response.status_code == 410 or (response.status_code == 400 and 'SyncState' in response.text):
+            raise DeltaResetRequired(response.text)
         response.raise_for_status()
-    except requests.exceptions.HTTPError as e:
-        logging.error(f"HTTP Error Details:")
-        logging.error(f"Status Code: {e.response.status_code}")
-        logging.error(f"Response Headers: {dict(e.response.headers)}")
-        logging.error(f"Response Body: {e.response.text}")
-        raise
-    
-    emails = response.json().get('value', [])
-    logging.info(f"Retrieved {len(emails)} emails from inbox")
-    return emails
+        page = response.json()
+        messages.extend(m for m in page.get('value', []) if '@removed' not in m)
+        
+        if '@odata.nextLink' in page:
+            url, params = page['@odata.nextLink'], None  # nextLink already carries the query
+            continue
+        
+        logging.info(f"Delta round returned {len(messages)} new/changed emails")
+        return messages, page['@odata.deltaLink']
 
-def get_attachments(token, message_id):
-    """Get email attachments"""
-    headers = {
-        'Authorization': f'Bearer {token}',
-        'Content-Type': 'application/json'
-    }
-    
-    url = f'https://graph.microsoft.com/v1.0/me/messages/{message_id}/attachments'
-    response = requests.get(url, headers=headers)
+def get_message(token, message_id):
+    """Get one message (MESSAGE_SELECT fields), or None if it no longer exists"""
+    url = f'{GRAPH_BASE_URL}/me/messages/{message_id}'
+    response = graph_request('GET', url, token, params={'$select': MESSAGE_SELECT})
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    return response.json()
+
+def get_attachment_metadata(token, message_id):
+    """Get email attachment metadata (name, type, size) without the content"""
+    url = f'{GRAPH_BASE_URL}/me/messages/{message_id}/attachments'
+    params = {'$select': 'id,name,contentType,size,isInline'}
+    response = graph_request('GET', url, token, params=params)
     response.raise_for_status()
     
     return response.json().get('value', [])
 
+def select_pdf_attachment(attachments):
+    """First PDF file attachment within MAX_ATTACHMENT_BYTES, or None"""
+    for attachment in attachments:
+        # Item (forwarded email) and reference (cloud link) attachments have no file content
+        if attachment.get('@odata.type', '#microsoft.graph.fileAttachment') != '#microsoft.graph.fileAttachment':
+            continue
+        name = attachment.get('name') or ''
+        if not (name.lower().endswith('.pdf') or attachment.get('contentType') == 'application/pdf'):
+            continue
+        # size is the whole attachment object, slightly more than the file itself
+        if attachment.get('size', 0) > MAX_ATTACHMENT_BYTES:
+            logging.warning(f"Skipping oversized PDF attachment {name} ({attachment['size'] / 1024 / 1024:.1f} MB)")
+            continue
+        return attachment
+    return None
+
+def upload_attachment_stream(token, message_id, attachment):
+    """
+    Relay an attachment's raw bytes ($value) to the Flask /upload endpoint.
+    
+    The multipart body is generated around the Graph response chunks and sent with
+    chunked transfer encoding, so the PDF is never held in memory or base64-encoded.
+    The Graph slot is released once the last chunk is read, not after Flask replies.
+    
+    Returns:
+        Flask response JSON
+    """
+    url = f"{GRAPH_BASE_URL}/me/messages/{message_id}/attachments/{attachment['id']}/$value"
+    filename = (attachment.get('name') or 'attachment.pdf').replace('"', "'").replace('\r', '').replace('\n', '')
+    boundary = uuid.uuid4().hex
+    
+    with graph_stream(url, token) as source:
+        def multipart_body():
+            yield (f'--{boundary}\r\n'
+                   f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+                   f'Content-Type: application/pdf\r\n\r\n').encode('utf-8')
+            yield from source.iter_content(chunk_size=UPLOAD_CHUNK_SIZE)
+            yield f'\r\n--{boundary}--\r\n'.encode('utf-8')
+        
+        response = requests.post(
+            f'{FLASK_SERVER_URL}/upload',
+            data=multipart_body(),
+            headers={'Content-Type': f'multipart/form-data; boundary={boundary}'},
+            timeout=300
+        )
+    response.raise_for_status()
+    return response.json()
+
 def update_email_category(token, message_id, category):
     """Update email category/tag"""
-    headers = {
-        'Authorization': f'Bearer {token}',
-        'Content-Type': 'application/json'
-    }
-    
     # Get current categories
-    url = f'https://graph.microsoft.com/v1.0/me/messages/{message_id}'
-    response = requests.get(url, headers=headers)
+    url = f'{GRAPH_BASE_URL}/me/messages/{message_id}'
+    response = graph_request('GET', url, token, params={'$select': 'categories'})
     response.raise_for_status()
     email = response.json()
     
@@ -190,7 +215,7 @@ def update_email_category(token, message_id, category):
     
     # Update email
     data = {'categories': new_categories}
-    response = requests.patch(url, headers=headers, json=data)
+    response = graph_request('PATCH', url, token, json=data)
     response.raise_for_status()
     
     logging.info(f"Tagged email as: {category}")
@@ -236,26 +261,52 @@ def is_po_email(email):
     
     return is_po
 
+_server_capacity_lock = threading.Lock()
+
+def get_server_queue_depth():
+    """Uploads in flight on the Flask server (from /metrics), or None if unavailable"""
+    try:
+        response = requests.get(f'{FLASK_SERVER_URL}/metrics', timeout=5)
+        response.raise_for_status()
+    except requests.exceptions.RequestException:
+        return None
+    for line in response.text.splitlines():
+        if line.startswith('arzana_uploads_in_flight'):
+            try:
+                return float(line.split()[-1])
+            except ValueError:
+                return None
+    return 0.0
+
+def wait_for_server_capacity(poll_seconds=2.0):
+    """Block until the Flask server's upload queue is below MAX_SERVER_QUEUE_DEPTH"""
+    # One waiter at a time so released capacity is not claimed by every worker at once
+    with _server_capacity_lock:
+        logged = False
+        while True:
+            depth = get_server_queue_depth()
+            if depth is None or depth < MAX_SERVER_QUEUE_DEPTH:
+                return
+            if not logged:
+                logging.info(f"Flask server busy ({depth:.0f} uploads in flight), holding uploads")
+                logged = True
+            time.sleep(poll_seconds)
+
 def process_po_email(token, email):
     """Process PO email with Flask server"""
     try:
         logging.info(f"Processing PO email: {email['subject']}")
         
-        # Get attachments
-        attachments = get_attachments(token, email['id'])
-        pdf_attachment = next((a for a in attachments if a['name'].lower().endswith('.pdf')), None)
+        # List attachments (metadata only), then stream the chosen PDF
+        attachments = get_attachment_metadata(token, email['id'])
+        pdf_attachment = select_pdf_attachment(attachments)
         
         if pdf_attachment:
             logging.info(f"Found PDF attachment: {pdf_attachment['name']}")
             
-            # Decode PDF content
-            pdf_bytes = base64.b64decode(pdf_attachment['contentBytes'])
-            
-            # Upload to Flask
-            files = {'file': (pdf_attachment['name'], pdf_bytes, 'application/pdf')}
-            response = requests.post(f'{FLASK_SERVER_URL}/upload', files=files, timeout=300)
-            response.raise_for_status()
-            result = response.json()
+            # Upload to Flask once it has room
+            wait_for_server_capacity()
+            result = upload_attachment_stream(token, email['id'], pdf_attachment)
             
             logging.info("Flask server response received")
             
@@ -289,6 +340,100 @@ def process_po_email(token, email):
             pass
         return {'success': False, 'error': str(e)}
 
+def handle_email(state, email):
+    """Check one claimed email and process it if it is a PO (runs in the worker pool)"""
+    try:
+        logging.info(f"Checking email: {email['subject']}")
+        
+        if is_po_email(email):
+            logging.info("PO email detected, processing...")
+            # Fresh token per email: queued emails may start long after the poll
+            result = process_po_email(get_access_token(), email)
+            state.mark(email['id'], 'po_processed' if result.get('success') else 'po_failed')
+            logging.info("PO email processed successfully")
+        else:
+            state.mark(email['id'], 'not_po')
+            logging.info("Not a PO email, skipping")
+    
+    except Exception as e:
+        state.mark(email['id'], 'error')
+        logging.error(f"Error processing email {email['subject']}: {e}")
+
+def run_sync_round(state, executor, pool_slots):
+    """Fetch new/changed inbox messages (delta) and hand unprocessed ones to the worker pool"""
+    # Get fresh token (will use cache if still valid)
+    token = get_access_token()
+    
+    # Only messages added or changed since the last round
+    try:
+        emails, delta_link = get_inbox_delta(token, state.get_delta_link())
+    except DeltaResetRequired as e:
+        logging.warning(f"Delta checkpoint expired, starting a new sync: {e}")
+        state.clear_delta_link()
+        emails, delta_link = get_inbox_delta(token, None)
+    
+    # Filter unprocessed emails without status tags
+    candidates = []
+    for email in emails:
+        email_id = email['id']
+        categories = email.get('categories', [])
+        
+        # Skip if already processed (our own category updates come back as changes)
+        if state.is_processed(email_id):
+            continue
+        
+        # Skip if has status category
+        if any(cat in categories for cat in STATUS_CATEGORIES):
+            continue
+        
+        candidates.append(email)
+    
+    logging.info(f"Found {len(candidates)} unprocessed emails")
+    
+    # Process candidates in the worker pool; submission blocks while the pool is full
+    for email in candidates:
+        pool_slots.acquire()
+        # Claimed before processing so a crash never uploads the same PO twice
+        if not state.claim(email['id'], email.get('subject', '')):
+            pool_slots.release()
+            continue
+        future = executor.submit(handle_email, state, email)
+        future.add_done_callback(lambda _: pool_slots.release())
+    
+    # Every message of the round is claimed, so checkpointing while the pool is still
+    # working is safe: claims left 'processing' by a crash are re-submitted at startup
+    state.save_delta_link(delta_link)
+
+def recover_interrupted_emails(state, executor, pool_slots):
+    """
+    Re-submit emails a previous run claimed but never finished (killed mid-upload).
+    
+    Their deltaLink was already checkpointed, so delta rounds will not bring them back.
+    Emails that got a status tag in the meantime are only marked done.
+    """
+    interrupted = state.interrupted_claims()
+    if not interrupted:
+        return
+    logging.warning(f"{len(interrupted)} email(s) were still processing when the monitor stopped")
+    token = get_access_token()
+    for message_id, subject in interrupted:
+        try:
+            email = get_message(token, message_id)
+        except Exception as e:
+            # Claim goes stale, so a later delta round or restart picks the email up again
+            logging.error(f"Could not re-check interrupted email {subject}: {e}")
+            continue
+        if email is None:
+            state.mark(message_id, 'deleted')
+        elif any(cat in email.get('categories', []) for cat in STATUS_CATEGORIES):
+            state.mark(message_id, 'already_tagged')
+        else:
+            logging.info(f"Re-submitting interrupted email: {subject}")
+            state.refresh_claim(message_id)
+            pool_slots.acquire()
+            future = executor.submit(handle_email, state, email)
+            future.add_done_callback(lambda _: pool_slots.release())
+
 def main():
     """Main monitoring loop"""
     logging.info("Starting Arzana Outlook Monitor (Graph API - Delegated)...")
@@ -296,12 +441,13 @@ def main():
     logging.info(f"Check Interval: {CHECK_INTERVAL} seconds")
     logging.info(f"Monitoring mailbox: {USER_EMAIL}")
     
-    # Get access token (will prompt for login if needed)
+    # Log in up front (device-code prompt if needed); run_sync_round fetches its own token
     try:
-        token = get_access_token()
+        get_access_token()
     except Exception as e:
         logging.error(f"Failed to authenticate: {e}")
         return
+    token_manager.start()
     
     # Test Flask server
     try:
@@ -310,60 +456,64 @@ def main():
     except:
         logging.warning(f"Warning: Cannot connect to Flask server at {FLASK_SERVER_URL}")
     
-    logging.info("Monitoring started. Press Ctrl+C to stop.")
+    state = MailSyncState(STATE_DB, STALE_CLAIM_SECONDS)
+    pruned = state.prune(PROCESSED_RETENTION_DAYS)
+    if pruned:
+        logging.info(f"Pruned {pruned} processed email ids older than {PROCESSED_RETENTION_DAYS} days")
+    if state.get_delta_link():
+        logging.info("Resuming from saved delta checkpoint")
+    else:
+        logging.info(f"No delta checkpoint, initial sync of the last {INITIAL_SYNC_DAYS} days")
+    
+    executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_EMAILS, thread_name_prefix='email')
+    pool_slots = threading.BoundedSemaphore(MAX_CONCURRENT_EMAILS)
+    recover_interrupted_emails(state, executor, pool_slots)
+    
+    # Push mode: notifications wake the loop, polling becomes a slow reconciliation
+    receiver = subscriptions = None
+    wait_interval = CHECK_INTERVAL
+    if WEBHOOK_PUBLIC_URL:
+        try:
+            subscriptions = SubscriptionManager(state, get_access_token, WEBHOOK_PUBLIC_URL, GRAPH_BASE_URL)
+            receiver = NotificationReceiver(WEBHOOK_LISTEN_PORT, urlparse(WEBHOOK_PUBLIC_URL).path or '/',
+                                            client_states=subscriptions.client_states)
+            receiver.start()
+            subscriptions.start()
+            wait_interval = RECONCILE_INTERVAL
+            logging.info(f"Push mode: {WEBHOOK_PUBLIC_URL}, reconciling every {RECONCILE_INTERVAL} seconds")
+        except Exception as e:
+            logging.error(f"Push mode unavailable, polling every {CHECK_INTERVAL} seconds: {e}")
+            receiver = subscriptions = None
+    
+    logging.info(f"Monitoring started ({MAX_CONCURRENT_EMAILS} concurrent emails). Press Ctrl+C to stop.")
     
     try:
         while True:
             try:
-                # Get fresh token (will use cache if still valid)
-                token = get_access_token()
-                
-                # Get emails
-                emails = get_inbox_emails(token)
-                
-                # Filter unprocessed emails without status tags
-                candidates = []
-                for email in emails:
-                    email_id = email['id']
-                    categories = email.get('categories', [])
-                    
-                    # Skip if already processed
-                    if email_id in processed_emails:
-                        continue
-                    
-                    # Skip if has status category
-                    if any(cat in categories for cat in ['Approved', 'Pending Approval', 'Missing Info']):
-                        continue
-                    
-                    candidates.append(email)
-                
-                logging.info(f"Found {len(candidates)} unprocessed emails")
-                
-                # Process each candidate
-                for email in candidates:
-                    try:
-                        logging.info(f"Checking email: {email['subject']}")
-                        processed_emails.add(email['id'])
-                        
-                        if is_po_email(email):
-                            logging.info("PO email detected, processing...")
-                            result = process_po_email(token, email)
-                            logging.info("PO email processed successfully")
-                        else:
-                            logging.info("Not a PO email, skipping")
-                    
-                    except Exception as e:
-                        logging.error(f"Error processing email {email['subject']}: {e}")
-                
-                time.sleep(CHECK_INTERVAL)
-                
+                run_sync_round(state, executor, pool_slots)
             except Exception as e:
                 logging.error(f"Error in monitoring loop: {e}")
-                time.sleep(CHECK_INTERVAL)
+            
+            if receiver:
+                notifications = receiver.wait(wait_interval)
+                for notification in notifications:
+                    if 'lifecycleEvent' in notification:
+                        subscriptions.handle_lifecycle(notification)
+                if notifications:
+                    logging.info(f"{len(notifications)} change notification(s) received")
+            else:
+                time.sleep(wait_interval)
     
     except KeyboardInterrupt:
         logging.info("Monitoring stopped by user")
     finally:
+        if receiver:
+            subscriptions.stop()
+            receiver.stop()
+        logging.info("Waiting for in-progress emails...")
+        executor.shutdown(wait=True)
+        state.close()
+        token_manager.stop()
         logging.info("Monitor stopped")
 
 if __name__ == '__main__':
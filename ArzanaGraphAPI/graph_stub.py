@@ -0,0 +1,219 @@
+"""
+Local Microsoft Graph stub for testing the monitor without a mailbox
+Implements the calls the monitor makes (inbox delta, attachments, categories,
+subscriptions) against an in-memory inbox, and sends change notifications to
+subscribed webhook URLs (after the same validation handshake Graph performs).
+
+Usage:
+    python graph_stub.py --port 8770
+    # config.json: "graph_base_url": "http://127.0.0.1:8770/v1.0",
+    #              "webhook_public_url": "http://127.0.0.1:8765/graph/notifications"
+    curl -X POST http://127.0.0.1:8770/stub/messages -d '{"subject": "PO 123", "pdf": "sample.pdf"}'
+"""
+
+import re
+import json
+import uuid
+import argparse
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlparse
+
+import requests
+
+
+class StubMailbox:
+    """In-memory inbox with a change sequence for delta tokens."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.messages = {}       # id -> message
+        self.attachments = {}    # message id -> [(attachment metadata, bytes)]
+        self.changed_at = {}     # id -> sequence number of the last change
+        self.sequence = 0
+        self.subscriptions = {}  # id -> subscription
+
+    def touch(self, message_id):
+        self.sequence += 1
+        self.changed_at[message_id] = self.sequence
+
+    def add_message(self, subject, body='', pdf_bytes=None, pdf_name='po.pdf'):
+        with self.lock:
+            message_id = uuid.uuid4().hex
+            self.messages[message_id] = {
+                'id': message_id,
+                'subject': subject,
+                'from': {'emailAddress': {'address': 'buyer@example.com'}},
+                'receivedDateTime': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+                'hasAttachments': pdf_bytes is not None,
+                'bodyPreview': body[:255],
+                'body': {'contentType': 'text', 'content': body},
+                'categories': []
+            }
+            self.attachments[message_id] = []
+            if pdf_bytes is not None:
+                self.attachments[message_id].append(({
+                    '@odata.type': '#microsoft.graph.fileAttachment',
+                    'id': uuid.uuid4().hex,
+                    'name': pdf_name,
+                    'contentType': 'application/pdf',
+                    'size': len(pdf_bytes),
+                    'isInline': False
+                }, pdf_bytes))
+            self.touch(message_id)
+            subscriptions = list(self.subscriptions.values())
+        for subscription in subscriptions:
+            notify(subscription, message_id)
+        return message_id
+
+
+def validate_endpoint(url):
+    """Graph's validation handshake: the endpoint must echo validationToken as text/plain."""
+    token = uuid.uuid4().hex
+    response = requests.post(f"{url}?validationToken={quote(token)}", timeout=10)
+    return response.status_code == 200 and response.text == token
+
+
+def notify(subscription, message_id):
+    payload = {'value': [{
+        'subscriptionId': subscription['id'],
+        'clientState': subscription['clientState'],
+        'changeType': 'created',
+        'resource': f"Users/stub/Messages/{message_id}",
+        'resourceData': {'id': message_id}
+    }]}
+    try:
+        requests.post(subscription['notificationUrl'], json=payload, timeout=10)
+    except requests.exceptions.RequestException as e:
+        print(f"⚠️ Notification to {subscription['notificationUrl']} failed: {e}")
+
+
+def make_handler(mailbox, base_url):
+
+    class Handler(BaseHTTPRequestHandler):
+        def _json(self, status, body=None):
+            data = json.dumps(body).encode('utf-8') if body is not None else b''
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _body(self):
+            length = int(self.headers.get('Content-Length', 0))
+            return json.loads(self.rfile.read(length) or b'{}')
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            path, query = url.path, parse_qs(url.query)
+
+            if path == '/v1.0/me':
+                return self._json(200, {'userPrincipalName': 'stub@example.com', 'mail': 'stub@example.com'})
+
+            if path == '/v1.0/me/mailFolders/inbox/messages/delta':
+                since = int(query.get('$deltatoken', ['0'])[0])
+                with mailbox.lock:
+                    changed = [mailbox.messages[m] for m, seq in mailbox.changed_at.items() if seq > since]
+                    token = mailbox.sequence
+                return self._json(200, {
+                    'value': changed,
+                    '@odata.deltaLink': f"{base_url}/me/mailFolders/inbox/messages/delta?$deltatoken={token}"
+                })
+
+            match = re.fullmatch(r'/v1\.0/me/messages/(\w+)/attachments/(\w+)/\$value', path)
+            if match:
+                for metadata, content in mailbox.attachments.get(match.group(1), []):
+                    if metadata['id'] == match.group(2):
+                        self.send_response(200)
+                        self.send_header('Content-Type', metadata['contentType'])
+                        self.send_header('Content-Length', str(len(content)))
+                        self.end_headers()
+                        self.wfile.write(content)
+                        return
+                return self._json(404, {'error': {'code': 'ErrorItemNotFound'}})
+
+            match = re.fullmatch(r'/v1\.0/me/messages/(\w+)/attachments', path)
+            if match:
+                return self._json(200, {'value': [m for m, _ in mailbox.attachments.get(match.group(1), [])]})
+
+            match = re.fullmatch(r'/v1\.0/me/messages/(\w+)', path)
+            if match and match.group(1) in mailbox.messages:
+                return self._json(200, mailbox.messages[match.group(1)])
+
+            self._json(404, {'error': {'code': 'NotFound'}})
+
+        def do_PATCH(self):
+            path = urlparse(self.path).path
+            body = self._body()
+
+            match = re.fullmatch(r'/v1\.0/me/messages/(\w+)', path)
+            if match and match.group(1) in mailbox.messages:
+                with mailbox.lock:
+                    mailbox.messages[match.group(1)].update(body)
+                    mailbox.touch(match.group(1))
+                return self._json(200, mailbox.messages[match.group(1)])
+
+            match = re.fullmatch(r'/v1\.0/subscriptions/(\w+)', path)
+            if match and match.group(1) in mailbox.subscriptions:
+                subscription = mailbox.subscriptions[match.group(1)]
+                subscription['expirationDateTime'] = body.get('expirationDateTime', subscription['expirationDateTime'])
+                return self._json(200, subscription)
+
+            self._json(404, {'error': {'code': 'NotFound'}})
+
+        def do_POST(self):
+            path = urlparse(self.path).path
+            body = self._body()
+
+            if path == '/v1.0/subscriptions':
+                if not validate_endpoint(body['notificationUrl']):
+                    return self._json(400, {'error': {'code': 'ValidationError',
+                                                      'message': 'Subscription validation request failed'}})
+                subscription = dict(body, id=uuid.uuid4().hex, expirationDateTime=body.get(
+                    'expirationDateTime', (datetime.now(timezone.utc) + timedelta(days=2)).isoformat()))
+                mailbox.subscriptions[subscription['id']] = subscription
+                print(f"✅ Subscription {subscription['id']} -> {subscription['notificationUrl']}")
+                return self._json(201, subscription)
+
+            if path == '/stub/messages':
+                pdf_bytes = None
+                if body.get('pdf'):
+                    with open(body['pdf'], 'rb') as f:
+                        pdf_bytes = f.read()
+                message_id = mailbox.add_message(body.get('subject', 'Test PO'), body.get('body', ''), pdf_bytes,
+                                                 body.get('pdf_name', 'po.pdf'))
+                return self._json(201, {'id': message_id})
+
+            self._json(404, {'error': {'code': 'NotFound'}})
+
+        def do_DELETE(self):
+            match = re.fullmatch(r'/v1\.0/subscriptions/(\w+)', urlparse(self.path).path)
+            if match and mailbox.subscriptions.pop(match.group(1), None):
+                return self._json(204)
+            self._json(404, {'error': {'code': 'NotFound'}})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Microsoft Graph stub for the monitor")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8770)
+    args = parser.parse_args()
+
+    mailbox = StubMailbox()
+    base_url = f"http://{args.host}:{args.port}/v1.0"
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(mailbox, base_url))
+    print(f"🧪 Graph stub on {base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
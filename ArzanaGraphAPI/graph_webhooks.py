@@ -0,0 +1,260 @@
+"""
+Graph change notifications (push mode) for the monitor
+NotificationReceiver is a small HTTP endpoint for Graph subscription callbacks: it
+answers validation requests, checks clientState and queues notifications.
+SubscriptionManager creates the inbox subscription and renews it before it expires.
+
+Notifications only wake the monitor; the messages themselves are still fetched by a
+delta round, so push and the polling fallback share one processing path.
+"""
+
+import json
+import queue
+import logging
+import secrets
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional, Set
+from urllib.parse import parse_qs, urlparse
+
+from graph_client import graph_request
+
+INBOX_RESOURCE = "me/mailFolders('inbox')/messages"
+
+# Message subscriptions may last up to 7 days; renew well before expiry
+SUBSCRIPTION_LIFETIME = timedelta(days=2)
+RENEW_BEFORE = timedelta(hours=6)
+
+
+def _parse_graph_time(value: str) -> datetime:
+    """Parse a Graph timestamp ('2026-01-02T03:04:05.1234567Z'; up to 7 fractional digits)."""
+    value = value.rstrip('Z')
+    if '.' in value:
+        whole, fraction = value.split('.', 1)
+        value = f"{whole}.{fraction[:6]}"
+    return datetime.fromisoformat(value).replace(tzinfo=timezone.utc)
+
+
+class NotificationReceiver:
+    """Threaded HTTP server that queues Graph change and lifecycle notifications."""
+
+    def __init__(self, port: int, path: str = '/graph/notifications', host: str = '0.0.0.0',
+                 client_states: Callable[[], Set[str]] = set):
+        """
+        Initialize the receiver.
+
+        Args:
+            port: Local port to listen on (the public webhook URL must forward here)
+            path: Request path Graph posts to
+            host: Bind address
+            client_states: Returns the clientState values of our subscriptions
+        """
+        self.path = path
+        self.client_states = client_states
+        self.notifications = queue.Queue()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def _make_handler(self):
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                url = urlparse(self.path)
+                if url.path != receiver.path:
+                    self._respond(404)
+                    return
+
+                # Subscription validation: echo the token as plain text within 10 seconds
+                validation_token = parse_qs(url.query).get('validationToken')
+                if validation_token:
+                    self._respond(200, validation_token[0].encode('utf-8'), 'text/plain')
+                    return
+
+                try:
+                    length = int(self.headers.get('Content-Length', 0))
+                    payload = json.loads(self.rfile.read(length) or b'{}')
+                except ValueError:
+                    self._respond(400)
+                    return
+
+                # Acknowledge fast; Graph retries (and eventually drops) slow endpoints
+                receiver.enqueue(payload.get('value', []))
+                self._respond(202)
+
+            def _respond(self, status, body=b'', content_type=None):
+                self.send_response(status)
+                if content_type:
+                    self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logging.debug(f"Webhook: {format % args}")
+
+        return Handler
+
+    def enqueue(self, items):
+        """Queue notifications whose clientState matches one of our subscriptions."""
+        valid_states = self.client_states()
+        for item in items:
+            if item.get('clientState') not in valid_states:
+                logging.warning(f"Ignoring notification with unknown clientState for {item.get('subscriptionId')}")
+                continue
+            self.notifications.put(item)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='graph-webhook', daemon=True)
+        self._thread.start()
+        logging.info(f"Webhook receiver listening on port {self.port}{self.path}")
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def wait(self, timeout: float, settle: float = 1.0) -> list:
+        """
+        Block until notifications arrive or timeout passes.
+
+        Args:
+            timeout: Maximum seconds to wait
+            settle: After the first notification, keep collecting for this long (one round per burst)
+
+        Returns:
+            Notifications received (empty on timeout)
+        """
+        try:
+            items = [self.notifications.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        deadline = datetime.now() + timedelta(seconds=settle)
+        while True:
+            remaining = (deadline - datetime.now()).total_seconds()
+            if remaining <= 0:
+                return items
+            try:
+                items.append(self.notifications.get(timeout=remaining))
+            except queue.Empty:
+                return items
+
+
+class SubscriptionManager:
+    """Creates the inbox change subscription and keeps it renewed."""
+
+    def __init__(self, state, token_getter: Callable[[], str], notification_url: str,
+                 graph_base_url: str = 'https://graph.microsoft.com/v1.0', resource: str = INBOX_RESOURCE):
+        """
+        Initialize the manager.
+
+        Args:
+            state: MailSyncState (persists the subscription across restarts)
+            token_getter: Returns a valid access token
+            notification_url: Public HTTPS URL that reaches the NotificationReceiver
+            graph_base_url: Graph API root
+            resource: Subscribed resource
+        """
+        self.state = state
+        self.token_getter = token_getter
+        self.notification_url = notification_url
+        self.graph_base_url = graph_base_url.rstrip('/')
+        self.resource = resource
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._wake_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def client_states(self) -> Set[str]:
+        subscription = self.state.get_subscription(self.resource)
+        return {subscription['client_state']} if subscription else set()
+
+    @staticmethod
+    def _expiration() -> str:
+        return (datetime.now(timezone.utc) + SUBSCRIPTION_LIFETIME).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+    def _create(self):
+        client_state = secrets.token_urlsafe(32)
+        body = {
+            'changeType': 'created',
+            'notificationUrl': self.notification_url,
+            'lifecycleNotificationUrl': self.notification_url,
+            'resource': self.resource,
+            'expirationDateTime': self._expiration(),
+            'clientState': client_state
+        }
+        # Save the clientState first: Graph validates the URL before this call returns,
+        # and early notifications must already be accepted
+        self.state.save_subscription(self.resource, 'pending', client_state, body['expirationDateTime'])
+        response = graph_request('POST', f'{self.graph_base_url}/subscriptions', self.token_getter(), json=body)
+        if not response.ok:
+            self.state.delete_subscription(self.resource)
+            raise Exception(f"Subscription create failed ({response.status_code}): {response.text}")
+        created = response.json()
+        self.state.save_subscription(self.resource, created['id'], client_state, created['expirationDateTime'])
+        logging.info(f"Created inbox subscription {created['id']} (expires {created['expirationDateTime']})")
+
+    def _renew(self, subscription) -> bool:
+        expiration = self._expiration()
+        response = graph_request('PATCH', f"{self.graph_base_url}/subscriptions/{subscription['subscription_id']}",
+                                 self.token_getter(), json={'expirationDateTime': expiration})
+        if response.status_code == 404:
+            return False
+        if not response.ok:
+            raise Exception(f"Subscription renew failed ({response.status_code}): {response.text}")
+        self.state.save_subscription(self.resource, subscription['subscription_id'], subscription['client_state'],
+                                     response.json().get('expirationDateTime', expiration))
+        logging.info(f"Renewed inbox subscription {subscription['subscription_id']}")
+        return True
+
+    def ensure(self, force_renew: bool = False):
+        """Create the subscription, or renew it when it is close to expiry (or force_renew)."""
+        with self._lock:
+            subscription = self.state.get_subscription(self.resource)
+            if subscription and subscription['subscription_id'] != 'pending':
+                if not force_renew and self._seconds_left(subscription) > RENEW_BEFORE.total_seconds():
+                    return
+                if self._renew(subscription):
+                    return
+                logging.warning("Inbox subscription no longer exists, creating a new one")
+            self._create()
+
+    def handle_lifecycle(self, notification):
+        """React to a lifecycle notification (reauthorizationRequired, subscriptionRemoved)."""
+        event = notification.get('lifecycleEvent')
+        logging.info(f"Subscription lifecycle event: {event}")
+        if event == 'subscriptionRemoved':
+            self.state.delete_subscription(self.resource)
+        if event in ('reauthorizationRequired', 'subscriptionRemoved'):
+            self._wake_event.set()
+
+    @staticmethod
+    def _seconds_left(subscription) -> float:
+        return (_parse_graph_time(subscription['expiration']) - datetime.now(timezone.utc)).total_seconds()
+
+    def start(self):
+        """Ensure the subscription now and keep renewing it on a background thread."""
+        self._thread = threading.Thread(target=self._run, name='graph-subscription', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._wake_event.set()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            force = self._wake_event.is_set()
+            self._wake_event.clear()
+            try:
+                self.ensure(force_renew=force)
+                subscription = self.state.get_subscription(self.resource)
+                wait = max(self._seconds_left(subscription) - RENEW_BEFORE.total_seconds(), 60.0)
+            except Exception as e:
+                logging.error(f"Subscription maintenance failed, retrying in 60s: {e}")
+                wait = 60.0
+            self._wake_event.wait(wait)
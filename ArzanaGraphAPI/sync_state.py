@@ -0,0 +1,149 @@
+"""
+Durable sync state for the Graph monitor
+SQLite store for the inbox deltaLink and the ids of messages already examined,
+so a restart resumes from the last delta round instead of re-listing the inbox.
+Also keeps the change-notification subscription so a restart renews it instead of
+creating a duplicate.
+"""
+
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+# A 'processing' claim not updated for this long belongs to a monitor that died mid-email
+DEFAULT_STALE_CLAIM_SECONDS = 900
+
+
+class MailSyncState:
+    """deltaLink checkpoint + processed message ids (one SQLite file)."""
+
+    def __init__(self, db_path, stale_claim_seconds: float = DEFAULT_STALE_CLAIM_SECONDS):
+        self.db_path = str(db_path)
+        self.stale_claim_seconds = stale_claim_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS delta_links ("
+            "folder TEXT PRIMARY KEY, delta_link TEXT NOT NULL, updated_at TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS processed_messages ("
+            "message_id TEXT PRIMARY KEY, status TEXT NOT NULL, subject TEXT, "
+            "first_seen_at TEXT NOT NULL, updated_at TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS subscriptions ("
+            "resource TEXT PRIMARY KEY, subscription_id TEXT NOT NULL, client_state TEXT NOT NULL, "
+            "expiration TEXT NOT NULL)"
+        )
+
+    @staticmethod
+    def _now() -> str:
+        return datetime.now(timezone.utc).isoformat()
+
+    def _stale_cutoff(self) -> str:
+        return (datetime.now(timezone.utc) - timedelta(seconds=self.stale_claim_seconds)).isoformat()
+
+    def get_delta_link(self, folder: str = 'inbox') -> Optional[str]:
+        """Saved deltaLink for a folder, or None before the first completed round."""
+        with self._lock:
+            row = self._conn.execute("SELECT delta_link FROM delta_links WHERE folder = ?", (folder,)).fetchone()
+        return row[0] if row else None
+
+    def save_delta_link(self, delta_link: str, folder: str = 'inbox'):
+        """Checkpoint the deltaLink after a round has been fully handled."""
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO delta_links VALUES (?, ?, ?)", (folder, delta_link, self._now()))
+
+    def clear_delta_link(self, folder: str = 'inbox'):
+        """Forget the deltaLink (expired sync state); the next round is a full sync."""
+        with self._lock:
+            self._conn.execute("DELETE FROM delta_links WHERE folder = ?", (folder,))
+
+    def claim(self, message_id: str, subject: str = '') -> bool:
+        """
+        Record a message as being handled (takes over a stale 'processing' claim).
+
+        Returns:
+            True if the message was new or its claim stale, False if it is claimed (skip it)
+        """
+        now = self._now()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO processed_messages VALUES (?, 'processing', ?, ?, ?) "
+                "ON CONFLICT(message_id) DO UPDATE SET updated_at = excluded.updated_at "
+                "WHERE status = 'processing' AND updated_at < ?",
+                (message_id, subject, now, now, self._stale_cutoff())
+            )
+        return cursor.rowcount == 1
+
+    def refresh_claim(self, message_id: str):
+        """Restart the staleness clock of a 'processing' claim (re-submitted after a restart)."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE processed_messages SET updated_at = ? WHERE message_id = ? AND status = 'processing'",
+                (self._now(), message_id)
+            )
+
+    def interrupted_claims(self) -> List[Tuple[str, str]]:
+        """(message_id, subject) of every message still 'processing' (call before the pool starts)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT message_id, subject FROM processed_messages WHERE status = 'processing'"
+            ).fetchall()
+        return [(row[0], row[1] or '') for row in rows]
+
+    def mark(self, message_id: str, status: str):
+        """Set the outcome of a claimed message (po_processed, not_po, error, ...)."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE processed_messages SET status = ?, updated_at = ? WHERE message_id = ?",
+                (status, self._now(), message_id)
+            )
+
+    def is_processed(self, message_id: str) -> bool:
+        """True once a message has an outcome or a live claim (stale 'processing' claims do not count)."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM processed_messages WHERE message_id = ? "
+                "AND NOT (status = 'processing' AND updated_at < ?)",
+                (message_id, self._stale_cutoff())
+            ).fetchone()
+        return row is not None
+
+    def prune(self, keep_days: int) -> int:
+        """
+        Drop processed ids older than keep_days.
+
+        Returns:
+            Number of rows removed
+        """
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=keep_days)).isoformat()
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM processed_messages WHERE first_seen_at < ?", (cutoff,))
+        return cursor.rowcount
+
+    def get_subscription(self, resource: str) -> Optional[Dict[str, str]]:
+        """Saved subscription for a resource: subscription_id, client_state, expiration."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT subscription_id, client_state, expiration FROM subscriptions WHERE resource = ?", (resource,)
+            ).fetchone()
+        if not row:
+            return None
+        return {'subscription_id': row[0], 'client_state': row[1], 'expiration': row[2]}
+
+    def save_subscription(self, resource: str, subscription_id: str, client_state: str, expiration: str):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO subscriptions VALUES (?, ?, ?, ?)",
+                               (resource, subscription_id, client_state, expiration))
+
+    def delete_subscription(self, resource: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM subscriptions WHERE resource = ?", (resource,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
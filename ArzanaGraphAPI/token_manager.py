@@ -0,0 +1,182 @@
+"""
+Access token lifecycle for the Graph monitor
+Keeps the current access token in memory, refreshes it on a background timer before it
+expires, and persists the MSAL token cache to disk encrypted (DPAPI on Windows,
+Keychain on macOS, libsecret on Linux via msal-extensions) so restarts skip the
+device-code login.
+"""
+
+import json
+import time
+import base64
+import logging
+import threading
+from typing import List, Optional
+
+from msal import PublicClientApplication, SerializableTokenCache
+
+# Refresh this long before the access token expires
+REFRESH_MARGIN_SECONDS = 300
+
+
+def build_token_cache(cache_path, allow_plaintext: bool = False):
+    """
+    Token cache persisted at cache_path, encrypted with the OS facility.
+
+    Args:
+        cache_path: Cache file location
+        allow_plaintext: Fall back to an unencrypted file when no OS encryption is available
+
+    Returns:
+        A PersistedTokenCache, or an in-memory cache if nothing can be persisted
+    """
+    try:
+        from msal_extensions import FilePersistence, PersistedTokenCache, build_encrypted_persistence
+        from msal_extensions.persistence import PersistenceNotFound
+    except ImportError:
+        logging.warning("msal-extensions not installed: token cache kept in memory (login needed after restart)")
+        return SerializableTokenCache()
+
+    try:
+        persistence = build_encrypted_persistence(str(cache_path))
+        persistence.load()  # libsecret/keychain problems surface on first use, not at build time
+    except PersistenceNotFound:
+        pass  # Nothing cached yet: first save() creates the encrypted file
+    except Exception as e:
+        if not allow_plaintext:
+            logging.warning(f"Encrypted token cache unavailable ({e}): token cache kept in memory")
+            return SerializableTokenCache()
+        logging.warning(f"Encrypted token cache unavailable ({e}): using a plaintext cache file")
+        persistence = FilePersistence(str(cache_path))
+    return PersistedTokenCache(persistence)
+
+
+def _log_token_claims(token: str):
+    """Log audience, scopes and expiry of a new access token (once per token, not per request)."""
+    try:
+        payload = token.split('.')[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+        logging.info(f"New access token: aud={claims.get('aud')} scopes={claims.get('scp', claims.get('roles'))} "
+                     f"exp={claims.get('exp')}")
+    except Exception:
+        # Personal-account (MSA) tokens are opaque, not JWTs
+        logging.info("New access token acquired")
+
+
+class TokenManager:
+    """Serves the cached access token and refreshes it ahead of expiry."""
+
+    def __init__(self, client_id: str, scopes: List[str], cache_path,
+                 authority: str = "https://login.microsoftonline.com/common",
+                 refresh_margin: float = REFRESH_MARGIN_SECONDS, allow_plaintext_cache: bool = False):
+        """
+        Initialize the manager.
+
+        Args:
+            client_id: App registration client id
+            scopes: Graph scopes to request
+            cache_path: Persisted MSAL cache file
+            authority: Login authority ('common' works for both AAD and personal accounts)
+            refresh_margin: Seconds before expiry at which the token is refreshed
+            allow_plaintext_cache: Persist the cache unencrypted when no OS encryption is available
+        """
+        self.scopes = scopes
+        self.refresh_margin = refresh_margin
+        self.app = PublicClientApplication(client_id, authority=authority,
+                                           token_cache=build_token_cache(cache_path, allow_plaintext_cache))
+        # (access token, refresh-at epoch); replaced as one tuple so readers need no lock
+        self._current = (None, 0.0)
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def get_token(self) -> str:
+        """
+        Current access token; only calls MSAL when the token is missing or about to expire.
+
+        Raises:
+            Exception: when no token can be acquired (silently or by device-code login)
+        """
+        token, refresh_at = self._current
+        if token and time.time() < refresh_at:
+            return token
+        with self._lock:
+            token, refresh_at = self._current
+            if token and time.time() < refresh_at:
+                return token  # Another thread refreshed while we waited
+            return self._acquire(interactive=True)
+
+    def _remember(self, result) -> str:
+        token = result['access_token']
+        lifetime = int(result.get('expires_in', 3600))
+        # Short-lived tokens are used for at least half their lifetime
+        self._current = (token, time.time() + max(lifetime - self.refresh_margin, lifetime / 2))
+        _log_token_claims(token)
+        return token
+
+    def _acquire(self, interactive: bool) -> Optional[str]:
+        """Refresh from the cache (refresh token), falling back to device-code login if interactive."""
+        accounts = self.app.get_accounts()
+        if accounts:
+            # force_refresh: MSAL would otherwise hand back the same soon-to-expire token
+            result = self.app.acquire_token_silent(self.scopes, account=accounts[0],
+                                                   force_refresh=self._current[0] is not None)
+            if result and 'access_token' in result:
+                return self._remember(result)
+            if result:
+                logging.warning(f"Silent token refresh failed: {result.get('error_description', result.get('error'))}")
+
+        if not interactive:
+            return None
+        return self._remember(self._device_flow_login())
+
+    def _device_flow_login(self):
+        logging.info("Starting device code flow authentication...")
+        flow = self.app.initiate_device_flow(scopes=self.scopes)
+
+        if 'user_code' not in flow:
+            error_msg = flow.get('error_description', flow.get('error', 'Unknown error'))
+            raise Exception(f"Failed to create device flow: {error_msg}")
+
+        print("\n" + "="*50)
+        print("USER LOGIN REQUIRED")
+        print("="*50)
+        print(f"\n1. Go to: {flow['verification_uri']}")
+        print(f"2. Enter code: {flow['user_code']}")
+        print("\nWaiting for you to complete sign-in...")
+        print("(This will continue automatically once you sign in)\n")
+
+        result = self.app.acquire_token_by_device_flow(flow)
+        if 'access_token' not in result:
+            raise Exception(f"Authentication failed: {result.get('error_description', 'Unknown error')}")
+        logging.info("Authentication successful!")
+        return result
+
+    def start(self):
+        """Refresh the token in the background ahead of expiry (call after the first get_token)."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='token-refresh', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            _, refresh_at = self._current
+            # get_token() only refreshes inline if this thread falls behind
+            wait = refresh_at - time.time()
+            if wait > 0:
+                self._stop_event.wait(wait)
+                continue
+            try:
+                with self._lock:
+                    refreshed = self._acquire(interactive=False)
+                if not refreshed:
+                    logging.warning("Background token refresh failed, retrying in 60s")
+                    self._stop_event.wait(60)
+            except Exception as e:
+                logging.error(f"Background token refresh error, retrying in 60s: {e}")
+                self._stop_event.wait(60)
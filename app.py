@@ -7,7 +7,8 @@ import os
 import json
 import tempfile
 from datetime import datetime
-from flask import Flask, render_template, request, jsonify, send_file, flash, redirect, url_for, Response
+import time
+from flask import Flask, render_template, request, jsonify, send_file, flash, redirect, url_for, Response, g
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
@@ -24,6 +25,12 @@ from step4_mapping import PartNumberMapper
 from step5_metrics_db_postgres import MetricsDatabase, ProcessingStatus, ValidationStatus, ErrorType
 from database_config import db_config
 from comprehensive_hybrid_database_manager import ComprehensiveHybridDatabaseManager
+from missing_fields_counter import MissingFieldsCounter
+from metrics_write_behind import WriteBehindMetricsDB
+from catalog_reloader import CatalogReloader
+from json_payload_codec import compact_json
+from stage_timing import collect_timings, timing_span
+import app_metrics
 
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-change-this'  # Change this in production
@@ -50,9 +57,46 @@ file_handler = FileUploadHandler(app.config['UPLOAD_FOLDER'])
 document_processor = DocumentProcessor()
 db_manager = ComprehensiveHybridDatabaseManager()  # Use comprehensive hybrid database manager
 part_mapper = PartNumberMapper(db_manager)  # Pass the hybrid manager to part mapper
-metrics_db = db_manager  # Use the same instance for metrics
+metrics_db = WriteBehindMetricsDB(db_manager)  # Same instance for metrics, status writes queued off the request path
+catalog_reloader = CatalogReloader(db_manager)  # Hot-swaps the catalog on Postgres NOTIFY (polls as a fallback)
+catalog_reloader.start()
 
-MISSING_FIELDS_TRACKER_PATH = 'data/missing_fields_tracker.json'
+MISSING_FIELDS_TRACKER_PATH = 'data/missing_fields_tracker.json'  # Legacy tracker, imported once into missing_field_counts
+missing_fields_counter = MissingFieldsCounter(metrics_db, legacy_tracker_path=MISSING_FIELDS_TRACKER_PATH)
+
+def collect_runtime_metrics():
+    """Refresh scrape-time gauges (spool depth, pending counters, DB pool usage)."""
+    metrics_registry = app_metrics.registry
+    metrics_registry.set('arzana_metrics_spool_depth', metrics_db.get_spool_depth())
+    metrics_registry.set('arzana_missing_fields_pending', missing_fields_counter.get_pending_total())
+    engine = getattr(db_config, 'engine', None)
+    pool = getattr(engine, 'pool', None)
+    if pool is not None and hasattr(pool, 'checkedout'):
+        metrics_registry.set('arzana_db_pool_connections', pool.checkedout(), labels={'state': 'checked_out'})
+        metrics_registry.set('arzana_db_pool_connections', pool.checkedin(), labels={'state': 'idle'})
+        metrics_registry.set('arzana_db_pool_connections', pool.overflow(), labels={'state': 'overflow'})
+
+app_metrics.install_timing_listeners()
+app_metrics.registry.add_collector(collect_runtime_metrics)
+app_metrics.start_snapshot_writer()
+
+@app.before_request
+def start_request_timer():
+    """Remember when the request started for the latency histogram."""
+    g.request_started_at = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    """Count the request and record its latency by endpoint (route name keeps cardinality bounded)."""
+    endpoint = request.endpoint or 'unmatched'
+    if endpoint != 'metrics':
+        app_metrics.registry.inc('arzana_http_requests_total',
+                                 labels={'endpoint': endpoint, 'status': str(response.status_code)})
+        started_at = getattr(g, 'request_started_at', None)
+        if started_at is not None:
+            app_metrics.registry.observe('arzana_http_request_duration_seconds',
+                                         time.perf_counter() - started_at, labels={'endpoint': endpoint})
+    return response
 
 def detect_missing_fields(epicor_json):
     """Detect which fields are marked as MISSING in the Epicor JSON."""
@@ -94,36 +138,16 @@ def detect_missing_fields(epicor_json):
     return missing
 
 def increment_missing_fields(missing_fields_list):
-    """Increment counters for missing fields."""
+    """Increment counters for missing fields (batched, flushed to the metrics DB in the background)."""
     try:
-        # Load current tracker
-        if os.path.exists(MISSING_FIELDS_TRACKER_PATH):
-            with open(MISSING_FIELDS_TRACKER_PATH, 'r') as f:
-                tracker = json.load(f)
-        else:
-            tracker = {}
-        
-        # Increment counters
-        for field in missing_fields_list:
-            if field not in tracker:
-                tracker[field] = 0
-            tracker[field] += 1
-        
-        # Save tracker
-        with open(MISSING_FIELDS_TRACKER_PATH, 'w') as f:
-            json.dump(tracker, f, indent=2)
-            
+        missing_fields_counter.increment(missing_fields_list)
     except Exception as e:
         print(f"Error incrementing missing fields: {e}")
 
 def get_missing_fields_stats():
     """Get missing fields statistics."""
     try:
-        if not os.path.exists(MISSING_FIELDS_TRACKER_PATH):
-            return []
-        
-        with open(MISSING_FIELDS_TRACKER_PATH, 'r') as f:
-            tracker = json.load(f)
+        tracker = missing_fields_counter.get_counts()
         
         # Calculate total and percentages
         total = sum(tracker.values())
@@ -229,6 +253,15 @@ def upload_file_simple():
 @app.route('/upload', methods=['POST'])
 def upload_file():
     """Handle file upload and processing."""
+    app_metrics.registry.inc('arzana_uploads_in_flight')
+    try:
+        with collect_timings() as stage_timings:
+            return _process_upload(stage_timings)
+    finally:
+        app_metrics.registry.dec('arzana_uploads_in_flight')
+
+def _process_upload(stage_timings):
+    """Run the upload pipeline; per-stage timings are stored with the processing result."""
     global current_progress
     
     # Create processing result record
@@ -285,7 +318,8 @@ def upload_file():
                 metrics_db.update_processing_result(
                     processing_result.id,
                     processing_status=ProcessingStatus.ERROR,
-                    error_details=f'Document processing failed: {str(e)}'
+                    error_details=f'Document processing failed: {str(e)}',
+                    stage_timings=stage_timings.to_json()
                 )
             # Clean up uploaded file
             file_handler.cleanup_file(file_path)
@@ -301,7 +335,8 @@ def upload_file():
                 metrics_db.update_processing_result(
                     processing_result.id,
                     processing_status=ProcessingStatus.ERROR,
-                    error_details=f'Mapping failed: {str(e)}'
+                    error_details=f'Mapping failed: {str(e)}',
+                    stage_timings=stage_timings.to_json()
                 )
             # Clean up uploaded file
             file_handler.cleanup_file(file_path)
@@ -310,13 +345,14 @@ def upload_file():
         # Save processed data
         current_progress = {'percentage': 90, 'status': 'Finalizing results...'}
         
-        part_mapper.save_mapped_data(mapped_data, processed_path)
-        
-        # Generate manual review report
-        review_report = part_mapper.generate_manual_review_report(mapped_data)
-        
-        # Get validation results
-        validation = part_mapper.validate_for_epicor_export(mapped_data)
+        with timing_span('review_and_validation'):
+            part_mapper.save_mapped_data(mapped_data, processed_path)
+            
+            # Generate manual review report
+            review_report = part_mapper.generate_manual_review_report(mapped_data)
+            
+            # Get validation results
+            validation = part_mapper.validate_for_epicor_export(mapped_data)
         
         # Calculate metrics
         summary = mapped_data.processing_summary
@@ -352,16 +388,16 @@ def upload_file():
         try:
             # First try the normal Epicor export with validation
             epicor_json = part_mapper.export_to_epicor_json(mapped_data)
-            raw_json_data = json.dumps(epicor_json, indent=2)
+            raw_json_data = compact_json(epicor_json)
         except Exception as e:
             # If Epicor export fails due to validation, try to generate Epicor format anyway
             try:
                 # Generate Epicor format without strict validation
                 epicor_json = part_mapper._generate_epicor_format_unvalidated(mapped_data)
-                raw_json_data = json.dumps(epicor_json, indent=2)
+                raw_json_data = compact_json(epicor_json)
             except Exception as e2:
                 # If that also fails, fall back to internal format
-                raw_json_data = json.dumps(part_mapper.export_to_json(mapped_data), indent=2)
+                raw_json_data = compact_json(part_mapper.export_to_json(mapped_data))
         
         metrics_db.update_processing_result(
             processing_result.id,
@@ -380,7 +416,8 @@ def upload_file():
             epicor_ready=validation.get('is_valid', False),
             epicor_ready_with_one_click=validation.get('is_valid', False) and missing_info_count == 0,
             missing_info_count=missing_info_count,
-            raw_json_data=raw_json_data
+            raw_json_data=raw_json_data,
+            stage_timings=stage_timings.to_json()
         )
         
         # Detect missing fields in the Epicor JSON for tracking
@@ -422,7 +459,8 @@ def upload_file():
             metrics_db.update_processing_result(
                 processing_result.id,
                 processing_status=ProcessingStatus.ERROR,
-                error_details=f'Unexpected error: {str(e)}'
+                error_details=f'Unexpected error: {str(e)}',
+                stage_timings=stage_timings.to_json()
             )
         return jsonify({'error': f'Unexpected error: {str(e)}'}), 500
 
@@ -552,7 +590,7 @@ def update_customer_mapping(filename):
         # Save updated data
         updated_json = part_mapper.export_to_json(updated_data)
         with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(updated_json, f, indent=2, ensure_ascii=False)
+            json.dump(updated_json, f, separators=(',', ':'), ensure_ascii=False)
         
         # Return updated data and validation
         return jsonify({
@@ -601,7 +639,7 @@ def update_part_mapping(filename):
         # Save updated data
         updated_json = part_mapper.export_to_json(updated_data)
         with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(updated_json, f, indent=2, ensure_ascii=False)
+            json.dump(updated_json, f, separators=(',', ':'), ensure_ascii=False)
         
         # Return updated data and validation
         return jsonify({
@@ -624,6 +662,15 @@ def file_management():
     """View file management with correct/error buttons."""
     return render_template('files.html')
 
+@app.route('/metrics')
+def metrics():
+    """Prometheus text exposition of hot-path counters, summed across gunicorn workers."""
+    try:
+        return Response(app_metrics.render_metrics(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+    except Exception as e:
+        print(f"❌ Error rendering metrics: {e}")
+        return Response(f"# metrics unavailable: {e}\n", status=500, mimetype='text/plain')
+
 @app.route('/api/dashboard/metrics')
 def get_dashboard_metrics():
     """Get dashboard metrics data."""
@@ -631,6 +678,8 @@ def get_dashboard_metrics():
         metrics = metrics_db.get_dashboard_metrics()
         # Add missing fields stats
         metrics['missing_fields_stats'] = get_missing_fields_stats()
+        # Add per-stage latency percentiles
+        metrics['stage_latency'] = metrics_db.get_stage_latency_percentiles()
         return jsonify(metrics)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -652,7 +701,8 @@ def get_processing_files():
         per_page = request.args.get('per_page', 20, type=int)
         offset = (page - 1) * per_page
         
-        results = metrics_db.get_all_processing_results(limit=per_page, offset=offset)
+        # Payloads are fetched on demand via /api/files/<id>/raw-json
+        results = metrics_db.get_all_processing_results(limit=per_page, offset=offset, include_raw_json=False)
         
         # Convert to serializable format
         files_data = []
@@ -692,7 +742,6 @@ def get_processing_files():
                 'epicor_ready': result.epicor_ready,
                 'epicor_ready_with_one_click': result.epicor_ready_with_one_click,
                 'missing_info_count': result.missing_info_count,
-                'raw_json_data': result.raw_json_data,
                 'processing_summary': processing_summary,
                 'created_at': result.created_at.isoformat(),
                 'updated_at': result.updated_at.isoformat()
@@ -707,6 +756,17 @@ def get_processing_files():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/files/<int:file_id>/raw-json')
+def get_file_raw_json(file_id):
+    """Get the raw Epicor JSON payload for a single file."""
+    try:
+        raw_json_data = metrics_db.get_raw_json_data(file_id)
+        if not raw_json_data:
+            return jsonify({'success': False, 'error': 'No JSON data available'}), 404
+        return jsonify({'success': True, 'raw_json_data': raw_json_data})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/files/<int:file_id>/mark-correct', methods=['POST'])
 def mark_file_correct(file_id):
     """Mark a file as correct."""
@@ -1016,7 +1076,7 @@ def get_processed_email():
             return jsonify({'success': False, 'error': 'Email ID, subject, or attachment name required'}), 400
         
         # Search for processed file
-        processed_files = metrics_db.get_all_processing_results()
+        processed_files = metrics_db.get_all_processing_results(include_raw_json=False)
         
         if not processed_files or len(processed_files) == 0:
             return jsonify({'success': False, 'error': 'No processed files found in database'}), 404
@@ -1050,8 +1110,8 @@ def get_processed_email():
         # Get the file ID for future updates
         file_id = matching_file.get('id', 0)
         
-        # Get the raw JSON data
-        raw_json = matching_file.get('raw_json_data')
+        # Get the raw JSON data (fetched only for the matched file)
+        raw_json = metrics_db.get_raw_json_data(file_id) if file_id else None
         if raw_json:
             try:
                 data = json.loads(raw_json) if isinstance(raw_json, str) else raw_json
@@ -1086,7 +1146,7 @@ def save_updated_data():
             return jsonify({'success': False, 'error': 'No updated data provided'}), 400
         
         # Find the matching processed file
-        processed_files = metrics_db.get_all_processing_results()
+        processed_files = metrics_db.get_all_processing_results(include_raw_json=False)
         files_list = []
         for file in processed_files:
             if hasattr(file, '__dict__'):
@@ -1128,7 +1188,7 @@ def save_updated_data():
         processed_path = matching_file.get('processed_file_path')
         if processed_path and os.path.exists(processed_path):
             with open(processed_path, 'w') as f:
-                json.dump(updated_data, f, indent=2)
+                json.dump(updated_data, f, separators=(',', ':'))
         
         return jsonify({'success': True, 'message': 'Data updated successfully'})
         
@@ -1183,7 +1243,7 @@ def report_error():
             return jsonify({'success': False, 'error': 'Error type required'}), 400
         
         # Find the file in database
-        processed_files = metrics_db.get_all_processing_results()
+        processed_files = metrics_db.get_all_processing_results(include_raw_json=False)
         files_list = []
         for file in processed_files:
             if hasattr(file, '__dict__'):
@@ -0,0 +1,294 @@
+"""
+App Metrics
+Minimal Prometheus-style metrics registry (counters, gauges, histograms) rendered in the
+text exposition format for the /metrics endpoint.
+
+Each gunicorn worker keeps its own registry and periodically writes a snapshot to
+METRICS_SNAPSHOT_DIR. The worker that serves /metrics merges the snapshots from every live
+worker, so a scrape sees whole-instance totals instead of whichever worker answered it.
+"""
+
+import os
+import json
+import time
+import threading
+from typing import Dict, List, Optional, Tuple, Callable
+
+METRICS_SNAPSHOT_DIR = os.environ.get('METRICS_SNAPSHOT_DIR', 'data/metrics_workers')
+SNAPSHOT_INTERVAL_SECONDS = 5.0
+SNAPSHOT_STALE_SECONDS = 60.0
+
+# Bucket bounds (seconds) sized for pipeline stages: sub-second DB calls up to multi-minute uploads
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Optional[Dict[str, str]]) -> LabelKey:
+    return tuple(sorted((labels or {}).items()))
+
+
+def _format_labels(label_key: LabelKey, extra: Optional[Dict[str, str]] = None) -> str:
+    items = list(label_key) + sorted((extra or {}).items())
+    if not items:
+        return ''
+    escaped = []
+    for name, value in items:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        escaped.append(f'{name}="{value}"')
+    return '{' + ','.join(escaped) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class MetricsRegistry:
+    """Thread-safe registry of counters, gauges and histograms."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}  # name -> (type, help)
+        self._values: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, Dict[str, object]]] = {}
+        self._buckets: Dict[str, Tuple[float, ...]] = {}
+        self._collectors: List[Callable[[], None]] = []
+
+    def describe(self, name: str, metric_type: str, help_text: str,
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        """Register a metric name (idempotent)."""
+        with self._lock:
+            self._help.setdefault(name, (metric_type, help_text))
+            if metric_type == 'histogram':
+                self._buckets.setdefault(name, tuple(buckets))
+                self._histograms.setdefault(name, {})
+            else:
+                self._values.setdefault(name, {})
+
+    def inc(self, name: str, amount: float = 1.0, labels: Optional[Dict[str, str]] = None) -> None:
+        """Increment a counter or gauge."""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._values.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + amount
+
+    def dec(self, name: str, amount: float = 1.0, labels: Optional[Dict[str, str]] = None) -> None:
+        """Decrement a gauge."""
+        self.inc(name, -amount, labels)
+
+    def set(self, name: str, value: float, labels: Optional[Dict[str, str]] = None) -> None:
+        """Set a gauge."""
+        with self._lock:
+            self._values.setdefault(name, {})[_label_key(labels)] = float(value)
+
+    def observe(self, name: str, value: float, labels: Optional[Dict[str, str]] = None) -> None:
+        """Record a histogram observation."""
+        key = _label_key(labels)
+        with self._lock:
+            buckets = self._buckets.get(name, DEFAULT_BUCKETS)
+            series = self._histograms.setdefault(name, {})
+            state = series.get(key)
+            if state is None:
+                state = series[key] = {'buckets': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    state['buckets'][i] += 1
+                    break
+            state['sum'] += value
+            state['count'] += 1
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        """Register a callback run right before rendering (for scrape-time gauges)."""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def run_collectors(self) -> None:
+        """Refresh scrape-time gauges."""
+        for collector in list(self._collectors):
+            try:
+                collector()
+            except Exception as e:
+                print(f"⚠️ Metrics collector failed: {e}")
+
+    def snapshot(self) -> Dict[str, object]:
+        """JSON-serializable copy of every series."""
+        with self._lock:
+            return {
+                'help': {name: list(info) for name, info in self._help.items()},
+                'values': {name: [[list(map(list, key)), value] for key, value in series.items()]
+                           for name, series in self._values.items()},
+                'histograms': {name: [[list(map(list, key)), dict(state, buckets=list(state['buckets']))]
+                                      for key, state in series.items()]
+                               for name, series in self._histograms.items()},
+                'buckets': {name: list(bounds) for name, bounds in self._buckets.items()}
+            }
+
+
+def merge_snapshots(snapshots: List[Dict[str, object]], local_only: Optional[set] = None) -> Dict[str, object]:
+    """
+    Sum snapshots from several workers.
+
+    Args:
+        snapshots: Worker snapshots (the serving worker's own snapshot first)
+        local_only: Metric names taken from the first snapshot only (host-level gauges every
+            worker reports identically, e.g. spool depth)
+    """
+    local_only = local_only or set()
+    merged = {'help': {}, 'values': {}, 'histograms': {}, 'buckets': {}}
+    for index, snap in enumerate(snapshots):
+        merged['help'].update({k: v for k, v in snap.get('help', {}).items() if k not in merged['help']})
+        merged['buckets'].update({k: v for k, v in snap.get('buckets', {}).items() if k not in merged['buckets']})
+        for name, series in snap.get('values', {}).items():
+            if name in local_only and index > 0:
+                continue
+            target = merged['values'].setdefault(name, {})
+            for key, value in series:
+                key = tuple(tuple(pair) for pair in key)
+                target[key] = target.get(key, 0.0) + value
+        for name, series in snap.get('histograms', {}).items():
+            target = merged['histograms'].setdefault(name, {})
+            for key, state in series:
+                key = tuple(tuple(pair) for pair in key)
+                existing = target.get(key)
+                if existing is None:
+                    target[key] = {'buckets': list(state['buckets']), 'sum': state['sum'], 'count': state['count']}
+                elif len(existing['buckets']) == len(state['buckets']):
+                    existing['buckets'] = [a + b for a, b in zip(existing['buckets'], state['buckets'])]
+                    existing['sum'] += state['sum']
+                    existing['count'] += state['count']
+    return merged
+
+
+def render_exposition(merged: Dict[str, object]) -> str:
+    """Render merged series in the Prometheus text exposition format (v0.0.4)."""
+    lines = []
+    names = sorted(set(merged['values']) | set(merged['histograms']))
+    for name in names:
+        metric_type, help_text = merged['help'].get(name, ('untyped', ''))
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        if name in merged['histograms']:
+            bounds = merged['buckets'].get(name, list(DEFAULT_BUCKETS))
+            for key, state in sorted(merged['histograms'][name].items()):
+                cumulative = 0
+                for bound, count in zip(bounds, state['buckets']):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(key, {'le': _format_value(bound)})} {cumulative}")
+                lines.append(f"{name}_bucket{_format_labels(key, {'le': '+Inf'})} {state['count']}")
+                lines.append(f"{name}_sum{_format_labels(key)} {_format_value(state['sum'])}")
+                lines.append(f"{name}_count{_format_labels(key)} {state['count']}")
+        else:
+            for key, value in sorted(merged['values'][name].items()):
+                lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+    return '\n'.join(lines) + '\n'
+
+
+# Process-wide registry
+registry = MetricsRegistry()
+
+registry.describe('arzana_uploads_in_flight', 'gauge', 'Uploads currently being processed')
+registry.describe('arzana_http_requests_total', 'counter', 'HTTP requests by endpoint and status code')
+registry.describe('arzana_http_request_duration_seconds', 'histogram', 'HTTP request latency by endpoint')
+registry.describe('arzana_stage_duration_seconds', 'histogram', 'Pipeline stage latency')
+registry.describe('arzana_llm_calls_total', 'counter', 'LLM requests by call site')
+registry.describe('arzana_llm_tokens_total', 'counter', 'LLM tokens consumed by call site')
+registry.describe('arzana_cache_requests_total', 'counter', 'Cache lookups by cache and result (hit/miss)')
+registry.describe('arzana_catalog_rows', 'gauge', 'Rows loaded in the in-memory catalog')
+registry.describe('arzana_catalog_index_build_seconds', 'gauge', 'Duration of the last catalog index build')
+registry.describe('arzana_metrics_spool_depth', 'gauge', 'Metrics updates waiting in the write-behind spool')
+registry.describe('arzana_missing_fields_pending', 'gauge', 'Missing-field increments not yet flushed')
+registry.describe('arzana_db_pool_connections', 'gauge', 'SQLAlchemy pool connections by state')
+registry.describe('arzana_worker_up', 'gauge', 'Live gunicorn workers reporting metrics')
+
+# Gauges that describe shared state (the spool file, the catalog) rather than per-worker
+# activity; taken from the serving worker only instead of being summed
+HOST_LEVEL_METRICS = {'arzana_metrics_spool_depth', 'arzana_catalog_rows', 'arzana_catalog_index_build_seconds'}
+
+
+def record_cache_access(cache: str, hit: bool) -> None:
+    """Count a cache hit or miss."""
+    registry.inc('arzana_cache_requests_total', labels={'cache': cache, 'result': 'hit' if hit else 'miss'})
+
+
+def record_catalog_index_build(seconds: float, parts: int, customers: int) -> None:
+    """Record catalog size and how long the last index build took."""
+    registry.set('arzana_catalog_index_build_seconds', seconds)
+    registry.set('arzana_catalog_rows', parts, labels={'table': 'parts'})
+    registry.set('arzana_catalog_rows', customers, labels={'table': 'customers'})
+
+
+def install_timing_listeners() -> None:
+    """Feed stage spans and LLM calls from stage_timing into the registry."""
+    from stage_timing import add_span_listener, add_llm_listener
+
+    def on_span(stage: str, duration: float) -> None:
+        registry.observe('arzana_stage_duration_seconds', duration, labels={'stage': stage})
+
+    def on_llm_call(call_site: str, tokens: Optional[int]) -> None:
+        registry.inc('arzana_llm_calls_total', labels={'call_site': call_site})
+        if tokens:
+            registry.inc('arzana_llm_tokens_total', tokens, labels={'call_site': call_site})
+
+    add_span_listener(on_span)
+    add_llm_listener(on_llm_call)
+
+
+def _snapshot_path(pid: int) -> str:
+    return os.path.join(METRICS_SNAPSHOT_DIR, f"worker_{pid}.json")
+
+
+def write_snapshot() -> None:
+    """Write this worker's snapshot atomically."""
+    os.makedirs(METRICS_SNAPSHOT_DIR, exist_ok=True)
+    path = _snapshot_path(os.getpid())
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(registry.snapshot(), f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+def render_metrics() -> str:
+    """Collect, merge every live worker's snapshot and render the exposition text."""
+    registry.run_collectors()
+    registry.set('arzana_worker_up', 1)
+    own = registry.snapshot()
+    snapshots = [own]
+    now = time.time()
+    try:
+        write_snapshot()
+        for filename in os.listdir(METRICS_SNAPSHOT_DIR):
+            if not filename.endswith('.json') or filename == os.path.basename(_snapshot_path(os.getpid())):
+                continue
+            path = os.path.join(METRICS_SNAPSHOT_DIR, filename)
+            try:
+                if now - os.path.getmtime(path) > SNAPSHOT_STALE_SECONDS:
+                    os.remove(path)  # Worker is gone
+                    continue
+                with open(path, 'r') as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+    except OSError as e:
+        print(f"⚠️ Could not merge worker metrics snapshots: {e}")
+    return render_exposition(merge_snapshots(snapshots, local_only=HOST_LEVEL_METRICS))
+
+
+def start_snapshot_writer(interval: float = SNAPSHOT_INTERVAL_SECONDS) -> threading.Thread:
+    """Start the background thread that keeps this worker's snapshot fresh."""
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                registry.run_collectors()
+                registry.set('arzana_worker_up', 1)
+                write_snapshot()
+            except Exception as e:
+                print(f"⚠️ Metrics snapshot write failed: {e}")
+
+    thread = threading.Thread(target=loop, name="metrics-snapshot", daemon=True)
+    thread.start()
+    return thread
@@ -16,15 +16,12 @@ from step2_ocr_ai import DocumentProcessor
 from step3_databases import DatabaseManager
 from step4_mapping import PartNumberMapper
 
-def process_single_po(po_path, po_name):
+def process_single_po(po_path, po_name, processor, db_manager):
     """Process a single PO and return the result."""
     try:
         print(f"🔄 Processing {po_name}...")
         
-        # Initialize components for this thread
-        processor = DocumentProcessor()
-        db_manager = DatabaseManager()
-        db_manager.load_databases()
+        # Processor and catalog are shared; the mapper keeps per-PO stats so each thread gets its own
         part_mapper = PartNumberMapper(db_manager)
         
         # Process document
@@ -141,12 +138,17 @@ def main():
     
     start_time = time.time()
     
+    # Load the catalog and create the API clients once for all threads
+    processor = DocumentProcessor()
+    db_manager = DatabaseManager()
+    db_manager.load_databases()
+    
     # Process POs in parallel
     print(f"\n📋 Processing {len(pos_to_process)} POs in parallel...")
     with ThreadPoolExecutor(max_workers=3) as executor:
         # Submit all tasks
         future_to_po = {
-            executor.submit(process_single_po, po_path, po_name): (po_path, po_name)
+            executor.submit(process_single_po, po_path, po_name, processor, db_manager): (po_path, po_name)
             for po_path, po_name in pos_to_process
         }
         
@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+"""
+Batch Engine
+Processes purchase orders in-process (no Flask server): extraction runs in a thread pool
+that shares one DocumentProcessor and its API clients, and part/customer matching runs
+in a process pool whose workers map the shared catalog snapshot and indexes.
+
+Every finished PO is appended to a checkpoint file, and extraction results are kept on
+disk, so an interrupted run resumes where it stopped without repeating LLM calls.
+
+Usage:
+    python batch_engine.py samplePOs/ --output batch_results/backfill
+    python batch_engine.py archive/2024/ --extract-workers 8 --match-workers 4 --limit 1000
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from stage_timing import collect_timings, percentile, summarize_stage_timings
+
+DEFAULT_EXTENSIONS = ('pdf',)
+CHECKPOINT_FILE = 'checkpoint.jsonl'
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Matching state of one process-pool worker (built once by _init_match_worker)
+_worker_mapper = None
+
+
+@dataclass
+class BatchSummary:
+    """Outcome of a batch run."""
+    output_dir: str
+    started_at: str
+    finished_at: str = ''
+    total_files: int = 0
+    processed: int = 0
+    skipped_from_checkpoint: int = 0
+    successful: int = 0
+    failed: int = 0
+    epicor_ready: int = 0
+    wall_seconds: float = 0.0
+    throughput_per_minute: float = 0.0
+    po_seconds: Dict[str, float] = field(default_factory=dict)
+    stage_latency: Dict[str, Any] = field(default_factory=dict)
+    failures: List[Dict[str, str]] = field(default_factory=list)
+
+
+def file_key(path: Path) -> str:
+    """Content hash of a PO file (renamed or duplicated files are processed once)."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:32]
+
+
+def find_po_files(inputs: Iterable[str], extensions: Iterable[str] = DEFAULT_EXTENSIONS) -> List[Path]:
+    """
+    Expand files and directories (recursively) into PO files with the given extensions.
+
+    Returns:
+        Sorted, de-duplicated paths
+    """
+    suffixes = {f".{ext.lower().lstrip('.')}" for ext in extensions}
+    files = set()
+    for item in inputs:
+        path = Path(item)
+        if path.is_dir():
+            files.update(p for p in path.rglob('*') if p.is_file() and p.suffix.lower() in suffixes)
+        elif path.is_file():
+            files.add(path)
+        else:
+            print(f"⚠️ Input not found: {item}")
+    return sorted(files)
+
+
+def _create_db_manager():
+    """Same database manager as the web app; the catalog comes from the local snapshot when warm."""
+    from comprehensive_hybrid_database_manager import ComprehensiveHybridDatabaseManager
+    db_manager = ComprehensiveHybridDatabaseManager()
+    # Load now so every PO sees the same catalog and the first one does not pay for it
+    db_manager.get_parts_dataframe()
+    db_manager.get_customers_dataframe()
+    return db_manager
+
+
+def _init_match_worker():
+    """Process-pool initializer: one database manager and mapper per worker process."""
+    global _worker_mapper
+    from step4_mapping import PartNumberMapper
+    _worker_mapper = PartNumberMapper(_create_db_manager())
+
+
+def _match_po(po_data: Dict[str, Any], mapper=None) -> Dict[str, Any]:
+    """
+    Map parts/customer and build the Epicor JSON (runs in a match worker).
+
+    Returns:
+        epicor_json, mapped (internal format), validation and stage timings
+    """
+    mapper = mapper or _worker_mapper
+    with collect_timings() as timings:
+        mapped_data = mapper.process_purchase_order(po_data)
+        validation = mapper.validate_for_epicor_export(mapped_data)
+        try:
+            epicor_json = mapper.export_to_epicor_json(mapped_data)
+        except Exception:
+            # Same fallback as the upload route: keep the unvalidated Epicor payload for review
+            epicor_json = mapper._generate_epicor_format_unvalidated(mapped_data)
+    return {
+        'epicor_json': epicor_json,
+        'mapped': mapper.export_to_json(mapped_data),
+        'validation': validation,
+        'timings': timings.to_dict()
+    }
+
+
+class BatchEngine:
+    """Runs extraction and matching for many POs with shared clients, catalog and checkpoints."""
+
+    def __init__(self, output_dir: str = 'batch_results/run', extract_workers: int = 4,
+                 match_workers: Optional[int] = None, resume: bool = True, retry_failed: bool = True):
+        """
+        Initialize the engine.
+
+        Args:
+            output_dir: Run directory (checkpoint, extracted data, Epicor JSON, summary)
+            extract_workers: Threads for document extraction (I/O bound: OCR and LLM calls)
+            match_workers: Processes for matching; 0 matches in this process (default: CPU count, max 4)
+            resume: Skip POs already completed according to the checkpoint
+            retry_failed: On resume, process POs that failed last time again
+        """
+        self.output_dir = Path(output_dir)
+        self.extract_workers = max(1, extract_workers)
+        self.match_workers = min(os.cpu_count() or 1, 4) if match_workers is None else max(0, match_workers)
+        self.resume = resume
+        self.retry_failed = retry_failed
+
+        self.extracted_dir = self.output_dir / 'extracted'
+        self.epicor_dir = self.output_dir / 'epicor'
+        self.checkpoint_path = self.output_dir / CHECKPOINT_FILE
+        for directory in (self.output_dir, self.extracted_dir, self.epicor_dir):
+            directory.mkdir(parents=True, exist_ok=True)
+
+        self._processor = None
+        self._inline_mapper = None
+
+    # ------------------------------------------------------------------
+    # Checkpoint
+    # ------------------------------------------------------------------
+
+    def load_checkpoint(self) -> Dict[str, Dict[str, Any]]:
+        """Last checkpoint record per file key (later lines win)."""
+        records = {}
+        if not self.checkpoint_path.exists():
+            return records
+        with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # Torn last line from an interrupted run
+                records[record['key']] = record
+        return records
+
+    def _append_checkpoint(self, record: Dict[str, Any]):
+        with open(self.checkpoint_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, separators=(',', ':')) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    # ------------------------------------------------------------------
+    # Stages
+    # ------------------------------------------------------------------
+
+    def _get_processor(self):
+        if self._processor is None:
+            from step2_ocr_ai import DocumentProcessor
+            self._processor = DocumentProcessor()  # Shared by all extraction threads (one client pool)
+        return self._processor
+
+    def _extract(self, path: Path, key: str) -> Dict[str, Any]:
+        """Extract structured PO data, reusing a previous run's extraction when present."""
+        extracted_path = self.extracted_dir / f'{key}.json'
+        if extracted_path.exists():
+            with open(extracted_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+
+        with collect_timings() as timings:
+            po_data = self._get_processor().process_document(str(path))
+        po_data.pop('_raw_text', None)  # Large and not used by matching
+        result = {'po_data': po_data, 'timings': timings.to_dict()}
+
+        tmp_path = extracted_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, default=str)
+        os.replace(tmp_path, extracted_path)
+        return result
+
+    def _match_inline(self, po_data: Dict[str, Any]) -> Dict[str, Any]:
+        if self._inline_mapper is None:
+            from step4_mapping import PartNumberMapper
+            self._inline_mapper = PartNumberMapper(_create_db_manager())
+        return _match_po(po_data, self._inline_mapper)
+
+    def _write_result(self, path: Path, key: str, extraction: Dict[str, Any], match: Dict[str, Any],
+                      started: float) -> Dict[str, Any]:
+        output_path = self.epicor_dir / f'{path.stem}_{key[:8]}_epicor.json'
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(match['epicor_json'], f, indent=2, default=str)
+
+        stages = dict(extraction.get('timings', {}).get('stages', {}))
+        for stage, duration in match['timings'].get('stages', {}).items():
+            stages[stage] = stages.get(stage, 0.0) + duration
+        return {
+            'key': key,
+            'source': str(path),
+            'status': 'ok',
+            'output': str(output_path),
+            'epicor_ready': bool(match['validation'].get('is_valid', False)),
+            'processing_summary': match['mapped'].get('processing_summary', {}),
+            'seconds': round(time.time() - started, 3),
+            'stage_timings': {'stages': stages, 'total': round(time.time() - started, 3)},
+            'finished_at': datetime.now().isoformat()
+        }
+
+    # ------------------------------------------------------------------
+    # Run
+    # ------------------------------------------------------------------
+
+    def run(self, paths: List[Path]) -> BatchSummary:
+        """
+        Process PO files and write outputs, checkpoint and summary.json to the run directory.
+
+        Args:
+            paths: PO files (see find_po_files)
+
+        Returns:
+            BatchSummary for this run (completed checkpoint entries are counted as skipped)
+        """
+        run_start = time.time()
+        summary = BatchSummary(output_dir=str(self.output_dir), started_at=datetime.now().isoformat(),
+                               total_files=len(paths))
+
+        checkpoint = self.load_checkpoint() if self.resume else {}
+        pending = []
+        seen_keys = set()
+        for path in paths:
+            key = file_key(path)
+            if key in seen_keys:
+                continue  # Same document twice in the input
+            seen_keys.add(key)
+            previous = checkpoint.get(key)
+            if previous and (previous['status'] == 'ok' or not self.retry_failed):
+                summary.skipped_from_checkpoint += 1
+                continue
+            pending.append((path, key))
+
+        print(f"🚀 Batch run: {len(pending)} to process, {summary.skipped_from_checkpoint} already done "
+              f"({self.extract_workers} extraction threads, {self.match_workers or 'inline'} match workers)")
+        if not pending:
+            return self._finish(summary, run_start)
+
+        records = []
+        match_pool = None
+        if self.match_workers:
+            # spawn: workers must not inherit the parent's database connections
+            match_pool = ProcessPoolExecutor(max_workers=self.match_workers,
+                                             mp_context=multiprocessing.get_context('spawn'),
+                                             initializer=_init_match_worker)
+        extract_pool = ThreadPoolExecutor(max_workers=self.extract_workers, thread_name_prefix='extract')
+
+        try:
+            # Warm the catalog once in this process so workers map an existing snapshot and indexes
+            if match_pool is not None:
+                _create_db_manager()
+
+            queue = iter(pending)
+            extracting, matching = {}, {}
+            max_in_flight = self.extract_workers * 2  # Bounded so thousands of POs never sit in memory
+
+            def submit_extractions():
+                while len(extracting) + len(matching) < max_in_flight:
+                    item = next(queue, None)
+                    if item is None:
+                        return
+                    path, key = item
+                    extracting[extract_pool.submit(self._extract, path, key)] = (path, key, time.time())
+
+            submit_extractions()
+            while extracting or matching:
+                done, _ = wait(list(extracting) + list(matching), return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in extracting:
+                        path, key, started = extracting.pop(future)
+                        try:
+                            extraction = future.result()
+                            if match_pool is not None:
+                                match_future = match_pool.submit(_match_po, extraction['po_data'])
+                                matching[match_future] = (path, key, started, extraction)
+                                continue
+                            record = self._write_result(path, key, extraction,
+                                                        self._match_inline(extraction['po_data']), started)
+                        except Exception as e:
+                            record = self._failure(path, key, 'extraction', e, started)
+                    else:
+                        path, key, started, extraction = matching.pop(future)
+                        try:
+                            record = self._write_result(path, key, extraction, future.result(), started)
+                        except Exception as e:
+                            record = self._failure(path, key, 'matching', e, started)
+
+                    self._append_checkpoint(record)
+                    records.append(record)
+                    icon = '✅' if record['status'] == 'ok' else '❌'
+                    print(f"{icon} [{len(records)}/{len(pending)}] {path.name} ({record['seconds']:.1f}s)")
+                submit_extractions()
+
+        except KeyboardInterrupt:
+            print("⚠️ Interrupted - completed POs are checkpointed, run again to resume")
+            raise
+        finally:
+            extract_pool.shutdown(wait=False, cancel_futures=True)
+            if match_pool is not None:
+                match_pool.shutdown(wait=False, cancel_futures=True)
+
+        return self._finish(summary, run_start, records)
+
+    @staticmethod
+    def _failure(path: Path, key: str, stage: str, error: Exception, started: float) -> Dict[str, Any]:
+        print(f"❌ {path.name} failed during {stage}: {error}")
+        return {
+            'key': key,
+            'source': str(path),
+            'status': 'failed',
+            'stage': stage,
+            'error': str(error),
+            'seconds': round(time.time() - started, 3),
+            'finished_at': datetime.now().isoformat()
+        }
+
+    def _finish(self, summary: BatchSummary, run_start: float,
+                records: Optional[List[Dict[str, Any]]] = None) -> BatchSummary:
+        records = records or []
+        summary.finished_at = datetime.now().isoformat()
+        summary.processed = len(records)
+        summary.successful = sum(1 for r in records if r['status'] == 'ok')
+        summary.failed = len(records) - summary.successful
+        summary.epicor_ready = sum(1 for r in records if r.get('epicor_ready'))
+        summary.wall_seconds = round(time.time() - run_start, 2)
+        summary.throughput_per_minute = round(summary.processed / summary.wall_seconds * 60, 2) \
+            if summary.wall_seconds else 0.0
+
+        seconds = sorted(r['seconds'] for r in records)
+        if seconds:
+            summary.po_seconds = {'p50': round(percentile(seconds, 50), 2), 'p95': round(percentile(seconds, 95), 2),
+                                  'max': round(seconds[-1], 2)}
+        summary.stage_latency = summarize_stage_timings([r['stage_timings'] for r in records if 'stage_timings' in r])
+        summary.failures = [{'source': r['source'], 'stage': r['stage'], 'error': r['error']}
+                            for r in records if r['status'] != 'ok']
+
+        with open(self.output_dir / 'summary.json', 'w', encoding='utf-8') as f:
+            json.dump(asdict(summary), f, indent=2)
+
+        print(f"\n📊 Processed {summary.processed} ({summary.successful} ok, {summary.failed} failed, "
+              f"{summary.epicor_ready} Epicor-ready), {summary.skipped_from_checkpoint} skipped from checkpoint")
+        print(f"⏱️  {summary.wall_seconds:.1f}s wall, {summary.throughput_per_minute:.1f} POs/min")
+        print(f"📁 Results: {self.output_dir}")
+        return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Process purchase orders in bulk without the web server")
+    parser.add_argument('inputs', nargs='+', help="PO files or directories (searched recursively)")
+    parser.add_argument('--output', default=None, help="Run directory (default: batch_results/run_<timestamp>)")
+    parser.add_argument('--extensions', default=','.join(DEFAULT_EXTENSIONS),
+                        help="File extensions to pick up from directories (comma separated)")
+    parser.add_argument('--extract-workers', type=int, default=4, help="Extraction threads")
+    parser.add_argument('--match-workers', type=int, default=None,
+                        help="Matching processes (0 = match in this process)")
+    parser.add_argument('--limit', type=int, default=None, help="Only the first N files")
+    parser.add_argument('--no-resume', action='store_true', help="Ignore the run directory's checkpoint")
+    parser.add_argument('--skip-failed', action='store_true', help="On resume, do not retry failed POs")
+    args = parser.parse_args()
+
+    files = find_po_files(args.inputs, args.extensions.split(','))
+    if args.limit:
+        files = files[:args.limit]
+    if not files:
+        print("❌ No PO files found")
+        return 1
+
+    output_dir = args.output or f"batch_results/run_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    engine = BatchEngine(output_dir, extract_workers=args.extract_workers, match_workers=args.match_workers,
+                         resume=not args.no_resume, retry_failed=not args.skip_failed)
+    summary = engine.run(files)
+    return 0 if summary.failed == 0 else 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
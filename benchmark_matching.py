@@ -0,0 +1,477 @@
+#!/usr/bin/env python3
+"""
+Matching Benchmark
+Speed and accuracy harness for part and customer matching (map_line_item,
+_get_fuzzy_part_candidates, find_customer_by_company_name, _get_fuzzy_customer_candidates).
+
+Labeled cases come from:
+- golden Epicor payloads: batch_results/*_epicor_*.json, samplePOs/<po>.txt, and results
+  marked correct in the review UI (processing_results in the app database, plus the legacy
+  SQLite metrics DB). They give PO description -> PartNum, and ship-to name and
+  address -> CustNum.
+- synthetic variants of catalog entries (taken from the first engine with a loaded
+  catalog), using the spellings the matchers are built for (dashes, KOI prefix, ZTIP
+  suffix numbers, case, company suffixes)
+
+LLM calls are stubbed: the OpenAI client raises, so every call site takes its fuzzy
+fallback, and the calls that would have been made are counted per operation.
+
+Usage:
+    python benchmark_matching.py                                 # hybrid and file engines
+    python benchmark_matching.py --engine files --synthetic-parts 5000 --repeat 3
+    python benchmark_matching.py --engine files --engine my_index:build_manager --save-cases cases.jsonl
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import importlib
+import contextlib
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+import pandas as pd
+
+from stage_timing import percentile
+
+# name -> (module, factory) returning a database manager or a ready PartNumberMapper
+ENGINES = {
+    'hybrid': ('batch_engine', '_create_db_manager'),  # What app.py uses (catalog snapshot + indexes)
+    'files': ('step3_databases', 'DatabaseManager'),   # Local parts.csv / customer_list.xlsx
+}
+GOLDEN_GLOBS = ('batch_results/*_epicor_*.json', 'samplePOs/*.txt')
+WARMUP_QUERIES = 20
+CANDIDATES_TOP_N = 3
+RESULTS_PAGE_SIZE = 500  # processing_results rows per query when reading reviewed results
+COMPANY_SUFFIXES = (' INC', ' INC.', ' LLC', ' CO', ' CO.', ' CORP', ' CORPORATION', ' COMPANY')
+
+
+@dataclass
+class MatchCase:
+    """One labeled query."""
+    kind: str          # 'part' or 'customer'
+    query: str         # External part number or company name ('' = description-only part)
+    expected: str      # Internal part number or account number
+    context: str = ''  # PO description (parts) or billing address (customers)
+    source: str = ''
+
+
+# ----------------------------------------------------------------------
+# Cases
+# ----------------------------------------------------------------------
+
+def _cases_from_epicor(payload: Dict[str, Any], source: str) -> List[MatchCase]:
+    ds = (payload or {}).get('ds', {})
+    cases = []
+    for header in ds.get('OrderHed', [])[:1]:
+        if header.get('CustNum') and header.get('OTSName'):
+            address = ', '.join(str(header.get(field, '')) for field in
+                                ('OTSAddress1', 'OTSCity', 'OTSState', 'OTSZip') if header.get(field))
+            cases.append(MatchCase('customer', header['OTSName'], str(header['CustNum']), address, source))
+    for line in ds.get('OrderDtl', []):
+        if line.get('PartNum') and line.get('LineDesc'):
+            cases.append(MatchCase('part', '', str(line['PartNum']), line['LineDesc'], source))
+    return cases
+
+
+def _reviewed_payloads(results_store) -> Iterable[str]:
+    """Epicor JSON text of every result marked correct, page by page."""
+    offset = 0
+    while True:
+        page = results_store.get_all_processing_results(limit=RESULTS_PAGE_SIZE, offset=offset)
+        for result in page:
+            if getattr(result.validation_status, 'value', result.validation_status) == 'correct':
+                yield result.raw_json_data
+        if len(page) < RESULTS_PAGE_SIZE:
+            return
+        offset += RESULTS_PAGE_SIZE
+
+
+def golden_cases(results_store=None, metrics_db_path: Optional[str] = 'data/metrics.db') -> List[MatchCase]:
+    """
+    Cases from golden Epicor payloads and from results marked correct in the review UI.
+
+    Args:
+        results_store: Database manager holding the app's processing_results (e.g. the hybrid
+            manager); None skips them
+        metrics_db_path: Legacy SQLite metrics DB; None skips it
+    """
+    from json_payload_codec import decode_json_payload
+
+    cases = []
+    for pattern in GOLDEN_GLOBS:
+        for path in sorted(Path('.').glob(pattern)):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    payload = json.load(f)
+            except ValueError:
+                continue  # Raw text extraction, not an Epicor payload
+            cases.extend(_cases_from_epicor(payload, 'golden'))
+
+    stores = []
+    if results_store is not None and hasattr(results_store, 'get_all_processing_results'):
+        stores.append(results_store)
+    if metrics_db_path and os.path.exists(metrics_db_path):
+        from step5_metrics_db import MetricsDatabase
+        stores.append(MetricsDatabase(metrics_db_path))
+    for store in stores:
+        for stored in _reviewed_payloads(store):
+            try:
+                # Payloads are stored compressed (decode is a no-op on plain JSON text)
+                cases.extend(_cases_from_epicor(json.loads(decode_json_payload(stored) or '{}'), 'reviewed'))
+            except (ValueError, RuntimeError):
+                continue
+    return _dedupe(cases)
+
+
+def _part_variants(part_number: str) -> Dict[str, str]:
+    """External spellings of an internal part number (the transformations step4 handles)."""
+    variants = {'exact': part_number, 'lower': part_number.lower(), 'koi_prefix': f'KOI {part_number}'}
+    if len(part_number) >= 6:
+        middle = len(part_number) // 2
+        variants['dash'] = f'{part_number[:middle]}-{part_number[middle:]}'
+    if part_number.startswith('ZTIP') and len(part_number) > 5:
+        variants['tip_suffix'] = f'{part_number[4:-1]}-{part_number[-1]}'  # ZTIP103D71 -> 103D7-1
+    return variants
+
+
+def _company_variants(name: str) -> Dict[str, str]:
+    """PO spellings of a customer company name."""
+    upper = name.upper().strip()
+    base = upper
+    for suffix in COMPANY_SUFFIXES:
+        if base.endswith(suffix):
+            base = base[:-len(suffix)].rstrip(' ,')
+            break
+    variants = {'exact': name, 'title': name.title(),
+                'no_punctuation': ''.join(c for c in upper if c.isalnum() or c == ' ')}
+    variants['suffix'] = f'{base}, INC.' if base == upper else base
+    return variants
+
+
+def _catalog_frame(db_manager, table: str):
+    """Loaded parts/customers DataFrame of a manager (None when it has none)."""
+    getter = getattr(db_manager, f'get_{table}_dataframe', None)
+    frame = getter() if getter else getattr(db_manager, f'{table}_df', None)
+    return frame if frame is not None and not frame.empty else None
+
+
+def synthetic_cases(db_manager, part_count: int, customer_count: int, seed: int = 7) -> List[MatchCase]:
+    """
+    Variants of sampled catalog entries with known answers.
+
+    Returns:
+        Cases (empty for a catalog the manager has not loaded)
+    """
+    rng = random.Random(seed)
+    cases = []
+    parts_df = _catalog_frame(db_manager, 'parts')
+    if part_count and parts_df is not None:
+        parts = [(str(number), str(description or '')) for number, description
+                 in zip(parts_df['internal_part_number'], parts_df['description'].fillna(''))
+                 if str(number).strip()]
+        for number, description in rng.sample(parts, min(part_count, len(parts))):
+            variant, query = rng.choice(sorted(_part_variants(number).items()))
+            cases.append(MatchCase('part', query, number, description, f'synthetic:{variant}'))
+
+    customers_df = _catalog_frame(db_manager, 'customers')
+    if customer_count and customers_df is not None:
+        # 'address' in the app database, 'Address' in customer_list.xlsx
+        address_column = 'address' if 'address' in customers_df.columns else 'Address'
+        addresses = customers_df[address_column] if address_column in customers_df.columns else [''] * len(customers_df)
+        customers = [(str(name), str(account), '' if pd.isna(address) else str(address))
+                     for name, account, address in zip(customers_df['company_name'],
+                                                       customers_df['account_number'], addresses)
+                     if not pd.isna(name) and not pd.isna(account) and str(name).strip()
+                     and str(account).strip() and not str(name).startswith('***')]
+        for name, account, address in rng.sample(customers, min(customer_count, len(customers))):
+            variant, query = rng.choice(sorted(_company_variants(name).items()))
+            cases.append(MatchCase('customer', query, account, address, f'synthetic:{variant}'))
+    return cases
+
+
+def _dedupe(cases: Iterable[MatchCase]) -> List[MatchCase]:
+    seen, unique = set(), []
+    for case in cases:
+        key = (case.kind, case.query.upper(), case.context.upper(), case.expected)
+        if key not in seen:
+            seen.add(key)
+            unique.append(case)
+    return unique
+
+
+def load_cases(path: str) -> List[MatchCase]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return [MatchCase(**json.loads(line)) for line in f if line.strip()]
+
+
+def save_cases(cases: List[MatchCase], path: str):
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        for case in cases:
+            f.write(json.dumps(asdict(case)) + '\n')
+
+
+# ----------------------------------------------------------------------
+# Engines and operations
+# ----------------------------------------------------------------------
+
+class LLMDisabled(Exception):
+    """Raised by the stubbed OpenAI client."""
+
+
+class LLMStub:
+    """Makes every OpenAI chat completion fail fast and counts the attempts."""
+
+    def __init__(self):
+        self.calls = 0
+        self._original = None
+
+    def __enter__(self):
+        try:
+            from openai.resources.chat.completions import Completions
+        except ImportError:
+            return self  # No client: the call sites fall back on their own
+        # Call sites skip the LLM without a key; a dummy key makes them reach (and count at) the stub
+        os.environ.setdefault('OPENAI_API_KEY', 'benchmark')
+        stub = self
+
+        def create(client_self, *args, **kwargs):
+            stub.calls += 1
+            raise LLMDisabled("LLM calls are stubbed in the matching benchmark")
+
+        self._original = Completions.create
+        Completions.create = create
+        return self
+
+    def __exit__(self, *exc):
+        if self._original is not None:
+            from openai.resources.chat.completions import Completions
+            Completions.create = self._original
+
+
+def create_engine(spec: str):
+    """
+    PartNumberMapper for an engine name (see ENGINES) or 'module:factory'.
+
+    The factory may return a database manager (wrapped in a PartNumberMapper) or a mapper.
+    """
+    module_name, factory_name = ENGINES.get(spec, tuple(spec.split(':', 1)))
+    factory = getattr(importlib.import_module(module_name), factory_name)
+    engine = factory()
+    if hasattr(engine, 'map_line_item'):
+        return engine
+    from step4_mapping import PartNumberMapper
+    return PartNumberMapper(engine)
+
+
+def _op_map_line_item(mapper, case: MatchCase):
+    item = mapper.map_line_item({'external_part_number': case.query, 'description': case.context,
+                                 'unit_price': 0.0, 'quantity': 1})
+    return item.internal_part_number if item.mapping_status == 'mapped' else None
+
+
+def _op_fuzzy_part_candidates(mapper, case: MatchCase):
+    return [c['internal_part_number'] for c in mapper._get_fuzzy_part_candidates(case.query, top_n=CANDIDATES_TOP_N)]
+
+
+def _op_find_customer(mapper, case: MatchCase):
+    customer = mapper.db_manager.find_customer_by_company_name(case.query, billing_address=case.context)
+    return str(customer.account_number) if customer else None
+
+
+def _op_fuzzy_customer_candidates(mapper, case: MatchCase):
+    candidates = mapper._get_fuzzy_customer_candidates(case.query, top_n=CANDIDATES_TOP_N,
+                                                       po_billing_address=case.context)
+    return [str(c['account_number']) for c in candidates]
+
+
+# name -> (case kind, function, returns candidates, needed attribute on the db manager)
+OPERATIONS: Dict[str, Any] = {
+    'map_line_item': ('part', _op_map_line_item, False, None),
+    'fuzzy_part_candidates': ('part', _op_fuzzy_part_candidates, True, 'get_all_parts'),
+    'find_customer': ('customer', _op_find_customer, False, 'find_customer_by_company_name'),
+    'fuzzy_customer_candidates': ('customer', _op_fuzzy_customer_candidates, True, 'get_all_customers'),
+}
+
+
+def _latency_summary(seconds: List[float]) -> Dict[str, float]:
+    values = sorted(seconds)
+    return {
+        'mean_ms': round(sum(values) / len(values) * 1000, 3),
+        'p50_ms': round(percentile(values, 50) * 1000, 3),
+        'p95_ms': round(percentile(values, 95) * 1000, 3),
+        'p99_ms': round(percentile(values, 99) * 1000, 3),
+        'max_ms': round(values[-1] * 1000, 3)
+    }
+
+
+def benchmark_operation(mapper, name: str, cases: List[MatchCase], repeat: int = 1,
+                        verbose: bool = False) -> Dict[str, Any]:
+    """
+    Time one operation over its cases and score the answers.
+
+    Decision operations report precision (correct / answered) and recall (correct / cases).
+    Candidate operations report precision@1 and recall@k (expected anywhere in the top k).
+
+    Returns:
+        Operation report (or {'skipped': reason})
+    """
+    kind, function, returns_candidates, needs = OPERATIONS[name]
+    if needs and not hasattr(mapper.db_manager, needs):
+        return {'skipped': f'{type(mapper.db_manager).__name__} has no {needs}()'}
+    cases = [c for c in cases if c.kind == kind and (c.query or name == 'map_line_item')]
+    if not cases:
+        return {'skipped': 'no cases'}
+
+    # The mappers print progress per query; keep it out of the timings and the console
+    quiet = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    latencies, answers, errors, first_error = [], [], 0, None
+    with LLMStub() as llm, quiet as sink:
+        for case in cases[:WARMUP_QUERIES]:
+            try:
+                function(mapper, case)
+            except Exception:
+                pass
+        llm.calls = 0
+        for round_index in range(repeat):
+            for case in cases:
+                start = time.perf_counter()
+                try:
+                    answer = function(mapper, case)
+                except Exception as e:
+                    answer = None
+                    errors += 1
+                    first_error = first_error or f"{type(e).__name__}: {e}"
+                latencies.append(time.perf_counter() - start)
+                if round_index == 0:
+                    answers.append(answer)
+                if sink is not None:
+                    sink.seek(0)
+                    sink.truncate()
+
+    total_seconds = sum(latencies)
+    report = {
+        'queries': len(latencies),
+        'ops_per_second': round(len(latencies) / total_seconds, 2) if total_seconds else None,
+        'latency': _latency_summary(latencies),
+        'errors': errors,
+        'first_error': first_error,
+        'llm_calls_stubbed': llm.calls // repeat
+    }
+    report.update(_score(cases, answers, returns_candidates))
+    return report
+
+
+def _score(cases: List[MatchCase], answers: List[Any], returns_candidates: bool) -> Dict[str, Any]:
+    by_source: Dict[str, List[bool]] = {}
+    if returns_candidates:
+        top1 = sum(1 for case, found in zip(cases, answers) if found and found[0] == case.expected)
+        answered = sum(1 for found in answers if found)
+        hits = [bool(found) and case.expected in found for case, found in zip(cases, answers)]
+        scores = {'precision_at_1': round(top1 / answered, 4) if answered else 0.0,
+                  f'recall_at_{CANDIDATES_TOP_N}': round(sum(hits) / len(cases), 4)}
+    else:
+        answered = sum(1 for answer in answers if answer)
+        hits = [answer == case.expected for case, answer in zip(cases, answers)]
+        correct = sum(hits)
+        precision = correct / answered if answered else 0.0
+        recall = correct / len(cases)
+        scores = {'precision': round(precision, 4), 'recall': round(recall, 4),
+                  'f1': round(2 * precision * recall / (precision + recall), 4) if correct else 0.0}
+    for case, hit in zip(cases, hits):
+        by_source.setdefault(case.source.split(':')[0], []).append(hit)
+    scores['answered'] = answered
+    scores['hit_rate_by_source'] = {source: round(sum(values) / len(values), 4) for source, values in by_source.items()}
+    scores['misses'] = [{'query': case.query, 'context': case.context[:80], 'expected': case.expected,
+                         'got': answer, 'source': case.source}
+                        for case, answer, hit in zip(cases, answers, hits) if not hit][:25]
+    return scores
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Speed and accuracy benchmark for part/customer matching")
+    parser.add_argument('--engine', action='append', default=None,
+                        help=f"Engine to test ({', '.join(ENGINES)} or module:factory); repeatable")
+    parser.add_argument('--operation', action='append', choices=list(OPERATIONS), default=None,
+                        help="Operations to run (default: all)")
+    parser.add_argument('--cases', default=None, help="JSONL cases file (instead of building them)")
+    parser.add_argument('--save-cases', default=None, help="Write the cases used to this JSONL file")
+    parser.add_argument('--synthetic-parts', type=int, default=2000, help="Synthetic part cases")
+    parser.add_argument('--synthetic-customers', type=int, default=1000, help="Synthetic customer cases")
+    parser.add_argument('--metrics-db', default='data/metrics.db', help="Metrics DB with reviewed results")
+    parser.add_argument('--seed', type=int, default=7, help="Seed for synthetic case sampling")
+    parser.add_argument('--repeat', type=int, default=1, help="Timing rounds per operation")
+    parser.add_argument('--verbose', action='store_true', help="Show the matchers' own output")
+    parser.add_argument('--output', default=None, help="Report path (default: benchmarks/matching_<timestamp>.json)")
+    args = parser.parse_args()
+
+    engines = args.engine or ['hybrid', 'files']
+    operations = args.operation or list(OPERATIONS)
+    report = {'generated_at': datetime.now().isoformat(), 'engines': {}}
+    cases = load_cases(args.cases) if args.cases else None
+
+    # Load every engine first: cases are built once, so every engine answers the same ones
+    mappers = {}
+    for spec in engines:
+        print(f"🔧 Engine {spec}: loading catalog...")
+        load_start = time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()) if not args.verbose else contextlib.nullcontext():
+                mappers[spec] = (create_engine(spec), time.perf_counter() - load_start)
+        except Exception as e:
+            print(f"❌ Engine {spec} failed to load: {e}")
+            report['engines'][spec] = {'error': str(e)}
+
+    if cases is None and mappers:
+        managers = [mapper.db_manager for mapper, _ in mappers.values()]
+        # Reviewed results live in the app database (the hybrid manager)
+        results_store = next((m for m in managers if hasattr(m, 'get_all_processing_results')), None)
+        cases = golden_cases(results_store, args.metrics_db)
+        # Synthetic cases come from the first engine with a loaded catalog of each kind
+        parts_source = next((m for m in managers if _catalog_frame(m, 'parts') is not None), None)
+        customers_source = next((m for m in managers if _catalog_frame(m, 'customers') is not None), None)
+        if parts_source is not None:
+            cases += synthetic_cases(parts_source, args.synthetic_parts, 0, args.seed)
+        if customers_source is not None:
+            cases += synthetic_cases(customers_source, 0, args.synthetic_customers, args.seed)
+        cases = _dedupe(cases)
+        print(f"📋 {sum(c.kind == 'part' for c in cases)} part and "
+              f"{sum(c.kind == 'customer' for c in cases)} customer cases")
+        if args.save_cases:
+            save_cases(cases, args.save_cases)
+
+    for spec, (mapper, load_seconds) in mappers.items():
+        print(f"\n🔧 Engine {spec}")
+        engine_report = {'catalog_load_seconds': round(load_seconds, 2), 'operations': {}}
+        for name in operations:
+            result = benchmark_operation(mapper, name, cases, max(1, args.repeat), args.verbose)
+            engine_report['operations'][name] = result
+            if 'skipped' in result:
+                print(f"   ⏭️  {name}: skipped ({result['skipped']})")
+                continue
+            accuracy = ', '.join(f"{key}={value:.1%}" for key, value in result.items()
+                                 if key.startswith(('precision', 'recall', 'f1')))
+            print(f"   {name:<26} {result['ops_per_second']:>9.1f} ops/s  p50={result['latency']['p50_ms']:.2f}ms "
+                  f"p95={result['latency']['p95_ms']:.2f}ms  {accuracy}"
+                  + (f"  ({result['errors']} errors, first: {result['first_error']})" if result['errors'] else ''))
+        report['engines'][spec] = engine_report
+
+    report['cases'] = {'parts': sum(c.kind == 'part' for c in cases or []),
+                       'customers': sum(c.kind == 'customer' for c in cases or [])}
+    output = Path(args.output or f"benchmarks/matching_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, default=str)
+    print(f"\n📁 Report: {output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
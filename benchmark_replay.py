@@ -0,0 +1,463 @@
+#!/usr/bin/env python3
+"""
+Replay Benchmark
+Runs the full pipeline (process_document -> process_purchase_order -> export_to_epicor_json)
+over the sample POs with LLM responses replayed from recorded cassettes, so latency and
+accuracy can be measured repeatably without API keys or network access.
+
+Reports per-stage timings, throughput, memory and field-level accuracy of the Epicor JSON
+against the golden outputs (latest batch_results/<po>_epicor_*.json, else samplePOs/<po>.txt).
+With --baseline, exits 1 when timings or accuracy regress beyond the allowed margins.
+
+The catalog is pinned next to the cassettes (<cassettes>/catalog, written by --record) and
+replay runs with the database disabled, so accuracy does not drift with the live catalog.
+Replay fails when no pinned catalog exists; its versions are part of the report.
+
+Usage:
+    python benchmark_replay.py --record                      # once, with live API keys
+    python benchmark_replay.py --output benchmarks/report.json
+    python benchmark_replay.py --baseline benchmarks/baseline.json --max-slowdown 0.25
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from llm_cassettes import CassetteMiss, LLMCassette, use_cassette
+from stage_timing import collect_timings, percentile, summarize_stage_timings
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DEFAULT_INPUTS = ['samplePOs']
+DEFAULT_CASSETTE_DIR = 'benchmarks/cassettes'
+GOLDEN_DIRS = ('batch_results', 'samplePOs')
+SESSION_CASSETTE = '_session.json'
+CATALOG_FIXTURE = 'catalog'  # CatalogSnapshot directory inside the cassette directory
+PINNED_TABLES = ('parts', 'customers')
+
+# Differ on every run by design
+IGNORED_FIELDS = {'OrderDate', 'RowMod'}
+
+
+# ----------------------------------------------------------------------
+# Golden outputs and accuracy
+# ----------------------------------------------------------------------
+
+def find_golden(stem: str, golden_dirs=GOLDEN_DIRS) -> Optional[Path]:
+    """Latest golden Epicor JSON for a PO: <stem>_epicor_<timestamp>.json, else <stem>.txt."""
+    for directory in golden_dirs:
+        candidates = sorted(Path(directory).glob(f'{stem}_epicor_*.json'))
+        candidates = [path for path in candidates if not path.stem.endswith('_manual')]
+        if candidates:
+            return candidates[-1]  # Timestamp suffix sorts chronologically
+        companion = Path(directory) / f'{stem}.txt'
+        if companion.exists():
+            try:
+                with open(companion, 'r', encoding='utf-8') as f:
+                    if 'ds' in json.load(f):
+                        return companion
+            except ValueError:
+                pass  # Raw text extraction, not an Epicor payload
+    return None
+
+
+def _flatten_epicor(epicor_json: Dict[str, Any]) -> Dict[str, Any]:
+    """OrderHed.<field> and OrderDtl[i].<field> values of an Epicor payload."""
+    ds = (epicor_json or {}).get('ds', {})
+    fields = {}
+    for header in ds.get('OrderHed', [])[:1]:
+        for name, value in header.items():
+            if name not in IGNORED_FIELDS:
+                fields[f'OrderHed.{name}'] = value
+    for index, line in enumerate(ds.get('OrderDtl', [])):
+        for name, value in line.items():
+            if name not in IGNORED_FIELDS:
+                fields[f'OrderDtl[{index}].{name}'] = value
+    return fields
+
+
+def _normalize(value: Any) -> str:
+    text = str(value).strip()
+    try:
+        return repr(float(text))  # "1" == "1.0", "7.70" == "7.7"
+    except ValueError:
+        return text.upper()
+
+
+def compare_epicor(actual: Dict[str, Any], golden: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Field-level comparison of an Epicor payload with its golden output.
+
+    Lines are compared by position. Fields only present in the output are reported as
+    extra but do not count against accuracy.
+
+    Returns:
+        fields (golden field count), matched, accuracy, mismatches, extra_fields
+    """
+    expected = _flatten_epicor(golden)
+    produced = _flatten_epicor(actual)
+    mismatches = []
+    for name, value in expected.items():
+        if name not in produced:
+            mismatches.append({'field': name, 'expected': value, 'actual': None})
+        elif _normalize(produced[name]) != _normalize(value):
+            mismatches.append({'field': name, 'expected': value, 'actual': produced[name]})
+    matched = len(expected) - len(mismatches)
+    return {
+        'fields': len(expected),
+        'matched': matched,
+        'accuracy': round(matched / len(expected), 4) if expected else 0.0,
+        'mismatches': mismatches,
+        'extra_fields': sorted(set(produced) - set(expected))
+    }
+
+
+# ----------------------------------------------------------------------
+# Benchmark
+# ----------------------------------------------------------------------
+
+def _peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # KiB on Linux, bytes on macOS
+    return round(peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024, 1)
+
+
+def _catalog_versions(catalog_dir: Path) -> Dict[str, Any]:
+    from catalog_snapshot import CatalogSnapshot
+    snapshot = CatalogSnapshot(str(catalog_dir))
+    versions = {}
+    for table in PINNED_TABLES:
+        manifest = snapshot.get_manifest(table) or {}
+        versions[table] = {'version': manifest.get('version'), 'rows': manifest.get('rows')}
+    return versions
+
+
+def _check_pinned_catalog(catalog_dir: Path):
+    """
+    Raise unless catalog_dir holds a readable snapshot of every pinned table.
+
+    Raises:
+        FileNotFoundError: no pinned catalog (record first), or it cannot be read here
+    """
+    from catalog_snapshot import CatalogSnapshot
+    for table in PINNED_TABLES:
+        if not (catalog_dir / f'{table}.manifest.json').exists():
+            raise FileNotFoundError(f"No pinned {table} catalog in {catalog_dir} (record it first)")
+        if CatalogSnapshot(str(catalog_dir)).get_manifest(table) is None:
+            raise FileNotFoundError(f"Pinned {table} catalog in {catalog_dir} is unreadable here "
+                                    f"(schema changed, or Parquet without pyarrow); re-record it")
+
+
+def _pin_catalog(db_manager, catalog_dir: Path):
+    """Copy the catalog the recording ran against next to its cassettes."""
+    from catalog_snapshot import CatalogSnapshot
+    pinned = CatalogSnapshot(str(catalog_dir))
+    frames = {'parts': db_manager.get_parts_dataframe(), 'customers': db_manager.get_customers_dataframe()}
+    for table in PINNED_TABLES:
+        manifest = db_manager.catalog_snapshot.get_manifest(table) or {}
+        pinned.save(table, frames[table], manifest.get('version'),
+                    source={'connection': db_manager.connection_method})
+
+
+class ReplayBenchmark:
+    """Runs sample POs through the pipeline with recorded LLM responses."""
+
+    def __init__(self, cassette_dir: str = DEFAULT_CASSETTE_DIR, mode: str = 'replay', strict: bool = False,
+                 latency_scale: float = 0.0, trace_memory: bool = False):
+        """
+        Initialize the benchmark.
+
+        Args:
+            cassette_dir: One cassette per PO plus one for client/catalog setup
+            mode: 'replay' (offline) or 'record' (live API calls, cassettes overwritten)
+            strict: Fail a PO whose requests no longer match its cassette exactly
+            latency_scale: Fraction of the recorded LLM latency to reproduce in replay
+            trace_memory: Measure per-PO Python allocation peaks (tracemalloc; slows the run)
+        """
+        self.cassette_dir = Path(cassette_dir)
+        self.mode = mode
+        self.strict = strict
+        self.latency_scale = latency_scale
+        self.trace_memory = trace_memory
+        self.catalog_dir = self.cassette_dir / CATALOG_FIXTURE
+        self.processor = None
+        self.mapper = None
+
+    def _cassette(self, name: str) -> LLMCassette:
+        return LLMCassette(self.cassette_dir / name, self.mode, self.strict, self.latency_scale)
+
+    def setup(self) -> float:
+        """
+        Create the document processor and mapper (catalog load included); returns seconds.
+
+        Record uses the live database and pins the catalog it loaded; replay disables the
+        database and loads the pinned catalog.
+
+        Raises:
+            FileNotFoundError: replay without a pinned catalog
+        """
+        if self.mode == 'replay':
+            _check_pinned_catalog(self.catalog_dir)
+            # Clients are only created when a key is configured; replay never uses it
+            os.environ.setdefault('OPENAI_API_KEY', 'replay')
+            os.environ.setdefault('GEMINI_API_KEY', 'replay')
+
+        from comprehensive_hybrid_database_manager import ComprehensiveHybridDatabaseManager
+        from step2_ocr_ai import DocumentProcessor
+        from step4_mapping import PartNumberMapper
+
+        start = time.perf_counter()
+        if self.mode == 'replay':
+            db_manager = ComprehensiveHybridDatabaseManager(connect=False, snapshot_dir=str(self.catalog_dir))
+        else:
+            db_manager = ComprehensiveHybridDatabaseManager()
+        # Load now so every PO sees the same catalog and the first one does not pay for it
+        db_manager.get_parts_dataframe()
+        db_manager.get_customers_dataframe()
+        if self.mode == 'record':
+            _pin_catalog(db_manager, self.catalog_dir)
+
+        cassette = self._cassette(SESSION_CASSETTE)
+        with use_cassette(cassette):
+            self.processor = DocumentProcessor()  # Probes the Gemini API once
+            self.mapper = PartNumberMapper(db_manager)
+        cassette.save()
+        return time.perf_counter() - start
+
+    def run_po(self, path: Path, record_output: bool = True) -> Dict[str, Any]:
+        """
+        Process one PO and compare the result with its golden output.
+
+        Returns:
+            Per-PO report entry (stage seconds, LLM calls, cassette stats, memory, accuracy)
+        """
+        entry: Dict[str, Any] = {'po': path.stem, 'source': str(path), 'status': 'ok'}
+        cassette = self._cassette(f'{path.stem}.json')
+        stages = {}
+        epicor_json = None
+
+        if self.trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        with collect_timings() as timings:
+            try:
+                with use_cassette(cassette):
+                    stage_start = time.perf_counter()
+                    po_data = self.processor.process_document(str(path))
+                    stages['process_document'] = time.perf_counter() - stage_start
+
+                    stage_start = time.perf_counter()
+                    mapped_data = self.mapper.process_purchase_order(po_data)
+                    stages['process_purchase_order'] = time.perf_counter() - stage_start
+
+                    stage_start = time.perf_counter()
+                    try:
+                        epicor_json = self.mapper.export_to_epicor_json(mapped_data)
+                    except Exception:
+                        # Same fallback as the upload route
+                        epicor_json = self.mapper._generate_epicor_format_unvalidated(mapped_data)
+                    stages['export_to_epicor_json'] = time.perf_counter() - stage_start
+            except CassetteMiss as e:
+                entry.update(status='cassette_miss', error=str(e))
+            except Exception as e:
+                entry.update(status='failed', error=str(e))
+        entry['seconds'] = round(time.perf_counter() - start, 4)
+        if self.trace_memory:
+            entry['python_peak_mb'] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1)
+            tracemalloc.stop()
+
+        cassette.save()
+        entry['cassette'] = dict(cassette.stats)
+        if cassette.stats['missed'] and entry['status'] == 'ok':
+            # The pipeline swallowed the miss in a fallback path; the output is not comparable
+            entry['status'] = 'cassette_miss'
+        detail = timings.to_dict()
+        stages = {**detail['stages'], **{name: round(value, 4) for name, value in stages.items()}}
+        entry['stage_timings'] = {'stages': stages, 'total': entry['seconds']}
+        entry['llm_calls'] = detail['llm_calls']
+
+        golden_path = find_golden(path.stem)
+        if golden_path is None:
+            entry['accuracy'] = None
+        elif epicor_json is not None:
+            with open(golden_path, 'r', encoding='utf-8') as f:
+                golden = json.load(f)
+            entry['golden'] = str(golden_path)
+            entry['accuracy'] = compare_epicor(epicor_json, golden)
+        if record_output:
+            entry['epicor_json'] = epicor_json
+        return entry
+
+    def run(self, paths: List[Path], repeat: int = 1) -> Dict[str, Any]:
+        """
+        Benchmark all POs (repeat > 1 re-runs each PO for more timing samples in replay).
+
+        Returns:
+            Report dict (see main for the layout)
+        """
+        setup_seconds = self.setup()
+        entries, timing_rows = [], []
+        run_start = time.perf_counter()
+        for round_index in range(repeat if self.mode == 'replay' else 1):
+            for path in paths:
+                entry = self.run_po(path, record_output=round_index == 0)
+                timing_rows.append(entry['stage_timings'])
+                if round_index == 0:
+                    entries.append(entry)
+                    accuracy = entry.get('accuracy') or {}
+                    icon = '✅' if entry['status'] == 'ok' else '❌'
+                    score = f", {accuracy['matched']}/{accuracy['fields']} fields" if accuracy else ''
+                    print(f"{icon} {path.name}: {entry['seconds']:.2f}s{score}"
+                          + (f" ({entry['status']}: {entry.get('error', '')})" if entry['status'] != 'ok' else ''))
+        wall_seconds = time.perf_counter() - run_start
+
+        scored = [e['accuracy'] for e in entries if e.get('accuracy') and e['status'] == 'ok']
+        fields = sum(a['fields'] for a in scored)
+        po_seconds = sorted(row['total'] for row in timing_rows)
+        processed = len(timing_rows)
+        return {
+            'generated_at': datetime.now().isoformat(),
+            'mode': self.mode,
+            'latency_scale': self.latency_scale,
+            'environment': {'python': platform.python_version(), 'platform': platform.platform(),
+                            'cpu_count': os.cpu_count()},
+            'catalog': _catalog_versions(self.catalog_dir),
+            'totals': {
+                'pos': len(entries),
+                'runs': processed,
+                'ok': sum(1 for e in entries if e['status'] == 'ok'),
+                'failed': sum(1 for e in entries if e['status'] == 'failed'),
+                'cassette_misses': sum(1 for e in entries if e['status'] == 'cassette_miss'),
+                'setup_seconds': round(setup_seconds, 3),
+                'wall_seconds': round(wall_seconds, 3),
+                'throughput_per_minute': round(processed / wall_seconds * 60, 2) if wall_seconds else 0.0,
+                'po_seconds': {'p50': round(percentile(po_seconds, 50), 4),
+                               'p95': round(percentile(po_seconds, 95), 4)} if po_seconds else {},
+                'peak_rss_mb': _peak_rss_mb(),
+                'scored_pos': len(scored),
+                'exact_pos': sum(1 for a in scored if not a['mismatches']),
+                'field_accuracy': round(sum(a['matched'] for a in scored) / fields, 4) if fields else None
+            },
+            'stage_latency': summarize_stage_timings(timing_rows),
+            'pos': entries
+        }
+
+
+def check_regressions(report: Dict[str, Any], baseline: Dict[str, Any], max_slowdown: float,
+                      max_accuracy_drop: float) -> List[str]:
+    """
+    Compare a report with a baseline report.
+
+    Args:
+        report: Current report
+        baseline: Earlier report from the same hardware
+        max_slowdown: Allowed relative p50 increase per stage (0.25 = 25%)
+        max_accuracy_drop: Allowed absolute drop in field accuracy
+
+    Returns:
+        Regression descriptions (empty when within margins)
+    """
+    problems = []
+    current_stages = report['stage_latency']['stages']
+    for stage, base in baseline.get('stage_latency', {}).get('stages', {}).items():
+        current = current_stages.get(stage)
+        # Sub-millisecond stages are noise
+        if not current or base['p50'] < 0.001:
+            continue
+        if current['p50'] > base['p50'] * (1 + max_slowdown):
+            problems.append(f"{stage}: p50 {current['p50']:.3f}s vs {base['p50']:.3f}s baseline")
+
+    base_accuracy = baseline.get('totals', {}).get('field_accuracy')
+    accuracy = report['totals']['field_accuracy']
+    if base_accuracy is not None and (accuracy is None or accuracy < base_accuracy - max_accuracy_drop):
+        problems.append(f"field accuracy {accuracy} vs {base_accuracy} baseline")
+
+    base_pos = {e['po']: e for e in baseline.get('pos', [])}
+    for entry in report['pos']:
+        previous = base_pos.get(entry['po'])
+        if previous and previous['status'] == 'ok' and entry['status'] != 'ok':
+            problems.append(f"{entry['po']}: {entry['status']} ({entry.get('error', '')})")
+    return problems
+
+
+def _find_inputs(inputs: List[str], only: Optional[List[str]]) -> List[Path]:
+    from batch_engine import find_po_files
+    files = find_po_files(inputs)
+    if only:
+        files = [path for path in files if path.stem in only]
+    return files
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline replay benchmark of the PO pipeline")
+    parser.add_argument('inputs', nargs='*', default=DEFAULT_INPUTS, help="PO files or directories")
+    parser.add_argument('--record', action='store_true', help="Call the live APIs and (re)write the cassettes")
+    parser.add_argument('--cassettes', default=DEFAULT_CASSETTE_DIR, help="Cassette directory")
+    parser.add_argument('--only', nargs='+', help="Only these PO names (file stems)")
+    parser.add_argument('--repeat', type=int, default=1, help="Runs per PO in replay (more timing samples)")
+    parser.add_argument('--strict', action='store_true', help="Fail POs whose requests changed since recording")
+    parser.add_argument('--latency-scale', type=float, default=0.0,
+                        help="Reproduce this fraction of recorded LLM latency (0 = local processing only)")
+    parser.add_argument('--trace-memory', action='store_true', help="Per-PO Python allocation peaks (slower)")
+    parser.add_argument('--output', default=None, help="Report path (default: benchmarks/report_<timestamp>.json)")
+    parser.add_argument('--baseline', default=None, help="Earlier report to check for regressions")
+    parser.add_argument('--max-slowdown', type=float, default=0.25, help="Allowed relative p50 increase per stage")
+    parser.add_argument('--max-accuracy-drop', type=float, default=0.0, help="Allowed field accuracy drop")
+    args = parser.parse_args()
+
+    files = _find_inputs(args.inputs, args.only)
+    if not files:
+        print("❌ No PO files found")
+        return 1
+
+    benchmark = ReplayBenchmark(args.cassettes, mode='record' if args.record else 'replay', strict=args.strict,
+                                latency_scale=args.latency_scale, trace_memory=args.trace_memory)
+    print(f"🚀 {'Recording' if args.record else 'Replaying'} {len(files)} POs (cassettes: {args.cassettes})")
+    try:
+        report = benchmark.run(files, repeat=max(1, args.repeat))
+    except FileNotFoundError as e:
+        print(f"❌ {e}")
+        return 1
+
+    output = Path(args.output or f"benchmarks/report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, default=str)
+
+    totals = report['totals']
+    print(f"\n📊 {totals['ok']}/{totals['pos']} ok, {totals['failed']} failed, "
+          f"{totals['cassette_misses']} cassette misses")
+    print(f"⏱️  {totals['wall_seconds']:.1f}s wall ({totals['throughput_per_minute']:.1f} POs/min), "
+          f"p50 {totals['po_seconds'].get('p50', 0):.2f}s, peak RSS {totals['peak_rss_mb']} MB")
+    if totals['field_accuracy'] is not None:
+        print(f"🎯 Field accuracy {totals['field_accuracy']:.1%} over {totals['scored_pos']} POs "
+              f"({totals['exact_pos']} exact)")
+    print(f"📁 Report: {output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        problems = check_regressions(report, baseline, args.max_slowdown, args.max_accuracy_drop)
+        if problems:
+            print("❌ Regressions against baseline:")
+            for problem in problems:
+                print(f"   • {problem}")
+            return 1
+        print("✅ No regressions against baseline")
+    return 0 if totals['failed'] == 0 and totals['cassette_misses'] == 0 else 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,178 @@
+"""
+Catalog Reloader
+Keeps each worker's in-memory parts/customers catalog current without a restart.
+
+A background thread LISTENs on the 'catalog_changed' Postgres channel (fired by statement
+triggers on the catalog tables). Notifications are debounced so a bulk import triggers one
+reload, and the manager rebuilds off-thread and swaps the new frames and indexes in atomically.
+When LISTEN is unavailable (REST-only mode, the transaction pooler, psycopg2 missing) the
+thread falls back to polling the catalog version and keeps retrying LISTEN.
+"""
+
+import os
+import json
+import time
+import select
+import threading
+from typing import Optional, Set
+
+try:
+    import psycopg2
+    import psycopg2.extensions
+except ImportError:  # REST-only deployments poll instead
+    psycopg2 = None
+
+CATALOG_CHANNEL = 'catalog_changed'
+
+
+class CatalogReloader:
+    """Background LISTEN/poll loop that triggers manager.reload_catalog()."""
+
+    def __init__(self, manager, channel: str = CATALOG_CHANNEL, poll_interval: float = 30.0,
+                 debounce: float = 1.0, listen_retry_interval: float = 300.0):
+        """
+        Initialize the reloader.
+
+        Args:
+            manager: ComprehensiveHybridDatabaseManager (needs reload_catalog / check_catalog_versions)
+            channel: Postgres NOTIFY channel
+            poll_interval: Seconds between safety version checks (also the poll rate without LISTEN)
+            debounce: Quiet period after the last notification before reloading
+            listen_retry_interval: Seconds between attempts to re-establish LISTEN while polling
+        """
+        self.manager = manager
+        self.channel = channel
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self.listen_retry_interval = listen_retry_interval
+
+        self._conn = None
+        self._pending: Set[str] = set()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_listen_attempt = 0.0
+
+    def start(self) -> None:
+        """Start the background thread (idempotent)."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="catalog-reloader", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the thread and close the LISTEN connection."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self._close_listen()
+
+    # ------------------------------------------------------------------
+    # LISTEN connection
+    # ------------------------------------------------------------------
+
+    def _listen_dsn(self) -> Optional[str]:
+        """DSN for the LISTEN connection; must be a session (not transaction-pooled) connection."""
+        dsn = os.environ.get('CATALOG_LISTEN_DSN')
+        if dsn:
+            return dsn
+        if not getattr(self.manager, 'use_postgres', False):
+            return None
+        try:
+            from database_config import db_config
+            url = db_config.engine.url
+            if str(url.port) == '6543':
+                return None  # Supabase transaction pooler drops LISTEN registrations
+            return url.set(drivername='postgresql').render_as_string(hide_password=False)
+        except Exception:
+            return None
+
+    def _open_listen(self) -> bool:
+        """Open a dedicated autocommit connection and LISTEN on the channel."""
+        self._last_listen_attempt = time.time()
+        dsn = self._listen_dsn()
+        if psycopg2 is None or not dsn:
+            return False
+        try:
+            conn = psycopg2.connect(dsn, connect_timeout=10)
+            conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            with conn.cursor() as cursor:
+                cursor.execute(f"LISTEN {self.channel}")
+            self._conn = conn
+            print(f"👂 Listening for catalog changes on '{self.channel}'")
+            return True
+        except Exception as e:
+            print(f"⚠️ Catalog LISTEN unavailable, polling every {self.poll_interval:.0f}s: {e}")
+            self._close_listen()
+            return False
+
+    def _close_listen(self) -> None:
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
+
+    def _wait_for_notifications(self, timeout: float) -> bool:
+        """
+        Block until notifications arrive or timeout passes, queueing the changed tables.
+
+        Returns:
+            True if at least one notification was received
+        """
+        if self._conn is None:
+            self._stop_event.wait(timeout)
+            return False
+
+        ready, _, _ = select.select([self._conn], [], [], timeout)
+        if not ready:
+            return False
+
+        self._conn.poll()
+        received = False
+        while self._conn.notifies:
+            notify = self._conn.notifies.pop(0)
+            received = True
+            try:
+                table = json.loads(notify.payload).get('table')
+            except (ValueError, AttributeError):
+                table = None
+            if table:
+                self._pending.add(table)
+            else:
+                self._pending.update(('parts', 'customers'))
+        return received
+
+    # ------------------------------------------------------------------
+    # Main loop
+    # ------------------------------------------------------------------
+
+    def _run(self) -> None:
+        self._open_listen()
+        next_poll = time.time() + self.poll_interval
+
+        while not self._stop_event.is_set():
+            try:
+                if self._conn is None and time.time() - self._last_listen_attempt >= self.listen_retry_interval:
+                    self._open_listen()
+
+                timeout = self.debounce if self._pending else max(0.0, next_poll - time.time())
+                if self._wait_for_notifications(timeout):
+                    continue  # Keep collecting until the burst goes quiet
+
+                if not self._pending and time.time() >= next_poll:
+                    # Safety net for missed notifications and the polling fallback
+                    self._pending.update(self.manager.check_catalog_versions())
+                    next_poll = time.time() + self.poll_interval
+
+                if self._pending:
+                    tables = sorted(self._pending)
+                    self._pending.clear()
+                    self.manager.reload_catalog(tables)
+                    next_poll = time.time() + self.poll_interval
+
+            except Exception as e:
+                print(f"⚠️ Catalog reloader error, reconnecting: {e}")
+                self._close_listen()
+                self._stop_event.wait(min(self.poll_interval, 5.0))
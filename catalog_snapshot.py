@@ -0,0 +1,133 @@
+"""
+Catalog Snapshot
+Local, versioned columnar copy of the parts and customers catalog tables.
+
+Each table is stored as a Parquet file (pickle when pyarrow is not installed) next to a small
+JSON manifest recording the catalog version the file was built from: max(updated_at) and the
+row count. Workers load the snapshot at startup and only fetch rows changed since that stamp.
+"""
+
+import os
+import json
+import time
+from typing import Dict, Optional, Tuple, Any
+
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401 - pandas' Parquet engine
+    SNAPSHOT_FORMAT = 'parquet'
+except ImportError:
+    SNAPSHOT_FORMAT = 'pickle'
+
+# Bump when the DataFrame columns of a snapshot change so stale files are rebuilt
+SNAPSHOT_SCHEMA_VERSION = 1
+
+
+class CatalogSnapshot:
+    """Reads and atomically writes per-table catalog snapshots."""
+
+    def __init__(self, snapshot_dir: str = "data/catalog_snapshot"):
+        self.snapshot_dir = snapshot_dir
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+
+    def _data_path(self, table: str, fmt: str) -> str:
+        extension = 'parquet' if fmt == 'parquet' else 'pkl'
+        return os.path.join(self.snapshot_dir, f"{table}.{extension}")
+
+    def _manifest_path(self, table: str) -> str:
+        return os.path.join(self.snapshot_dir, f"{table}.manifest.json")
+
+    def get_manifest(self, table: str) -> Optional[Dict[str, Any]]:
+        """Manifest of the current snapshot, or None when there is no usable snapshot."""
+        try:
+            with open(self._manifest_path(table), 'r') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if manifest.get('schema_version') != SNAPSHOT_SCHEMA_VERSION:
+            return None
+        if manifest.get('format') == 'parquet' and SNAPSHOT_FORMAT != 'parquet':
+            return None  # Written by a build with pyarrow; this one cannot read it
+        return manifest
+
+    def load(self, table: str) -> Tuple[Optional[pd.DataFrame], Optional[str]]:
+        """
+        Load a table snapshot.
+
+        Args:
+            table: Catalog table name ('parts' or 'customers')
+
+        Returns:
+            (DataFrame, version stamp) or (None, None) when no valid snapshot exists
+        """
+        manifest = self.get_manifest(table)
+        if manifest is None:
+            return None, None
+
+        path = self._data_path(table, manifest['format'])
+        try:
+            if manifest['format'] == 'parquet':
+                df = pd.read_parquet(path)
+            else:
+                df = pd.read_pickle(path)
+        except Exception as e:
+            print(f"⚠️ Could not read {table} snapshot, rebuilding: {e}")
+            return None, None
+
+        if len(df) != manifest.get('rows'):
+            print(f"⚠️ {table} snapshot row count does not match its manifest, rebuilding")
+            return None, None
+        return df, manifest.get('version')
+
+    def save(self, table: str, df: pd.DataFrame, version: Optional[str],
+             source: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Write a table snapshot (data file first, then the manifest, both via atomic rename).
+
+        Args:
+            table: Catalog table name
+            df: Catalog rows
+            version: max(updated_at) of the rows, ISO formatted
+            source: Optional description of what the rows were built from, kept in the manifest
+        """
+        fmt = SNAPSHOT_FORMAT
+        path = self._data_path(table, fmt)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            try:
+                if fmt == 'parquet':
+                    df.reset_index(drop=True).to_parquet(tmp_path, index=False)
+                else:
+                    df.reset_index(drop=True).to_pickle(tmp_path)
+            except (TypeError, ValueError, ImportError) as e:
+                if fmt != 'parquet':
+                    raise
+                # Mixed-type object columns (typical of Excel sources) cannot be stored as Parquet
+                print(f"⚠️ {table} snapshot not Parquet-compatible, using pickle: {e}")
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                fmt = 'pickle'
+                path = self._data_path(table, fmt)
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                df.reset_index(drop=True).to_pickle(tmp_path)
+            os.replace(tmp_path, path)
+
+            manifest = {
+                'schema_version': SNAPSHOT_SCHEMA_VERSION,
+                'format': fmt,
+                'version': version,
+                'rows': len(df),
+                'written_at': time.time()
+            }
+            if source is not None:
+                manifest['source'] = source
+            manifest_path = self._manifest_path(table)
+            tmp_manifest = f"{manifest_path}.{os.getpid()}.tmp"
+            with open(tmp_manifest, 'w') as f:
+                json.dump(manifest, f)
+            os.replace(tmp_manifest, manifest_path)
+        except Exception as e:
+            print(f"❌ Error writing {table} snapshot: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+"""
+Catalog Sync
+Brings the parts/customers tables in line with an ERP export (CSV or XLSX) while touching
+only the rows that changed.
+
+The source file is streamed in chunks and every row is hashed. The hashes are compared with
+md5 hashes computed by Postgres over the current table (only key + hash cross the wire), and
+only inserted and changed rows are COPYed into a temp staging table. One transaction then
+updates changed rows, inserts new ones and deletes rows missing from the export. Unchanged
+rows are never rewritten, so a nightly refresh does not bloat the table.
+
+Usage:
+    python catalog_sync.py parts data/parts.csv
+    python catalog_sync.py customers data/customer_list.xlsx --dry-run --report sync_report.json
+"""
+
+import os
+import io
+import re
+import csv
+import sys
+import json
+import time
+import hashlib
+import argparse
+from dataclasses import dataclass, field, asdict
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import quote_plus
+
+import pandas as pd
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Separator used when hashing a row; must match the SQL in _fetch_remote_hashes
+FIELD_SEPARATOR = '\x1f'
+
+DEFAULT_CHUNK_SIZE = 10000
+
+# Keys shown per category in the report
+REPORT_SAMPLE_SIZE = 20
+
+# Per table: key column, synced columns, and accepted source header names (normalized)
+SYNC_TABLES = {
+    'parts': {
+        'key': 'part_number',
+        'columns': ['part_number', 'description'],
+        'aliases': {
+            'part_number': ['part_number', 'part', 'internal_part_number'],
+            'description': ['description']
+        }
+    },
+    'customers': {
+        'key': 'customer_id',
+        'columns': ['customer_id', 'company_name', 'address', 'city', 'state_prov', 'postal_code', 'country'],
+        'aliases': {
+            'customer_id': ['customer_id', 'customer', 'account_number'],
+            'company_name': ['company_name', 'name'],
+            'address': ['address'],
+            'city': ['city'],
+            'state_prov': ['state_prov', 'state', 'state_province'],
+            'postal_code': ['postal_code', 'zip', 'zip_code'],
+            'country': ['country']
+        }
+    }
+}
+
+
+@dataclass
+class SyncReport:
+    """What a sync changed (or would change, for a dry run)."""
+    table: str
+    source: str
+    dry_run: bool = False
+    source_rows: int = 0
+    unchanged: int = 0
+    inserted: int = 0
+    updated: int = 0
+    deleted: int = 0
+    duplicate_keys: int = 0
+    skipped_rows: int = 0
+    seconds: float = 0.0
+    samples: Dict[str, List[str]] = field(default_factory=lambda: {'inserted': [], 'updated': [], 'deleted': []})
+
+    def summary(self) -> str:
+        action = "Would apply" if self.dry_run else "Applied"
+        return (f"{action} {self.table} sync from {os.path.basename(self.source)}: "
+                f"{self.inserted} inserted, {self.updated} updated, {self.deleted} deleted, "
+                f"{self.unchanged} unchanged ({self.source_rows} source rows, {self.seconds:.1f}s)")
+
+
+def _normalize_header(name) -> str:
+    return re.sub(r'[^a-z0-9]+', '_', str(name).strip().lower()).strip('_')
+
+
+def _normalize_value(value) -> str:
+    """Text form of a cell, identical for CSV and Excel sources."""
+    if value is None:
+        return ''
+    if isinstance(value, float):
+        if value != value:  # NaN
+            return ''
+        if value.is_integer():
+            return str(int(value))
+    return str(value).strip()
+
+
+def row_hash(values: List[str]) -> str:
+    """md5 of the row's values (same result as md5(concat_ws(E'\\x1f', ...)) in Postgres)."""
+    return hashlib.md5(FIELD_SEPARATOR.join(values).encode('utf-8')).hexdigest()
+
+
+def _resolve_columns(table: str, headers: List[str]) -> List[int]:
+    """Source column position for each synced column."""
+    aliases = SYNC_TABLES[table]['aliases']
+    normalized = [_normalize_header(header) for header in headers]
+    positions = []
+    for column in SYNC_TABLES[table]['columns']:
+        match = next((normalized.index(alias) for alias in aliases[column] if alias in normalized), None)
+        if match is None:
+            raise ValueError(f"Source file has no column for '{column}' (headers: {headers})")
+        positions.append(match)
+    return positions
+
+
+def iter_source_chunks(table: str, path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[List[List[str]]]:
+    """
+    Stream a CSV/XLSX export as lists of normalized rows in table column order.
+
+    Args:
+        table: 'parts' or 'customers'
+        path: Source file
+        chunk_size: Rows per chunk
+    """
+    if path.lower().endswith(('.xlsx', '.xlsm')):
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            positions = _resolve_columns(table, list(next(rows)))
+            chunk = []
+            for row in rows:
+                chunk.append([_normalize_value(row[i] if i < len(row) else None) for i in positions])
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+            if chunk:
+                yield chunk
+        finally:
+            workbook.close()
+        return
+
+    reader = pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=chunk_size)
+    positions = None
+    for frame in reader:
+        if positions is None:
+            positions = _resolve_columns(table, list(frame.columns))
+        values = frame.iloc[:, positions]
+        yield [[value.strip() for value in row] for row in values.itertuples(index=False, name=None)]
+
+
+def connect_from_env(dsn: Optional[str] = None):
+    """psycopg2 connection from a DSN or the DB_* variables used by database_config."""
+    if dsn:
+        return psycopg2.connect(dsn)
+    db_user = os.environ.get('DB_USER', 'postgres')
+    db_password = os.environ.get('DB_PASSWORD', '')
+    db_host = os.environ.get('DB_HOST', 'localhost')
+    db_port = os.environ.get('DB_PORT', '5432')
+    db_name = os.environ.get('DB_NAME', 'postgres')
+    return psycopg2.connect(
+        f"postgresql://{quote_plus(db_user)}:{quote_plus(db_password)}@{db_host}:{db_port}/{db_name}"
+    )
+
+
+class CatalogSync:
+    """Diff-and-merge sync of one catalog table from an export file."""
+
+    def __init__(self, conn, table: str, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 allow_deletes: bool = True, max_delete_fraction: float = 0.5):
+        """
+        Initialize the sync.
+
+        Args:
+            conn: psycopg2 connection
+            table: 'parts' or 'customers'
+            chunk_size: Source rows per chunk (bounds memory together with the key/hash map)
+            allow_deletes: Delete table rows whose key is missing from the export
+            max_delete_fraction: Refuse to run if more than this share of the table would be
+                deleted (protects against truncated exports)
+        """
+        if table not in SYNC_TABLES:
+            raise ValueError(f"Unknown catalog table: {table}")
+        self.conn = conn
+        self.table = table
+        self.spec = SYNC_TABLES[table]
+        self.chunk_size = chunk_size
+        self.allow_deletes = allow_deletes
+        self.max_delete_fraction = max_delete_fraction
+
+    def _fetch_remote_hashes(self) -> Dict[str, str]:
+        """key -> row hash for the current table, hashed server side and streamed."""
+        columns = ', '.join(f"COALESCE({column}::text, '')" for column in self.spec['columns'])
+        sql = (f"SELECT {self.spec['key']}::text, md5(concat_ws(E'\\x1f', {columns})) "
+               f"FROM {self.table}")
+        remote = {}
+        with self.conn.cursor(name=f"catalog_sync_{self.table}") as cursor:
+            cursor.itersize = self.chunk_size
+            cursor.execute(sql)
+            for key, digest in cursor:
+                remote[key] = digest
+        return remote
+
+    def _create_staging(self, cursor) -> None:
+        columns = ', '.join(self.spec['columns'])
+        cursor.execute(f"CREATE TEMP TABLE catalog_sync_rows ON COMMIT DROP AS "
+                       f"SELECT {columns} FROM {self.table} WITH NO DATA")
+        cursor.execute("ALTER TABLE catalog_sync_rows ADD COLUMN sync_seq BIGINT")
+        cursor.execute(f"CREATE TEMP TABLE catalog_sync_deletes ON COMMIT DROP AS "
+                       f"SELECT {self.spec['key']} FROM {self.table} WITH NO DATA")
+
+    def _copy_rows(self, cursor, staging: str, columns: List[str], rows: List[List]) -> None:
+        """COPY rows into a staging table (empty text values stay empty strings, not NULL)."""
+        if not rows:
+            return
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator='\n').writerows(rows)
+        buffer.seek(0)
+        text_columns = [column for column in columns if column in self.spec['columns'] and column != self.spec['key']]
+        options = f", FORCE_NOT_NULL ({', '.join(text_columns)})" if text_columns else ""
+        cursor.copy_expert(f"COPY {staging} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv{options})", buffer)
+
+    def _merge(self, cursor) -> Tuple[int, int, int]:
+        """Apply staged rows; returns (updated, inserted, deleted)."""
+        key = self.spec['key']
+        values = [column for column in self.spec['columns'] if column != key]
+        assignments = ', '.join(f"{column} = s.{column}" for column in values)
+        changed = ' OR '.join(f"t.{column} IS DISTINCT FROM s.{column}" for column in values)
+        columns = ', '.join(self.spec['columns'])
+
+        # A key repeated in the export keeps its last row
+        cursor.execute(f"""
+            CREATE TEMP TABLE catalog_sync_latest ON COMMIT DROP AS
+            SELECT DISTINCT ON ({key}) {columns} FROM catalog_sync_rows ORDER BY {key}, sync_seq DESC
+        """)
+        cursor.execute(f"""
+            UPDATE {self.table} t SET {assignments}, updated_at = NOW()
+            FROM catalog_sync_latest s
+            WHERE t.{key} = s.{key} AND ({changed})
+        """)
+        updated = cursor.rowcount
+        cursor.execute(f"""
+            INSERT INTO {self.table} ({columns}, created_at, updated_at)
+            SELECT {', '.join(f's.{column}' for column in self.spec['columns'])}, NOW(), NOW()
+            FROM catalog_sync_latest s
+            WHERE NOT EXISTS (SELECT 1 FROM {self.table} t WHERE t.{key} = s.{key})
+        """)
+        inserted = cursor.rowcount
+        cursor.execute(f"DELETE FROM {self.table} t USING catalog_sync_deletes d WHERE t.{key} = d.{key}")
+        deleted = cursor.rowcount
+        return updated, inserted, deleted
+
+    def run(self, source_path: str, dry_run: bool = False) -> SyncReport:
+        """
+        Sync the table from an export file.
+
+        Args:
+            source_path: CSV or XLSX export
+            dry_run: Compute the diff and report without writing
+
+        Returns:
+            SyncReport
+        """
+        start = time.time()
+        report = SyncReport(table=self.table, source=source_path, dry_run=dry_run)
+        remote = self._fetch_remote_hashes()
+        seen = set()
+
+        try:
+            cursor = self.conn.cursor()
+            if not dry_run:
+                self._create_staging(cursor)
+
+            for chunk in iter_source_chunks(self.table, source_path, self.chunk_size):
+                staged = []
+                for row in chunk:
+                    report.source_rows += 1
+                    key = row[0]
+                    if not key:
+                        report.skipped_rows += 1
+                        continue
+                    if key in seen:
+                        # The last row for a key wins, so it is staged even when it matches the table
+                        report.duplicate_keys += 1
+                        staged.append(row + [report.source_rows])
+                        continue
+                    seen.add(key)
+
+                    remote_hash = remote.get(key)
+                    if remote_hash == row_hash(row):
+                        report.unchanged += 1
+                        continue
+                    category = 'inserted' if remote_hash is None else 'updated'
+                    setattr(report, category, getattr(report, category) + 1)
+                    if len(report.samples[category]) < REPORT_SAMPLE_SIZE:
+                        report.samples[category].append(key)
+                    staged.append(row + [report.source_rows])
+
+                if not dry_run:
+                    self._copy_rows(cursor, 'catalog_sync_rows', self.spec['columns'] + ['sync_seq'], staged)
+
+            missing = [key for key in remote if key not in seen] if self.allow_deletes else []
+            if remote and len(missing) > self.max_delete_fraction * len(remote):
+                raise ValueError(f"Export would delete {len(missing)} of {len(remote)} {self.table} rows; "
+                                 f"refusing (raise max_delete_fraction if intended)")
+            report.deleted = len(missing)
+            report.samples['deleted'] = missing[:REPORT_SAMPLE_SIZE]
+
+            if not dry_run:
+                self._copy_rows(cursor, 'catalog_sync_deletes', [self.spec['key']], [[key] for key in missing])
+                report.updated, report.inserted, report.deleted = self._merge(cursor)
+                self.conn.commit()
+            else:
+                self.conn.rollback()
+            cursor.close()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+        report.seconds = time.time() - start
+        return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync a catalog table from an ERP export")
+    parser.add_argument('table', choices=sorted(SYNC_TABLES), help="Catalog table to sync")
+    parser.add_argument('source', help="CSV or XLSX export")
+    parser.add_argument('--dsn', help="Postgres DSN (defaults to DB_* environment variables)")
+    parser.add_argument('--dry-run', action='store_true', help="Report the diff without writing")
+    parser.add_argument('--no-delete', action='store_true', help="Keep rows missing from the export")
+    parser.add_argument('--max-delete-fraction', type=float, default=0.5,
+                        help="Abort when more than this share of rows would be deleted")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--report', help="Write the report as JSON to this path")
+    args = parser.parse_args()
+
+    conn = connect_from_env(args.dsn)
+    try:
+        sync = CatalogSync(conn, args.table, chunk_size=args.chunk_size, allow_deletes=not args.no_delete,
+                           max_delete_fraction=args.max_delete_fraction)
+        report = sync.run(args.source, dry_run=args.dry_run)
+    except Exception as e:
+        print(f"❌ Catalog sync failed: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+    print(f"✅ {report.summary()}")
+    for category, keys in report.samples.items():
+        if keys:
+            print(f"   {category}: {', '.join(keys)}")
+    if report.duplicate_keys or report.skipped_rows:
+        print(f"⚠️ {report.duplicate_keys} duplicate keys (last row kept), {report.skipped_rows} rows without a key")
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(asdict(report), f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
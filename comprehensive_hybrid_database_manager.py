@@ -5,18 +5,28 @@ Handles parts, customers, and processing results with PostgreSQL Transaction Poo
 
 import os
 import json
+import time
 import socket
+import threading
 import requests
 import pandas as pd
 from datetime import datetime
 from typing import Dict, List, Optional, Any, Tuple
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, field as dataclass_field, replace
 from enum import Enum
 from collections import defaultdict
 from dotenv import load_dotenv
 
 # Import existing classes
 from step5_metrics_db_postgres import ProcessingResult, ProcessingStatus, ValidationStatus, ErrorType
+from json_payload_codec import encode_json_payload, decode_json_payload
+from stage_timing import timed, summarize_stage_timings
+from app_metrics import record_catalog_index_build
+from catalog_snapshot import CatalogSnapshot
+from local_catalog_search import LocalCatalogSearch
+from part_vector_index import PartVectorIndex, build_vector_arrays
+from step3_databases import Part as CatalogPart
+from shared_catalog_index import SharedCatalogIndexStore, PartKeywordIndex, build_part_indexes, catalog_version_key
 
 @dataclass
 class Part:
@@ -35,33 +45,107 @@ class Customer:
     postal_code: str
     country: str
 
+@dataclass(frozen=True)
+class CatalogState:
+    """Loaded catalog frames and the search indexes built from them, replaced as one object."""
+    parts_df: Optional[pd.DataFrame] = None
+    customers_df: Optional[pd.DataFrame] = None
+    parts_by_exact_match: Any = dataclass_field(default_factory=dict)
+    description_words: Any = dataclass_field(default_factory=dict)
+    parts_by_keywords: Any = dataclass_field(default_factory=lambda: defaultdict(list))
+    part_vectors: Any = None  # PartVectorIndex over descriptions
+
+# Catalog tables: (source column, DataFrame column) pairs, merge key and load order
+CATALOG_TABLES = {
+    'parts': {
+        'columns': [('part_number', 'internal_part_number'), ('description', 'description')],
+        'key': 'internal_part_number',
+        'order': 'part_number,id'  # id breaks ties so limit/offset pages neither skip nor repeat rows
+    },
+    'customers': {
+        'columns': [('customer_id', 'account_number'), ('company_name', 'company_name'), ('address', 'address'),
+                    ('city', 'city'), ('state_prov', 'state'), ('postal_code', 'postal_code'),
+                    ('country', 'country')],
+        'key': 'account_number',
+        'order': 'customer_id,id'
+    }
+}
+CATALOG_REST_PAGE_SIZE = 1000  # PostgREST default max rows per request
+# Rows fetched by a case-insensitive exact lookup, re-checked for equality client-side
+REST_EXACT_MATCH_ROWS = 10
+
+
+def _ilike_literal(value: str) -> str:
+    """
+    PostgREST ilike pattern for value taken literally.
+
+    Backslash, % and _ are escaped. PostgREST rewrites * to %, so a literal * becomes the
+    single-character wildcard _; callers re-check equality on the rows returned.
+    """
+    escaped = value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return escaped.replace('*', '_')
+
+
+def _first_exact_row(rows: List[Dict], part_number: str) -> Optional[Dict]:
+    """First row whose internal_part_number equals part_number ignoring case."""
+    wanted = part_number.upper()
+    return next((row for row in rows if str(row['internal_part_number']).upper() == wanted), None)
+
+
+# Nearest descriptions (TF-IDF cosine) re-scored with fuzz.ratio by find_part_by_description
+DESCRIPTION_CANDIDATES = 50
+
+# processing_results columns returned by listings (everything except the raw_json_data payload)
+PROCESSING_RESULT_LISTING_COLUMNS = [
+    'id', 'filename', 'original_filename', 'file_size', 'processing_status', 'validation_status',
+    'processing_start_time', 'processing_end_time', 'processing_duration', 'total_parts', 'parts_mapped',
+    'parts_not_found', 'parts_manual_review', 'mapping_success_rate', 'customer_matched',
+    'customer_match_confidence', 'error_details', 'error_types', 'manual_corrections_made', 'epicor_ready',
+    'epicor_ready_with_one_click', 'missing_info_count', 'processed_file_path', 'epicor_json_path',
+    'notes', 'created_at', 'updated_at'
+]
+
 class ComprehensiveHybridDatabaseManager:
     """Comprehensive database manager with hybrid connection for all databases."""
     
-    def __init__(self):
-        """Initialize the comprehensive hybrid database manager."""
+    def __init__(self, connect: bool = True, snapshot_dir: str = "data/catalog_snapshot"):
+        """
+        Initialize the comprehensive hybrid database manager.
+        
+        Args:
+            connect: Connect to the database; False serves the catalog from the snapshot only
+                (no network access, e.g. the replay benchmark)
+            snapshot_dir: Catalog snapshot directory
+        """
         self.use_postgres = True
         self.use_rest_api = False
         self.connection_method = "PostgreSQL Pooler"  # Track current connection method
         self.supabase_url = None
         self.api_key = None
         
-        # Data storage - now loaded on demand
-        self.parts_df = None
-        self.customers_df = None
+        # Data storage - now loaded on demand. Frames and search indexes live in one
+        # CatalogState so a reload swaps them together; readers take one reference to it.
+        self._catalog = CatalogState()
         self._parts_loaded = False
         self._customers_loaded = False
-        
-        # Search optimization indexes - now built on demand
-        self.parts_by_exact_match = {}
-        self.parts_by_keywords = defaultdict(list)
-        self.description_words = {}
+        self.catalog_snapshot = CatalogSnapshot(snapshot_dir)
+        self.index_store = SharedCatalogIndexStore()
+        self.vector_store = SharedCatalogIndexStore("data/catalog_vectors")
+        self._catalog_versions: Dict[str, Tuple[int, Optional[str]]] = {}  # table -> (rows, max(updated_at))
+        self._reload_lock = threading.Lock()
+        self._local_search: Optional[LocalCatalogSearch] = None  # Offline search, created on first local query
+        self._local_search_frames = (None, None)
         
         # Load environment variables
         self._load_environment()
         
         # Try PostgreSQL first, fallback to REST API
-        self._initialize_connection()
+        if connect:
+            self._initialize_connection()
+        else:
+            self.use_postgres = False
+            self.connection_method = "None"
+            print(f"📦 Database disabled, catalog from {snapshot_dir}")
         
         # Load databases at startup for compatibility
         if self.use_postgres or self.use_rest_api:
@@ -69,6 +153,31 @@ class ComprehensiveHybridDatabaseManager:
         
         print("✅ Database manager initialized")
     
+    # Read-only views of the current catalog state (one attribute read each)
+    @property
+    def parts_df(self) -> Optional[pd.DataFrame]:
+        return self._catalog.parts_df
+    
+    @property
+    def customers_df(self) -> Optional[pd.DataFrame]:
+        return self._catalog.customers_df
+    
+    @property
+    def parts_by_exact_match(self):
+        return self._catalog.parts_by_exact_match
+    
+    @property
+    def description_words(self):
+        return self._catalog.description_words
+    
+    @property
+    def parts_by_keywords(self):
+        return self._catalog.parts_by_keywords
+    
+    @property
+    def part_vectors(self):
+        return self._catalog.part_vectors
+    
     def _load_environment(self):
         """Load environment variables from AWS environment variables."""
         # In AWS, environment variables are already set, no need to load from file
@@ -155,200 +264,203 @@ class ComprehensiveHybridDatabaseManager:
     def load_databases(self) -> None:
         """Load both parts and customers databases."""
         print("Loading parts and customers databases...")
-        self.load_parts_database()
         self.load_customers_database()
-        
-        # Build search indexes after loading
-        self._build_search_indexes()
-        print(f"✅ Loaded {len(self.parts_df)} parts and {len(self.customers_df)} customers")
+        self.load_parts_database()  # Also maps the search indexes
+        catalog = self._catalog
+        print(f"✅ Loaded {len(catalog.parts_df)} parts and {len(catalog.customers_df)} customers")
     
     def load_parts_database(self) -> None:
-        """Load parts database."""
+        """Load parts database (local snapshot plus rows changed since it was taken) with its search indexes."""
+        parts_df = self._load_catalog_table('parts')
+        with self._reload_lock:
+            catalog = self._catalog
+            self._catalog = replace(catalog, parts_df=parts_df,
+                                    **self._map_search_indexes(parts_df, catalog.customers_df))
+        self._parts_loaded = True
+    
+    def load_customers_database(self) -> None:
+        """Load customers database (local snapshot plus rows changed since it was taken)."""
+        customers_df = self._load_catalog_table('customers')
+        with self._reload_lock:
+            self._catalog = replace(self._catalog, customers_df=customers_df)
+        self._customers_loaded = True
+    
+    def _load_catalog_table(self, table: str) -> pd.DataFrame:
+        """
+        Load a catalog table from the local snapshot, refreshing it incrementally.
+    
+        Only rows with updated_at at or after the snapshot stamp are fetched. A full reload
+        happens when there is no snapshot or the row counts disagree (rows were deleted).
+        If the database is unreachable the snapshot is used as-is.
+    
+        Args:
+            table: 'parts' or 'customers'
+    
+        Returns:
+            Catalog DataFrame
+        """
+        spec = CATALOG_TABLES[table]
+        snapshot_df, snapshot_version = self.catalog_snapshot.load(table)
+    
+        if not (self.use_postgres or self.use_rest_api):
+            if snapshot_df is not None:
+                print(f"⚠️ No database connection available, using {table} snapshot ({snapshot_version})")
+                return snapshot_df
+            print("⚠️ No database connection available")
+            return pd.DataFrame(columns=[column for _, column in spec['columns']])
+    
         try:
-            if self.use_postgres:
-                self._load_parts_postgres()
-            elif self.use_rest_api:
-                self._load_parts_rest_api()
-            else:
-                print("⚠️ No database connection available")
-                self.parts_df = pd.DataFrame(columns=['internal_part_number', 'description'])
-                
+            remote_rows, remote_version = self._get_catalog_version(table)
+            self._catalog_versions[table] = (remote_rows, remote_version)
+    
+            if snapshot_df is not None and snapshot_version == remote_version and len(snapshot_df) == remote_rows:
+                print(f"✅ Loaded {len(snapshot_df)} {table} from snapshot (current)")
+                return snapshot_df
+    
+            if snapshot_df is not None and snapshot_version:
+                changed_df, _ = self._fetch_catalog_rows(table, since=snapshot_version)
+                key = spec['key']
+                merged_df = pd.concat(
+                    [snapshot_df[~snapshot_df[key].isin(changed_df[key])], changed_df],
+                    ignore_index=True
+                ).sort_values(key, kind='stable').reset_index(drop=True)
+    
+                if len(merged_df) == remote_rows:
+                    self.catalog_snapshot.save(table, merged_df, remote_version)
+                    print(f"✅ Loaded {len(merged_df)} {table} from snapshot + {len(changed_df)} changed rows")
+                    return merged_df
+                print(f"⚠️ {table} snapshot out of sync ({len(merged_df)} vs {remote_rows} rows), reloading")
+    
+            full_df, _ = self._fetch_catalog_rows(table)
+            if len(full_df) != remote_rows:
+                # Truncated paging or rows changing mid-load: serve it, but never pin it as the snapshot
+                print(f"⚠️ Loaded {len(full_df)} {table} but the database reports {remote_rows}; snapshot not updated")
+                return full_df
+            self.catalog_snapshot.save(table, full_df, remote_version)
+            print(f"✅ Loaded {len(full_df)} {table} from {self.connection_method}")
+            return full_df
+    
         except Exception as e:
-            print(f"❌ Error loading parts: {e}")
-            self.parts_df = pd.DataFrame(columns=['internal_part_number', 'description'])
+            print(f"❌ Error loading {table}: {e}")
+            if snapshot_df is not None:
+                print(f"⚠️ Using {table} snapshot ({snapshot_version})")
+                return snapshot_df
+            return pd.DataFrame(columns=[column for _, column in spec['columns']])
+    
+    def _get_catalog_version(self, table: str) -> Tuple[int, Optional[str]]:
+        """Row count and max(updated_at) of a catalog table."""
+        if self.use_postgres:
+            return self._get_catalog_version_postgres(table)
+        return self._get_catalog_version_rest_api(table)
     
-    def _load_parts_postgres(self) -> None:
-        """Load parts database using PostgreSQL."""
+    def _get_catalog_version_postgres(self, table: str) -> Tuple[int, Optional[str]]:
+        """Catalog version using PostgreSQL."""
         from database_config import db_config
-        
-        sql = "SELECT part_number, description FROM parts ORDER BY part_number"
-        results = db_config.execute_raw_sql(sql)
-        
-        # Convert to DataFrame
-        parts_data = []
-        for row in results:
-            parts_data.append({
-                'internal_part_number': row[0],
-                'description': row[1]
-            })
-        
-        self.parts_df = pd.DataFrame(parts_data)
-        print(f"✅ Loaded {len(self.parts_df)} parts from PostgreSQL")
     
-    def _load_parts_rest_api(self) -> None:
-        """Load parts database using REST API."""
+        sql = f"SELECT COUNT(*), MAX(updated_at) FROM {table}"
+        row = db_config.execute_raw_sql_single(sql)
+        if not row:
+            return 0, None
+        return int(row[0] or 0), row[1].isoformat() if row[1] else None
+    
+    def _get_catalog_version_rest_api(self, table: str) -> Tuple[int, Optional[str]]:
+        """Catalog version using REST API (exact count from the Content-Range header)."""
         headers = {
             'apikey': self.api_key,
             'Authorization': f'Bearer {self.api_key}',
-            'Content-Type': 'application/json'
+            'Content-Type': 'application/json',
+            'Prefer': 'count=exact'
         }
-        
-        query_url = f"{self.supabase_url}/rest/v1/parts"
+    
+        query_url = f"{self.supabase_url}/rest/v1/{table}"
         params = {
-            'select': 'part_number,description',
-            'order': 'part_number'
+            'select': 'updated_at',
+            'order': 'updated_at.desc.nullslast',
+            'limit': 1
         }
-        
+    
         response = requests.get(query_url, headers=headers, params=params, timeout=30)
-        
-        if response.status_code == 200:
-            data = response.json()
-            
-            parts_data = []
-            for record in data:
-                parts_data.append({
-                    'internal_part_number': record.get('part_number', ''),
-                    'description': record.get('description', '')
-                })
-            
-            self.parts_df = pd.DataFrame(parts_data)
-            print(f"✅ Loaded {len(self.parts_df)} parts from REST API")
+        if response.status_code not in (200, 206):
+            raise RuntimeError(f"REST API {table} version query failed: {response.status_code}")
+    
+        content_range = response.headers.get('Content-Range', '')
+        total = content_range.split('/')[-1]
+        data = response.json()
+        return (int(total) if total.isdigit() else 0), (data[0].get('updated_at') if data else None)
+    
+    def _fetch_catalog_rows(self, table: str, since: Optional[str] = None) -> Tuple[pd.DataFrame, Optional[str]]:
+        """
+        Fetch catalog rows, optionally only those updated at or after `since`.
+    
+        Returns:
+            (DataFrame with catalog column names, max(updated_at) of the fetched rows)
+        """
+        if self.use_postgres:
+            records = self._fetch_catalog_rows_postgres(table, since)
         else:
-            print(f"❌ REST API parts query failed: {response.status_code}")
-            self.parts_df = pd.DataFrame(columns=['internal_part_number', 'description'])
+            records = self._fetch_catalog_rows_rest_api(table, since)
     
-    def load_customers_database(self) -> None:
-        """Load customers database."""
-        try:
-            if self.use_postgres:
-                self._load_customers_postgres()
-            elif self.use_rest_api:
-                self._load_customers_rest_api()
-            else:
-                print("⚠️ No database connection available")
-                self.customers_df = pd.DataFrame(columns=['account_number', 'company_name', 'address', 'state'])
-                
-        except Exception as e:
-            print(f"❌ Error loading customers: {e}")
-            self.customers_df = pd.DataFrame(columns=['account_number', 'company_name', 'address', 'state'])
+        spec = CATALOG_TABLES[table]
+        source_columns = [source for source, _ in spec['columns']]
+        raw_df = pd.DataFrame.from_records(records, columns=source_columns + ['updated_at'])
+        max_updated = raw_df['updated_at'].max() if not raw_df.empty else None
+        if max_updated is not None and hasattr(max_updated, 'isoformat'):
+            max_updated = max_updated.isoformat()
+    
+        df = raw_df[source_columns].rename(columns=dict(spec['columns']))
+        df = df.fillna('').astype(str)
+        return df, max_updated
     
-    def _load_customers_postgres(self) -> None:
-        """Load customers database using PostgreSQL."""
+    def _fetch_catalog_rows_postgres(self, table: str, since: Optional[str]) -> List[tuple]:
+        """Fetch catalog rows using PostgreSQL."""
         from database_config import db_config
-        
-        sql = "SELECT customer_id, company_name, address, city, state_prov, postal_code, country FROM customers ORDER BY customer_id"
-        results = db_config.execute_raw_sql(sql)
-        
-        # Convert to DataFrame
-        customers_data = []
-        for row in results:
-            customers_data.append({
-                'account_number': str(row[0]),
-                'company_name': row[1],
-                'address': row[2] or '',
-                'state': row[4] or '',
-                'city': row[3] or '',
-                'postal_code': row[5] or '',
-                'country': row[6] or ''
-            })
-        
-        self.customers_df = pd.DataFrame(customers_data)
-        print(f"✅ Loaded {len(self.customers_df)} customers from PostgreSQL")
     
-    def _load_customers_rest_api(self) -> None:
-        """Load customers database using REST API."""
+        spec = CATALOG_TABLES[table]
+        columns = ', '.join(source for source, _ in spec['columns'])
+        sql = f"SELECT {columns}, updated_at FROM {table}"
+        params = {}
+        if since:
+            sql += " WHERE updated_at >= :since"
+            params['since'] = since
+        sql += f" ORDER BY {spec['order']}"
+        return [tuple(row) for row in db_config.execute_raw_sql(sql, params)]
+    
+    def _fetch_catalog_rows_rest_api(self, table: str, since: Optional[str]) -> List[tuple]:
+        """
+        Fetch catalog rows using REST API, paging past the server's row limit.
+        
+        Pages may come back shorter than CATALOG_REST_PAGE_SIZE when the server's max-rows
+        is lower, so paging only stops at an empty page.
+        """
         headers = {
             'apikey': self.api_key,
             'Authorization': f'Bearer {self.api_key}',
             'Content-Type': 'application/json'
         }
-        
-        query_url = f"{self.supabase_url}/rest/v1/customers"
+    
+        spec = CATALOG_TABLES[table]
+        source_columns = [source for source, _ in spec['columns']] + ['updated_at']
+        query_url = f"{self.supabase_url}/rest/v1/{table}"
         params = {
-            'select': 'customer_id,company_name,address,city,state_prov,postal_code,country',
-            'order': 'customer_id'
+            'select': ','.join(source_columns),
+            'order': spec['order'],
+            'limit': CATALOG_REST_PAGE_SIZE
         }
-        
-        response = requests.get(query_url, headers=headers, params=params, timeout=30)
-        
-        if response.status_code == 200:
-            data = response.json()
-            
-            customers_data = []
-            for record in data:
-                customers_data.append({
-                    'account_number': str(record.get('customer_id', '')),
-                    'company_name': record.get('company_name', ''),
-                    'address': record.get('address', ''),
-                    'state': record.get('state_prov', ''),
-                    'city': record.get('city', ''),
-                    'postal_code': record.get('postal_code', ''),
-                    'country': record.get('country', '')
-                })
-            
-            self.customers_df = pd.DataFrame(customers_data)
-            print(f"✅ Loaded {len(self.customers_df)} customers from REST API")
-        else:
-            print(f"❌ REST API customers query failed: {response.status_code}")
-            self.customers_df = pd.DataFrame(columns=['account_number', 'company_name', 'address', 'state'])
-    
-    def _build_search_indexes(self) -> None:
-        """Build search indexes for efficient lookups."""
-        if self.parts_df is not None and not self.parts_df.empty:
-            # Build exact match index
-            self.parts_by_exact_match = {}
-            for idx, row in self.parts_df.iterrows():
-                part_num = str(row['internal_part_number']).strip().upper()
-                self.parts_by_exact_match[part_num] = idx
-            
-            # Build keyword index
-            self.parts_by_keywords = defaultdict(list)
-            self.description_words = {}
-            
-            for idx, row in self.parts_df.iterrows():
-                part_num = str(row['internal_part_number']).strip()
-                description = str(row['description']).strip()
-                
-                # Add to keyword index
-                keywords = self._extract_keywords(part_num, description)
-                for keyword in keywords:
-                    self.parts_by_keywords[keyword].append(idx)
-                
-                # Add to description words index
-                words = self._extract_words(description)
-                for word in words:
-                    if word not in self.description_words:
-                        self.description_words[word] = []
-                    self.description_words[word].append(idx)
+        if since:
+            params['updated_at'] = f'gte.{since}'
     
-    def _extract_keywords(self, part_number: str, description: str) -> List[str]:
-        """Extract searchable keywords from part number and description."""
-        keywords = set()
-        
-        # Add part number variations
-        keywords.add(part_number.upper())
-        keywords.add(part_number.lower())
-        
-        # Add description words
-        words = self._extract_words(description)
-        keywords.update(words)
-        
-        # Add partial part numbers
-        if len(part_number) > 3:
-            for i in range(3, len(part_number) + 1):
-                keywords.add(part_number[:i].upper())
-        
-        return list(keywords)
+        records = []
+        offset = 0
+        while True:
+            params['offset'] = offset
+            response = requests.get(query_url, headers=headers, params=params, timeout=30)
+            if response.status_code not in (200, 206):
+                raise RuntimeError(f"REST API {table} query failed: {response.status_code}")
+            page = response.json()
+            if not page:
+                return records
+            records.extend(tuple(record.get(column) for column in source_columns) for record in page)
+            offset += len(page)
     
     def _extract_words(self, text: str) -> List[str]:
         """Extract individual words from text for indexing."""
@@ -361,7 +473,7 @@ class ComprehensiveHybridDatabaseManager:
         
         return words
     
-    # Parts search methods - now using direct database queries
+    # Parts search methods - trigram-ranked candidates from the database (local FTS5 when offline)
     def search_parts(self, query: str, limit: int = 10) -> List[Dict]:
         """Search for parts using direct database queries."""
         if not query:
@@ -375,21 +487,20 @@ class ComprehensiveHybridDatabaseManager:
             elif self.use_rest_api:
                 return self._search_parts_rest_api(query, limit)
             else:
-                print("❌ No database connection available for search")
-                return []
+                return self._get_local_search().search_parts(query, limit)
         except Exception as e:
             print(f"❌ Error searching parts: {e}")
             return []
     
     def _search_parts_postgres(self, query: str, limit: int) -> List[Dict]:
-        """Search parts using PostgreSQL with optimized queries."""
+        """Search parts using PostgreSQL (exact match, then search_parts_trgm candidates)."""
         from database_config import db_config
         
         # First try exact match
         exact_sql = """
-            SELECT internal_part_number, description 
+            SELECT part_number, description 
             FROM parts 
-            WHERE UPPER(internal_part_number) = :query
+            WHERE UPPER(part_number) = :query
             LIMIT 1
         """
         exact_results = db_config.execute_raw_sql(exact_sql, {'query': query.upper()})
@@ -403,33 +514,16 @@ class ComprehensiveHybridDatabaseManager:
                 'score': 1.0
             })
         
-        # If we need more results, do fuzzy search
+        # Fill up with trigram-ranked candidates (GIN/GiST indexed, see migration)
         if len(results) < limit:
-            fuzzy_sql = """
-                SELECT internal_part_number, description,
-                       CASE 
-                           WHEN UPPER(internal_part_number) LIKE :query_start THEN 0.9
-                           WHEN UPPER(internal_part_number) LIKE :query_contains THEN 0.7
-                           WHEN UPPER(description) LIKE :query_start THEN 0.6
-                           WHEN UPPER(description) LIKE :query_contains THEN 0.4
-                           ELSE 0.3
-                       END as score
-                FROM parts 
-                WHERE UPPER(internal_part_number) LIKE :query_contains 
-                   OR UPPER(description) LIKE :query_contains
-                ORDER BY score DESC, internal_part_number
-                LIMIT :limit
-            """
-            
-            fuzzy_results = db_config.execute_raw_sql(fuzzy_sql, {
-                'query_start': f'{query.upper()}%',
-                'query_contains': f'%{query.upper()}%',
-                'limit': limit
-            })
+            fuzzy_sql = "SELECT part_number, description, score FROM search_parts_trgm(:query, :limit)"
+            fuzzy_results = db_config.execute_raw_sql(fuzzy_sql, {'query': query, 'limit': limit})
             
             for row in fuzzy_results:
                 if len(results) >= limit:
                     break
+                if results and row[0] == results[0]['internal_part_number']:
+                    continue
                 results.append({
                     'internal_part_number': row[0],
                     'description': row[1],
@@ -440,55 +534,52 @@ class ComprehensiveHybridDatabaseManager:
         return results
     
     def _search_parts_rest_api(self, query: str, limit: int) -> List[Dict]:
-        """Search parts using REST API."""
+        """Search parts using REST API (exact match, then the search_parts_trgm RPC function)."""
         headers = {
             'apikey': self.api_key,
             'Authorization': f'Bearer {self.api_key}',
             'Content-Type': 'application/json'
         }
         
-        # Try exact match first
+        # Try exact match first (escaped ilike = case-insensitive equality, re-checked here)
         exact_url = f"{self.supabase_url}/rest/v1/parts"
         exact_params = {
-            'select': 'internal_part_number,description',
-            'internal_part_number': f'eq.{query.upper()}',
-            'limit': '1'
+            'select': 'internal_part_number:part_number,description',
+            'part_number': f'ilike.{_ilike_literal(query)}',
+            'limit': str(REST_EXACT_MATCH_ROWS)
         }
         
         exact_response = requests.get(exact_url, headers=headers, params=exact_params, timeout=30)
         results = []
         
         if exact_response.status_code == 200:
-            exact_data = exact_response.json()
-            if exact_data:
+            exact_row = _first_exact_row(exact_response.json(), query)
+            if exact_row:
                 results.append({
-                    'internal_part_number': exact_data[0]['internal_part_number'],
-                    'description': exact_data[0]['description'],
+                    'internal_part_number': exact_row['internal_part_number'],
+                    'description': exact_row['description'],
                     'match_type': 'exact',
                     'score': 1.0
                 })
         
-        # If we need more results, do fuzzy search
+        # If we need more results, use the trigram search function
         if len(results) < limit:
-            fuzzy_url = f"{self.supabase_url}/rest/v1/parts"
-            fuzzy_params = {
-                'select': 'internal_part_number,description',
-                'or': f'internal_part_number.ilike.%{query}%,description.ilike.%{query}%',
-                'limit': str(limit)
-            }
-            
-            fuzzy_response = requests.get(fuzzy_url, headers=headers, params=fuzzy_params, timeout=30)
+            rpc_url = f"{self.supabase_url}/rest/v1/rpc/search_parts_trgm"
+            fuzzy_response = requests.post(rpc_url, headers=headers,
+                                           json={'query': query, 'max_results': limit}, timeout=30)
             
             if fuzzy_response.status_code == 200:
                 fuzzy_data = fuzzy_response.json()
                 for item in fuzzy_data:
                     if len(results) >= limit:
                         break
+                    if results and item['part_number'] == results[0]['internal_part_number']:
+                        continue
                     results.append({
-                        'internal_part_number': item['internal_part_number'],
+                        'internal_part_number': item['part_number'],
                         'description': item['description'],
                         'match_type': 'fuzzy',
-                        'score': 0.5  # Default score for REST API
+                        'score': float(item['score'])
                     })
         
         return results
@@ -528,40 +619,21 @@ class ComprehensiveHybridDatabaseManager:
             elif self.use_rest_api:
                 return self._search_customers_rest_api(query, limit)
             else:
-                print("❌ No database connection available for customer search")
-                return []
+                return self._get_local_search().search_customers(query, limit)
         except Exception as e:
             print(f"❌ Error searching customers: {e}")
             return []
     
     def _search_customers_postgres(self, query: str, limit: int) -> List[Dict]:
-        """Search customers using PostgreSQL with optimized queries."""
+        """Search customers using PostgreSQL (search_customers_trgm)."""
         from database_config import db_config
         
         sql = """
-            SELECT account_number, company_name, address, city, state_prov, postal_code, country,
-                   CASE 
-                       WHEN UPPER(company_name) LIKE :query_start THEN 0.9
-                       WHEN UPPER(company_name) LIKE :query_contains THEN 0.7
-                       WHEN UPPER(address) LIKE :query_start THEN 0.6
-                       WHEN UPPER(address) LIKE :query_contains THEN 0.4
-                       WHEN UPPER(city) LIKE :query_start THEN 0.5
-                       WHEN UPPER(city) LIKE :query_contains THEN 0.3
-                       ELSE 0.2
-                   END as score
-            FROM customers 
-            WHERE UPPER(company_name) LIKE :query_contains 
-               OR UPPER(address) LIKE :query_contains
-               OR UPPER(city) LIKE :query_contains
-            ORDER BY score DESC, company_name
-            LIMIT :limit
+            SELECT account_number, company_name, address, city, state_prov, postal_code, country, score
+            FROM search_customers_trgm(:query, :limit)
         """
         
-        results = db_config.execute_raw_sql(sql, {
-            'query_start': f'{query.upper()}%',
-            'query_contains': f'%{query.upper()}%',
-            'limit': limit
-        })
+        results = db_config.execute_raw_sql(sql, {'query': query, 'limit': limit})
         
         return [{
             'account_number': row[0],
@@ -575,21 +647,15 @@ class ComprehensiveHybridDatabaseManager:
         } for row in results]
     
     def _search_customers_rest_api(self, query: str, limit: int) -> List[Dict]:
-        """Search customers using REST API."""
+        """Search customers using the search_customers_trgm RPC function."""
         headers = {
             'apikey': self.api_key,
             'Authorization': f'Bearer {self.api_key}',
             'Content-Type': 'application/json'
         }
         
-        url = f"{self.supabase_url}/rest/v1/customers"
-        params = {
-            'select': 'account_number,company_name,address,city,state_prov,postal_code,country',
-            'or': f'company_name.ilike.%{query}%,address.ilike.%{query}%,city.ilike.%{query}%',
-            'limit': str(limit)
-        }
-        
-        response = requests.get(url, headers=headers, params=params, timeout=30)
+        url = f"{self.supabase_url}/rest/v1/rpc/search_customers_trgm"
+        response = requests.post(url, headers=headers, json={'query': query, 'max_results': limit}, timeout=30)
         
         if response.status_code == 200:
             data = response.json()
@@ -601,11 +667,26 @@ class ComprehensiveHybridDatabaseManager:
                 'state': item['state_prov'],
                 'postal_code': item['postal_code'],
                 'country': item['country'],
-                'score': 0.5  # Default score for REST API
+                'score': float(item['score'])
             } for item in data]
         
         return []
     
+    def _get_local_search(self) -> LocalCatalogSearch:
+        """FTS5 index over the loaded catalog snapshot, rebuilt when the catalog changes."""
+        self._load_parts_database()
+        self._load_customers_database()
+        
+        if self._local_search is None:
+            self._local_search = LocalCatalogSearch()
+        catalog = self._catalog
+        frames = (catalog.parts_df, catalog.customers_df)
+        if self._local_search_frames != tuple(id(frame) for frame in frames):
+            for table, df in zip(('parts', 'customers'), frames):
+                self._local_search.ensure_index(table, df, catalog_version_key(df))
+            self._local_search_frames = tuple(id(frame) for frame in frames)
+        return self._local_search
+    
     def get_part_by_number(self, part_number: str) -> Optional[Dict]:
         """Get a specific part by its number using direct database query."""
         if not part_number:
@@ -630,9 +711,9 @@ class ComprehensiveHybridDatabaseManager:
         from database_config import db_config
         
         sql = """
-            SELECT internal_part_number, description 
+            SELECT part_number, description 
             FROM parts 
-            WHERE UPPER(internal_part_number) = :part_number
+            WHERE UPPER(part_number) = :part_number
             LIMIT 1
         """
         
@@ -655,19 +736,19 @@ class ComprehensiveHybridDatabaseManager:
         
         url = f"{self.supabase_url}/rest/v1/parts"
         params = {
-            'select': 'internal_part_number,description',
-            'internal_part_number': f'eq.{part_number.upper()}',
-            'limit': '1'
+            'select': 'internal_part_number:part_number,description',
+            'part_number': f'ilike.{_ilike_literal(part_number)}',
+            'limit': str(REST_EXACT_MATCH_ROWS)
         }
         
         response = requests.get(url, headers=headers, params=params, timeout=30)
         
         if response.status_code == 200:
-            data = response.json()
-            if data:
+            row = _first_exact_row(response.json(), part_number)
+            if row:
                 return {
-                    'internal_part_number': data[0]['internal_part_number'],
-                    'description': data[0]['description']
+                    'internal_part_number': row['internal_part_number'],
+                    'description': row['description']
                 }
         return None
     
@@ -677,6 +758,8 @@ class ComprehensiveHybridDatabaseManager:
             return None
         
         account_number = str(account_number).strip()
+        if not account_number.isdigit():
+            return None  # customer_id is an integer column
         
         try:
             if self.use_postgres:
@@ -695,13 +778,13 @@ class ComprehensiveHybridDatabaseManager:
         from database_config import db_config
         
         sql = """
-            SELECT account_number, company_name, address, city, state_prov, postal_code, country
+            SELECT customer_id::text, company_name, address, city, state_prov, postal_code, country
             FROM customers 
-            WHERE account_number = :account_number
+            WHERE customer_id = :account_number
             LIMIT 1
         """
         
-        result = db_config.execute_raw_sql_single(sql, {'account_number': account_number})
+        result = db_config.execute_raw_sql_single(sql, {'account_number': int(account_number)})
         
         if result:
             return {
@@ -725,8 +808,8 @@ class ComprehensiveHybridDatabaseManager:
         
         url = f"{self.supabase_url}/rest/v1/customers"
         params = {
-            'select': 'account_number,company_name,address,city,state_prov,postal_code,country',
-            'account_number': f'eq.{account_number}',
+            'select': 'account_number:customer_id,company_name,address,city,state_prov,postal_code,country',
+            'customer_id': f'eq.{account_number}',
             'limit': '1'
         }
         
@@ -736,7 +819,7 @@ class ComprehensiveHybridDatabaseManager:
             data = response.json()
             if data:
                 return {
-                    'account_number': data[0]['account_number'],
+                    'account_number': str(data[0]['account_number']),
                     'company_name': data[0]['company_name'],
                     'address': data[0]['address'],
                     'city': data[0]['city'],
@@ -800,7 +883,7 @@ class ComprehensiveHybridDatabaseManager:
                     missing_info_count=row[21] or 0,
                     processed_file_path=row[22] or '',
                     epicor_json_path=row[23],
-                    raw_json_data=row[24] or '',
+                    raw_json_data=decode_json_payload(row[24]),
                     notes=row[25] or '',
                     created_at=row[26],
                     updated_at=row[27]
@@ -864,7 +947,7 @@ class ComprehensiveHybridDatabaseManager:
                         missing_info_count=record.get('missing_info_count', 0),
                         processed_file_path=record.get('processed_file_path', ''),
                         epicor_json_path=record.get('epicor_json_path'),
-                        raw_json_data=record.get('raw_json_data', ''),
+                        raw_json_data=decode_json_payload(record.get('raw_json_data')),
                         notes=record.get('notes', ''),
                         created_at=datetime.fromisoformat(record.get('created_at', datetime.now().isoformat()).replace('Z', '+00:00')) if record.get('created_at') else None,
                         updated_at=datetime.fromisoformat(record.get('updated_at', datetime.now().isoformat()).replace('Z', '+00:00')) if record.get('updated_at') else None
@@ -923,7 +1006,7 @@ class ComprehensiveHybridDatabaseManager:
                 'missing_info_count': result.missing_info_count,
                 'processed_file_path': result.processed_file_path,
                 'epicor_json_path': result.epicor_json_path,
-                'raw_json_data': result.raw_json_data,
+                'raw_json_data': encode_json_payload(result.raw_json_data),
                 'notes': result.notes,
                 'created_at': result.created_at,
                 'updated_at': result.updated_at
@@ -995,7 +1078,7 @@ class ComprehensiveHybridDatabaseManager:
                 'missing_info_count': result.missing_info_count,
                 'processed_file_path': result.processed_file_path,
                 'epicor_json_path': result.epicor_json_path,
-                'raw_json_data': result.raw_json_data,
+                'raw_json_data': encode_json_payload(result.raw_json_data),
                 'notes': result.notes,
                 'created_at': result.created_at.isoformat() if result.created_at else None,
                 'updated_at': result.updated_at.isoformat() if result.updated_at else None
@@ -1130,19 +1213,36 @@ class ComprehensiveHybridDatabaseManager:
                 'avg_processing_time': 0
             }
     
+    def ping(self) -> bool:
+        """Cheap round trip to the database; False when it is unreachable."""
+        try:
+            if self.use_postgres:
+                from database_config import db_config
+                return bool(db_config.execute_raw_sql_single("SELECT 1 as test"))
+            if self.use_rest_api:
+                response = requests.get(f"{self.supabase_url}/rest/v1/processing_results",
+                                        headers={'apikey': self.api_key, 'Authorization': f'Bearer {self.api_key}'},
+                                        params={'select': 'id', 'limit': '1'}, timeout=10)
+                return response.status_code in (200, 206)
+        except Exception as e:
+            print(f"⚠️ Database ping failed: {e}")
+        return False
+    
     def get_connection_status(self) -> Dict[str, Any]:
         """Get current connection status."""
+        catalog = self._catalog
         return {
             'using_postgres': self.use_postgres,
             'using_rest_api': self.use_rest_api,
             'connection_method': 'PostgreSQL Transaction Pooler' if self.use_postgres else 'REST API' if self.use_rest_api else 'None',
             'supabase_url': self.supabase_url,
             'has_api_key': bool(self.api_key),
-            'parts_loaded': len(self.parts_df) if self.parts_df is not None else 0,
-            'customers_loaded': len(self.customers_df) if self.customers_df is not None else 0
+            'parts_loaded': len(catalog.parts_df) if catalog.parts_df is not None else 0,
+            'customers_loaded': len(catalog.customers_df) if catalog.customers_df is not None else 0
         }
     
     # Additional methods from MetricsDatabase for full compatibility
+    @timed('db_create_result')
     def create_processing_result(self, filename: str, original_filename: str, file_size: int, 
                                 processing_status: ProcessingStatus, validation_status: ValidationStatus,
                                 processing_start_time: datetime, processed_file_path: str, 
@@ -1194,7 +1294,7 @@ class ComprehensiveHybridDatabaseManager:
             'validation_status': validation_status.value,
             'processing_start_time': processing_start_time,
             'processed_file_path': processed_file_path,
-            'raw_json_data': raw_json_data,
+            'raw_json_data': encode_json_payload(raw_json_data),
             'notes': notes,
             'created_at': now,
             'updated_at': now
@@ -1222,7 +1322,7 @@ class ComprehensiveHybridDatabaseManager:
             'validation_status': validation_status.value,
             'processing_start_time': processing_start_time.isoformat(),
             'processed_file_path': processed_file_path,
-            'raw_json_data': raw_json_data,
+            'raw_json_data': encode_json_payload(raw_json_data),
             'notes': notes,
             'created_at': datetime.utcnow().isoformat(),
             'updated_at': datetime.utcnow().isoformat()
@@ -1260,6 +1360,7 @@ class ComprehensiveHybridDatabaseManager:
             print(f"❌ REST API create failed with status: {response.status_code}")
             return 0
     
+    @timed('db_update_result')
     def update_processing_result(self, result_id: int, **kwargs) -> bool:
         """Update a processing result."""
         try:
@@ -1285,7 +1386,9 @@ class ComprehensiveHybridDatabaseManager:
         values = []
         
         for key, value in kwargs.items():
-            if key == 'error_types' and isinstance(value, list):
+            if key == 'raw_json_data':
+                value = encode_json_payload(value)
+            elif key == 'error_types' and isinstance(value, list):
                 value = json.dumps([e.value if hasattr(e, 'value') else e for e in value])
             elif hasattr(value, 'value'):  # Enum
                 value = value.value
@@ -1334,7 +1437,9 @@ class ComprehensiveHybridDatabaseManager:
         # Prepare data for REST API
         data = {}
         for key, value in kwargs.items():
-            if key == 'error_types' and isinstance(value, list):
+            if key == 'raw_json_data':
+                data[key] = encode_json_payload(value)
+            elif key == 'error_types' and isinstance(value, list):
                 data[key] = json.dumps([e.value if hasattr(e, 'value') else e for e in value])
             elif hasattr(value, 'value'):  # Enum
                 data[key] = value.value
@@ -1352,6 +1457,7 @@ class ComprehensiveHybridDatabaseManager:
         
         return response.status_code in [200, 204]  # 204 is No Content, which is success for PATCH
     
+    @timed('db_get_result')
     def get_processing_result(self, result_id: int) -> Optional[ProcessingResult]:
         """Get a processing result by ID."""
         try:
@@ -1415,7 +1521,7 @@ class ComprehensiveHybridDatabaseManager:
                 missing_info_count=row[21] or 0,
                 processed_file_path=row[22] or '',
                 epicor_json_path=row[23],
-                raw_json_data=row[24] or '',
+                raw_json_data=decode_json_payload(row[24]),
                 notes=row[25] or '',
                 created_at=row[26],
                 updated_at=row[27]
@@ -1470,7 +1576,7 @@ class ComprehensiveHybridDatabaseManager:
                     missing_info_count=record.get('missing_info_count', 0),
                     processed_file_path=record.get('processed_file_path', ''),
                     epicor_json_path=record.get('epicor_json_path'),
-                    raw_json_data=record.get('raw_json_data', ''),
+                    raw_json_data=decode_json_payload(record.get('raw_json_data')),
                     notes=record.get('notes', ''),
                     created_at=datetime.fromisoformat(record.get('created_at', datetime.now().isoformat()).replace('Z', '+00:00')) if record.get('created_at') else None,
                     updated_at=datetime.fromisoformat(record.get('updated_at', datetime.now().isoformat()).replace('Z', '+00:00')) if record.get('updated_at') else None
@@ -1551,14 +1657,95 @@ class ComprehensiveHybridDatabaseManager:
         except Exception as e:
             print(f"❌ Error adding error type: {e}")
             return False
-    
-    def get_all_processing_results(self, limit: int = 100, offset: int = 0) -> List[ProcessingResult]:
-        """Get all processing results with pagination."""
+
+    def increment_missing_field_counts(self, counts: Dict[str, int]) -> bool:
+        """Atomically add a batch of missing field counts to the counter table."""
         try:
+            counts = {field: int(count) for field, count in counts.items() if count}
+            if not counts:
+                return True
+
             if self.use_postgres:
-                return self._get_all_processing_results_postgres(limit, offset)
+                return self._increment_missing_field_counts_postgres(counts)
             elif self.use_rest_api:
-                return self._get_all_processing_results_rest_api(limit, offset)
+                return self._increment_missing_field_counts_rest_api(counts)
+            else:
+                print("❌ No database connection available")
+                return False
+        except Exception as e:
+            print(f"❌ Error incrementing missing field counts: {e}")
+            return False
+
+    def _increment_missing_field_counts_postgres(self, counts: Dict[str, int]) -> bool:
+        """Increment missing field counts using PostgreSQL."""
+        from database_config import db_config
+
+        values = []
+        params = {}
+        for i, (field, count) in enumerate(sorted(counts.items())):
+            values.append(f"(:field_{i}, :count_{i}, NOW())")
+            params[f"field_{i}"] = field
+            params[f"count_{i}"] = count
+
+        # Sorted keys keep row lock order stable across workers
+        sql = f'''
+            INSERT INTO missing_field_counts (field_name, count, updated_at)
+            VALUES {', '.join(values)}
+            ON CONFLICT (field_name) DO UPDATE SET
+                count = missing_field_counts.count + EXCLUDED.count,
+                updated_at = EXCLUDED.updated_at
+        '''
+        db_config.execute_write_sql(sql, params)
+        return True
+
+    def _increment_missing_field_counts_rest_api(self, counts: Dict[str, int]) -> bool:
+        """Increment missing field counts using the REST API RPC function."""
+        headers = {
+            'apikey': self.api_key,
+            'Authorization': f'Bearer {self.api_key}',
+            'Content-Type': 'application/json'
+        }
+
+        rpc_url = f"{self.supabase_url}/rest/v1/rpc/increment_missing_field_counts"
+        response = requests.post(rpc_url, headers=headers, json={'counts': counts}, timeout=30)
+
+        if response.status_code in [200, 204]:
+            return True
+        print(f"❌ REST API missing field increment failed with status: {response.status_code}")
+        return False
+
+    def get_missing_field_counts(self) -> Dict[str, int]:
+        """Get the persisted missing field counts."""
+        try:
+            if self.use_postgres:
+                from database_config import db_config
+                rows = db_config.execute_raw_sql("SELECT field_name, count FROM missing_field_counts")
+                return {row[0]: int(row[1]) for row in rows}
+            elif self.use_rest_api:
+                headers = {
+                    'apikey': self.api_key,
+                    'Authorization': f'Bearer {self.api_key}',
+                    'Content-Type': 'application/json'
+                }
+                query_url = f"{self.supabase_url}/rest/v1/missing_field_counts"
+                response = requests.get(query_url, headers=headers, params={'select': 'field_name,count'}, timeout=30)
+                if response.status_code == 200:
+                    return {row['field_name']: int(row['count']) for row in response.json()}
+                print(f"❌ REST API missing field query failed with status: {response.status_code}")
+            return {}
+        except Exception as e:
+            print(f"❌ Error getting missing field counts: {e}")
+            return {}
+
+    @timed('db_list_results')
+    def get_all_processing_results(self, limit: int = 100, offset: int = 0,
+                                   include_raw_json: bool = True) -> List[ProcessingResult]:
+        """Get all processing results with pagination (skip include_raw_json for listings)."""
+        try:
+            if self.use_postgres:
+                return self._get_all_processing_results_postgres(limit, offset, include_raw_json)
+            elif self.use_rest_api:
+                return self._get_all_processing_results_rest_api(limit, offset, include_raw_json)
             else:
                 print("❌ No database connection available")
                 return []
@@ -1566,12 +1753,22 @@ class ComprehensiveHybridDatabaseManager:
             print(f"❌ Error getting all processing results: {e}")
             return []
     
-    def _get_all_processing_results_postgres(self, limit: int, offset: int) -> List[ProcessingResult]:
+    def _get_all_processing_results_postgres(self, limit: int, offset: int,
+                                             include_raw_json: bool = True) -> List[ProcessingResult]:
         """Get all processing results using PostgreSQL."""
         from database_config import db_config
         
-        sql = '''
-            SELECT * FROM processing_results 
+        # Same column order as SELECT *, with the payload column left out for listings
+        sql = f'''
+            SELECT id, filename, original_filename, file_size, processing_status, 
+                   validation_status, processing_start_time, processing_end_time, 
+                   processing_duration, total_parts, parts_mapped, parts_not_found, 
+                   parts_manual_review, mapping_success_rate, customer_matched, 
+                   customer_match_confidence, error_details, error_types, 
+                   manual_corrections_made, epicor_ready, epicor_ready_with_one_click, 
+                   missing_info_count, processed_file_path, epicor_json_path, 
+                   {'raw_json_data' if include_raw_json else 'NULL AS raw_json_data'}, notes, created_at, updated_at
+            FROM processing_results 
             ORDER BY created_at DESC 
             LIMIT :limit OFFSET :offset
         '''
@@ -1608,7 +1805,7 @@ class ComprehensiveHybridDatabaseManager:
                 missing_info_count=row[21] or 0,
                 processed_file_path=row[22] or '',
                 epicor_json_path=row[23],
-                raw_json_data=row[24] or '',
+                raw_json_data=decode_json_payload(row[24]),
                 notes=row[25] or '',
                 created_at=row[26],
                 updated_at=row[27]
@@ -1617,7 +1814,8 @@ class ComprehensiveHybridDatabaseManager:
         
         return results
     
-    def _get_all_processing_results_rest_api(self, limit: int, offset: int) -> List[ProcessingResult]:
+    def _get_all_processing_results_rest_api(self, limit: int, offset: int,
+                                             include_raw_json: bool = True) -> List[ProcessingResult]:
         """Get all processing results using REST API."""
         headers = {
             'apikey': self.api_key,
@@ -1627,7 +1825,7 @@ class ComprehensiveHybridDatabaseManager:
         
         query_url = f"{self.supabase_url}/rest/v1/processing_results"
         params = {
-            'select': '*',
+            'select': '*' if include_raw_json else ','.join(PROCESSING_RESULT_LISTING_COLUMNS),
             'limit': str(limit),
             'offset': str(offset),
             'order': 'created_at.desc'
@@ -1668,7 +1866,7 @@ class ComprehensiveHybridDatabaseManager:
                     missing_info_count=record.get('missing_info_count', 0),
                     processed_file_path=record.get('processed_file_path', ''),
                     epicor_json_path=record.get('epicor_json_path'),
-                    raw_json_data=record.get('raw_json_data', ''),
+                    raw_json_data=decode_json_payload(record.get('raw_json_data')),
                     notes=record.get('notes', ''),
                     created_at=datetime.fromisoformat(record.get('created_at', datetime.now().isoformat()).replace('Z', '+00:00')) if record.get('created_at') else None,
                     updated_at=datetime.fromisoformat(record.get('updated_at', datetime.now().isoformat()).replace('Z', '+00:00')) if record.get('updated_at') else None
@@ -1680,6 +1878,69 @@ class ComprehensiveHybridDatabaseManager:
             print(f"❌ REST API query failed with status: {response.status_code}")
             return []
     
+    def get_stage_latency_percentiles(self, limit: int = 500) -> Dict[str, Any]:
+        """Get p50/p95/p99 per pipeline stage over the most recent processing results."""
+        try:
+            if self.use_postgres:
+                from database_config import db_config
+                sql = '''
+                    SELECT stage_timings FROM processing_results
+                    WHERE stage_timings IS NOT NULL AND stage_timings <> '{}'
+                    ORDER BY created_at DESC
+                    LIMIT :limit
+                '''
+                rows = [row[0] for row in db_config.execute_raw_sql(sql, {'limit': limit})]
+            elif self.use_rest_api:
+                headers = {
+                    'apikey': self.api_key,
+                    'Authorization': f'Bearer {self.api_key}',
+                    'Content-Type': 'application/json'
+                }
+                query_url = f"{self.supabase_url}/rest/v1/processing_results"
+                params = {
+                    'select': 'stage_timings',
+                    'stage_timings': 'neq.{}',
+                    'order': 'created_at.desc',
+                    'limit': str(limit)
+                }
+                response = requests.get(query_url, headers=headers, params=params, timeout=30)
+                if response.status_code != 200:
+                    print(f"❌ REST API stage timings query failed with status: {response.status_code}")
+                    return {'stages': {}, 'llm_calls_avg': {}}
+                rows = [record.get('stage_timings') for record in response.json()]
+            else:
+                return {'stages': {}, 'llm_calls_avg': {}}
+            return summarize_stage_timings(rows)
+        except Exception as e:
+            print(f"❌ Error getting stage latency percentiles: {e}")
+            return {'stages': {}, 'llm_calls_avg': {}}
+    
+    def get_raw_json_data(self, result_id: int) -> str:
+        """Fetch just the (decoded) raw JSON payload for one processing result."""
+        try:
+            if self.use_postgres:
+                from database_config import db_config
+                row = db_config.execute_raw_sql_single(
+                    "SELECT raw_json_data FROM processing_results WHERE id = :result_id",
+                    {'result_id': result_id}
+                )
+                return decode_json_payload(row[0]) if row else ''
+            elif self.use_rest_api:
+                headers = {
+                    'apikey': self.api_key,
+                    'Authorization': f'Bearer {self.api_key}',
+                    'Content-Type': 'application/json'
+                }
+                query_url = f"{self.supabase_url}/rest/v1/processing_results"
+                params = {'select': 'raw_json_data', 'id': f'eq.{result_id}'}
+                response = requests.get(query_url, headers=headers, params=params, timeout=30)
+                if response.status_code == 200 and response.json():
+                    return decode_json_payload(response.json()[0].get('raw_json_data'))
+            return ''
+        except Exception as e:
+            print(f"❌ Error getting raw JSON data: {e}")
+            return ''
+    
     def get_processing_result_by_filename(self, filename: str) -> Optional[ProcessingResult]:
         """Get a processing result by filename."""
         try:
@@ -1736,7 +1997,7 @@ class ComprehensiveHybridDatabaseManager:
                 missing_info_count=row[21] or 0,
                 processed_file_path=row[22] or '',
                 epicor_json_path=row[23],
-                raw_json_data=row[24] or '',
+                raw_json_data=decode_json_payload(row[24]),
                 notes=row[25] or '',
                 created_at=row[26],
                 updated_at=row[27]
@@ -1794,7 +2055,7 @@ class ComprehensiveHybridDatabaseManager:
                     missing_info_count=record.get('missing_info_count', 0),
                     processed_file_path=record.get('processed_file_path', ''),
                     epicor_json_path=record.get('epicor_json_path'),
-                    raw_json_data=record.get('raw_json_data', ''),
+                    raw_json_data=decode_json_payload(record.get('raw_json_data')),
                     notes=record.get('notes', ''),
                     created_at=datetime.fromisoformat(record.get('created_at', datetime.now().isoformat()).replace('Z', '+00:00')) if record.get('created_at') else None,
                     updated_at=datetime.fromisoformat(record.get('updated_at', datetime.now().isoformat()).replace('Z', '+00:00')) if record.get('updated_at') else None
@@ -1808,19 +2069,7 @@ class ComprehensiveHybridDatabaseManager:
             return
         
         print("📥 Loading parts database on demand...")
-        try:
-            if self.use_postgres:
-                self._load_parts_postgres()
-            elif self.use_rest_api:
-                self._load_parts_rest_api()
-            else:
-                print("❌ No database connection available for parts loading")
-                return
-            
-            self._parts_loaded = True
-            print(f"✅ Loaded {len(self.parts_df)} parts from {self.connection_method}")
-        except Exception as e:
-            print(f"❌ Error loading parts database: {e}")
+        self.load_parts_database()
     
     def _load_customers_database(self):
         """Load customers database on demand."""
@@ -1828,136 +2077,151 @@ class ComprehensiveHybridDatabaseManager:
             return
         
         print("📥 Loading customers database on demand...")
-        try:
-            if self.use_postgres:
-                self._load_customers_postgres()
-            elif self.use_rest_api:
-                self._load_customers_rest_api()
-            else:
-                print("❌ No database connection available for customers loading")
-                return
-            
-            self._customers_loaded = True
-            print(f"✅ Loaded {len(self.customers_df)} customers from {self.connection_method}")
-        except Exception as e:
-            print(f"❌ Error loading customers database: {e}")
+        self.load_customers_database()
     
-    def _load_parts_postgres(self):
-        """Load parts from PostgreSQL."""
-        from database_config import db_config
+    def _map_search_indexes(self, parts_df: pd.DataFrame, customers_df: Optional[pd.DataFrame]) -> Dict[str, Any]:
+        """
+        Map (or build once per host) the indexes for a parts frame without touching self.
         
-        sql = "SELECT internal_part_number, description FROM parts ORDER BY internal_part_number"
-        rows = db_config.execute_raw_sql(sql)
+        Returns:
+            CatalogState index fields (empty indexes for an empty frame)
+        """
+        if parts_df is None or parts_df.empty:
+            return {'parts_by_exact_match': {}, 'description_words': {},
+                    'parts_by_keywords': defaultdict(list), 'part_vectors': None}
         
-        data = []
-        for row in rows:
-            data.append({
-                'internal_part_number': row[0],
-                'description': row[1]
-            })
+        build_start = time.perf_counter()
         
-        self.parts_df = pd.DataFrame(data)
-        self._build_search_indexes()
+        version = catalog_version_key(parts_df[['internal_part_number', 'description']])
+        indexes = self.index_store.open_or_build(version, lambda: build_part_indexes(parts_df),
+                                                 unique=['parts_by_exact_match'])
+        vectors = self.vector_store.open_or_build_arrays(version, lambda: build_vector_arrays(parts_df['description']))
+        
+        record_catalog_index_build(
+            time.perf_counter() - build_start,
+            len(parts_df),
+            len(customers_df) if customers_df is not None else 0
+        )
+        return {'parts_by_exact_match': indexes['parts_by_exact_match'],
+                'description_words': indexes['description_words'],
+                'parts_by_keywords': PartKeywordIndex(indexes['part_numbers'], indexes['description_words']),
+                'part_vectors': PartVectorIndex(vectors, len(parts_df))}
     
-    def _load_parts_rest_api(self):
-        """Load parts from REST API."""
-        headers = {
-            'apikey': self.api_key,
-            'Authorization': f'Bearer {self.api_key}',
-            'Content-Type': 'application/json'
-        }
+    def reload_catalog(self, tables: Optional[List[str]] = None) -> bool:
+        """
+        Reload changed catalog tables and swap them in atomically.
         
-        url = f"{self.supabase_url}/rest/v1/parts"
-        params = {
-            'select': 'internal_part_number,description',
-            'order': 'internal_part_number'
-        }
+        Runs on the reloader thread: a new CatalogState (frames and indexes) is built while
+        requests keep matching against the current one, then swapped in with a single
+        assignment. Readers that take one reference to self._catalog never mix the two.
         
-        response = requests.get(url, headers=headers, params=params, timeout=30)
+        Args:
+            tables: Tables to refresh ('parts', 'customers'); defaults to both
+            
+        Returns:
+            True if anything was swapped in
+        """
+        loaded = {'parts': self._parts_loaded, 'customers': self._customers_loaded}
+        tables = [table for table in (tables or list(CATALOG_TABLES)) if loaded.get(table)]
+        if not tables:
+            return False  # Nothing loaded yet; the lazy loader will read the current rows
         
-        if response.status_code == 200:
-            data = response.json()
-            self.parts_df = pd.DataFrame(data)
-            self._build_search_indexes()
-        else:
-            print(f"❌ Failed to load parts from REST API: {response.status_code}")
-            self.parts_df = pd.DataFrame()
+        with self._reload_lock:
+            try:
+                catalog = self._catalog
+                catalog = replace(catalog, customers_df=self._load_catalog_table('customers')
+                                  if 'customers' in tables else catalog.customers_df)
+                if 'parts' in tables:
+                    parts_df = self._load_catalog_table('parts')
+                    catalog = replace(catalog, parts_df=parts_df,
+                                      **self._map_search_indexes(parts_df, catalog.customers_df))
+                
+                self._catalog = catalog
+                print(f"🔄 Catalog reloaded ({', '.join(tables)})")
+                return True
+            except Exception as e:
+                print(f"❌ Error reloading catalog: {e}")
+                return False
     
-    def _load_customers_postgres(self):
-        """Load customers from PostgreSQL."""
-        from database_config import db_config
-        
-        sql = "SELECT account_number, company_name, address, city, state_prov, postal_code, country FROM customers ORDER BY company_name"
-        rows = db_config.execute_raw_sql(sql)
+    def get_catalog_versions(self) -> Dict[str, Tuple[int, Optional[str]]]:
+        """Last seen (row count, max(updated_at)) per catalog table."""
+        return dict(self._catalog_versions)
+    
+    def check_catalog_versions(self) -> List[str]:
+        """Tables whose remote version differs from the loaded one (cheap COUNT/MAX query)."""
+        changed = []
+        for table in CATALOG_TABLES:
+            try:
+                if self._get_catalog_version(table) != self._catalog_versions.get(table):
+                    changed.append(table)
+            except Exception as e:
+                print(f"⚠️ Could not check {table} version: {e}")
+        return changed
+    
+    # Description matching for PartNumberMapper (local vectors, no database round trip)
+    def find_similar_parts(self, text: str, top_n: int = 3, min_score: float = 0.0) -> List[Tuple[CatalogPart, float]]:
+        """
+        Parts whose descriptions are most similar to text (character n-gram TF-IDF, offline).
         
-        data = []
-        for row in rows:
-            data.append({
-                'account_number': row[0],
-                'company_name': row[1],
-                'address': row[2],
-                'city': row[3],
-                'state': row[4],
-                'postal_code': row[5],
-                'country': row[6]
-            })
+        Args:
+            text: Description (optionally with the external part number)
+            top_n: Number of parts to return
+            min_score: Minimum cosine similarity (0-1)
+            
+        Returns:
+            List of (Part, similarity) best first
+        """
+        self._load_parts_database()
+        # One reference to the catalog state; a reload may swap it meanwhile
+        catalog = self._catalog
+        parts_df, part_vectors = catalog.parts_df, catalog.part_vectors
+        if parts_df is None or parts_df.empty or part_vectors is None or not text:
+            return []
         
-        self.customers_df = pd.DataFrame(data)
+        results = []
+        for row, score in part_vectors.top_k(text, k=top_n, min_score=min_score):
+            if row < len(parts_df):
+                record = parts_df.iloc[row]
+                results.append((CatalogPart(internal_part_number=record['internal_part_number'],
+                                            description=record['description']), score))
+        return results
     
-    def _load_customers_rest_api(self):
-        """Load customers from REST API."""
-        headers = {
-            'apikey': self.api_key,
-            'Authorization': f'Bearer {self.api_key}',
-            'Content-Type': 'application/json'
-        }
+    def find_part_by_description(self, description: str, threshold: int = 80) -> Optional[CatalogPart]:
+        """
+        Find a part by description: nearest descriptions by TF-IDF cosine, re-scored with fuzz.ratio.
         
-        url = f"{self.supabase_url}/rest/v1/customers"
-        params = {
-            'select': 'account_number,company_name,address,city,state_prov,postal_code,country',
-            'order': 'company_name'
-        }
+        Args:
+            description: Description to search for
+            threshold: Minimum fuzz.ratio score (0-100)
+            
+        Returns:
+            Part if found, None otherwise
+        """
+        if not description or not description.strip():
+            return None
         
-        response = requests.get(url, headers=headers, params=params, timeout=30)
+        from fuzzywuzzy import fuzz, process
         
-        if response.status_code == 200:
-            data = response.json()
-            self.customers_df = pd.DataFrame(data)
-        else:
-            print(f"❌ Failed to load customers from REST API: {response.status_code}")
-            self.customers_df = pd.DataFrame()
-    
-    def _build_search_indexes(self):
-        """Build search indexes for parts."""
-        if self.parts_df is None or self.parts_df.empty:
-            return
+        candidates = self.find_similar_parts(description, top_n=DESCRIPTION_CANDIDATES)
+        if not candidates:
+            return None
         
-        # Build exact match index
-        self.parts_by_exact_match = {}
-        for idx, row in self.parts_df.iterrows():
-            part_number = str(row['internal_part_number']).upper()
-            self.parts_by_exact_match[part_number] = idx
-        
-        # Build keyword index
-        self.parts_by_keywords = defaultdict(list)
-        for idx, row in self.parts_df.iterrows():
-            part_number = str(row['internal_part_number']).upper()
-            description = str(row['description']).upper()
-            
-            # Extract words from part number and description
-            words = self._extract_words(part_number + " " + description)
-            for word in words:
-                self.parts_by_keywords[word].append(idx)
+        match = process.extractOne(description, [part.description for part, _ in candidates], scorer=fuzz.ratio)
+        if match and match[1] >= threshold:
+            return next(part for part, _ in candidates if part.description == match[0])
+        return None
     
     # Compatibility methods for existing code
     def get_parts_dataframe(self) -> pd.DataFrame:
         """Get the parts DataFrame (lazy loading)."""
         if not self._parts_loaded:
             self._load_parts_database()
-        return self.parts_df if self.parts_df is not None else pd.DataFrame()
+        parts_df = self._catalog.parts_df
+        return parts_df if parts_df is not None else pd.DataFrame()
     
     def get_customers_dataframe(self) -> pd.DataFrame:
         """Get the customers DataFrame (lazy loading)."""
         if not self._customers_loaded:
             self._load_customers_database()
-        return self.customers_df if self.customers_df is not None else pd.DataFrame()
+        customers_df = self._catalog.customers_df
+        return customers_df if customers_df is not None else pd.DataFrame()
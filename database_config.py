@@ -65,7 +65,13 @@ class DatabaseConfig:
         with self.engine.connect() as conn:
             result = conn.execute(text(sql), params or {})
             return result.fetchone()
-    
+
+    def execute_write_sql(self, sql, params=None):
+        """Execute a write statement in its own committed transaction."""
+        with self.engine.begin() as conn:
+            result = conn.execute(text(sql), params or {})
+            return result.fetchall() if result.returns_rows else []
+
     def get_connection(self):
         """Get raw database connection."""
         return self.engine.connect()
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+Fake LLM Server
+Local stand-in for the OpenAI chat-completions and Gemini generateContent endpoints, for
+load and latency testing without API cost. Responses come from recorded cassettes
+(benchmarks/cassettes, see llm_cassettes.py) when a request matches one, otherwise from
+canned text. Latency, server errors and 429 rate limiting are injected as configured.
+
+Usage:
+    python fake_llm_server.py --port 8780 --latency lognormal:0.7,0.4 --error-rate 0.01 --rpm 500
+    # config.env: OPENAI_BASE_URL=http://127.0.0.1:8780/v1
+    #             GEMINI_BASE_URL=http://127.0.0.1:8780/v1beta
+    curl http://127.0.0.1:8780/stats
+
+Latency specs (seconds): 0, fixed:0.8, uniform:0.5,2.0, normal:1.2,0.3, lognormal:MU,SIGMA
+(median e^MU), recorded[:SCALE] (the cassette's recorded latency; 0 for canned replies).
+"""
+
+import json
+import math
+import time
+import random
+import argparse
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+from llm_cassettes import gemini_request_path, request_key
+
+DEFAULT_CANNED = {'openai': '{}', 'gemini': '{}'}
+
+
+def parse_latency(spec: str) -> Callable[[Optional[float]], float]:
+    """
+    Build a latency sampler from a spec string.
+
+    Args:
+        spec: See the module docstring
+
+    Returns:
+        sampler(recorded_seconds) -> seconds to wait
+    """
+    name, _, args = spec.partition(':')
+    params = [float(value) for value in args.split(',') if value]
+    if name in ('0', 'none'):
+        return lambda recorded: 0.0
+    if name == 'fixed':
+        return lambda recorded: params[0]
+    if name == 'uniform':
+        return lambda recorded: random.uniform(params[0], params[1])
+    if name == 'normal':
+        return lambda recorded: max(0.0, random.gauss(params[0], params[1]))
+    if name == 'lognormal':
+        return lambda recorded: random.lognormvariate(params[0], params[1])
+    if name == 'recorded':
+        scale = params[0] if params else 1.0
+        return lambda recorded: (recorded or 0.0) * scale
+    raise ValueError(f"Unknown latency spec: {spec}")
+
+
+def load_cassette_responses(cassette_dir) -> Dict[str, deque]:
+    """Recorded interactions from every cassette in a directory, by request key."""
+    responses: Dict[str, deque] = {}
+    for path in sorted(Path(cassette_dir).glob('*.json')):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                interactions = json.load(f).get('interactions', [])
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Skipping cassette {path.name}: {e}")
+            continue
+        for interaction in interactions:
+            responses.setdefault(interaction['key'], deque()).append(interaction)
+    return responses
+
+
+class FakeLLMState:
+    """Response sources, fault injection settings and request counters."""
+
+    def __init__(self, cassette_dir: Optional[str] = None, canned: Optional[Dict[str, str]] = None,
+                 latency: str = '0', gemini_latency: Optional[str] = None, error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, rpm: int = 0, retry_after: float = 1.0, seed: Optional[int] = None):
+        """
+        Initialize the server state.
+
+        Args:
+            cassette_dir: Directory of recorded cassettes to answer matching requests from
+            canned: Reply text per provider ('openai', 'gemini') for requests without a recording
+            latency: Latency spec for all requests
+            gemini_latency: Latency spec for Gemini requests (default: latency)
+            error_rate: Fraction of requests answered with HTTP 500
+            rate_limit_rate: Fraction of requests answered with HTTP 429
+            rpm: Requests per minute per provider before 429s (0 = unlimited)
+            retry_after: Retry-After seconds sent with 429 responses
+            seed: Random seed (repeatable fault and latency sequences)
+        """
+        if seed is not None:
+            random.seed(seed)
+        self.responses = load_cassette_responses(cassette_dir) if cassette_dir else {}
+        self.canned = {**DEFAULT_CANNED, **(canned or {})}
+        self.latency = {'openai': parse_latency(latency), 'gemini': parse_latency(gemini_latency or latency)}
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.rpm = rpm
+        self.retry_after = retry_after
+
+        self.lock = threading.Lock()
+        self._windows = {'openai': deque(), 'gemini': deque()}  # Request times in the last minute
+        self.stats: Dict[str, Any] = {}
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats = {'requests': {'openai': 0, 'gemini': 0}, 'status': {}, 'cassette_hits': 0,
+                          'canned': 0, 'in_flight': 0, 'max_in_flight': 0, 'started_at': time.time()}
+
+    def begin(self, provider: str) -> Tuple[int, Optional[str]]:
+        """
+        Count a request and decide whether to fail it.
+
+        Returns:
+            (status, error message); status 200 means answer normally
+        """
+        now = time.time()
+        with self.lock:
+            self.stats['requests'][provider] += 1
+            self.stats['in_flight'] += 1
+            self.stats['max_in_flight'] = max(self.stats['max_in_flight'], self.stats['in_flight'])
+            if self.rpm:
+                window = self._windows[provider]
+                while window and window[0] < now - 60:
+                    window.popleft()
+                if len(window) >= self.rpm:
+                    return 429, f"Rate limit of {self.rpm} requests per minute reached"
+                window.append(now)
+        if random.random() < self.rate_limit_rate:
+            return 429, "Rate limit reached (injected)"
+        if random.random() < self.error_rate:
+            return 500, "Internal server error (injected)"
+        return 200, None
+
+    def finish(self, status: int):
+        with self.lock:
+            self.stats['in_flight'] -= 1
+            self.stats['status'][str(status)] = self.stats['status'].get(str(status), 0) + 1
+
+    def recorded(self, key: str) -> Optional[Dict[str, Any]]:
+        """Next recorded interaction for a request key (repeats cycle through the recordings)."""
+        with self.lock:
+            interactions = self.responses.get(key)
+            if not interactions:
+                self.stats['canned'] += 1
+                return None
+            interactions.rotate(-1)
+            self.stats['cassette_hits'] += 1
+            return interactions[-1]
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            stats = json.loads(json.dumps(self.stats))
+        elapsed = time.time() - stats.pop('started_at')
+        stats['elapsed_seconds'] = round(elapsed, 1)
+        stats['requests_per_second'] = round(sum(stats['requests'].values()) / elapsed, 2) if elapsed else 0.0
+        return stats
+
+
+def chat_completion(content: str, model: str) -> Dict[str, Any]:
+    """OpenAI chat.completion body with a single assistant message."""
+    prompt_tokens, completion_tokens = 100, max(1, math.ceil(len(content) / 4))
+    return {
+        'id': f"chatcmpl-fake{random.getrandbits(48):x}",
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': model,
+        'choices': [{'index': 0, 'finish_reason': 'stop',
+                     'message': {'role': 'assistant', 'content': content}}],
+        'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                  'total_tokens': prompt_tokens + completion_tokens}
+    }
+
+
+def gemini_content(text: str) -> Dict[str, Any]:
+    """Gemini generateContent body with a single text candidate."""
+    output_tokens = max(1, math.ceil(len(text) / 4))
+    return {
+        'candidates': [{'content': {'role': 'model', 'parts': [{'text': text}]}, 'finishReason': 'STOP'}],
+        'usageMetadata': {'promptTokenCount': 100, 'candidatesTokenCount': output_tokens,
+                          'totalTokenCount': 100 + output_tokens}
+    }
+
+
+def make_handler(state: FakeLLMState):
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # Keep-alive, like the real APIs
+
+        def _send(self, status, body, content_type='application/json', headers=None):
+            data = body if isinstance(body, bytes) else json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _body(self):
+            length = int(self.headers.get('Content-Length', 0))
+            return json.loads(self.rfile.read(length) or b'{}')
+
+        def _fail(self, provider, status, message):
+            headers = {}
+            if status == 429:
+                headers = {'Retry-After': str(state.retry_after),
+                           'retry-after-ms': str(int(state.retry_after * 1000))}
+            if provider == 'openai':
+                body = {'error': {'message': message, 'type': 'rate_limit_error' if status == 429 else 'server_error',
+                                  'code': 'rate_limit_exceeded' if status == 429 else None}}
+            else:
+                body = {'error': {'code': status, 'message': message,
+                                  'status': 'RESOURCE_EXHAUSTED' if status == 429 else 'INTERNAL'}}
+            self._send(status, body, headers=headers)
+
+        def _answer(self, provider, key, build):
+            """Common path: fault injection, recorded or canned reply, injected latency."""
+            status, message = state.begin(provider)
+            try:
+                if status != 200:
+                    self._fail(provider, status, message)
+                    return
+                interaction = state.recorded(key)
+                time.sleep(state.latency[provider](interaction.get('elapsed') if interaction else None))
+                status, body = build(interaction['response'] if interaction else None)
+                self._send(status, body)
+            finally:
+                state.finish(status)
+
+        def do_GET(self):
+            path = urlparse(self.path).path
+            if path == '/stats':
+                return self._send(200, state.snapshot())
+            if path.endswith('/models'):
+                # DocumentProcessor probes the model list to decide whether Gemini is usable
+                return self._send(200, {'models': [{'name': 'models/gemini-2.0-flash-exp'}]})
+            self._send(404, {'error': {'message': f'Unknown path {path}'}})
+
+        def do_POST(self):
+            path = urlparse(self.path).path
+            if path == '/stats/reset':
+                state.reset_stats()
+                return self._send(200, {'reset': True})
+
+            try:
+                body = self._body()
+            except ValueError:
+                return self._send(400, {'error': {'message': 'Invalid JSON body'}})
+
+            if path.endswith('/chat/completions'):
+                def build(recorded):
+                    if recorded is None:
+                        return 200, chat_completion(state.canned['openai'], body.get('model', 'gpt-4o'))
+                    if 'error' in recorded:
+                        return 500, {'error': {'message': recorded['error'], 'type': 'server_error'}}
+                    return 200, recorded['completion']
+                return self._answer('openai', request_key('openai', body), build)
+
+            if ':generateContent' in path:
+                def build(recorded):
+                    if recorded is None:
+                        return 200, gemini_content(state.canned['gemini'])
+                    if 'error' in recorded:
+                        return 500, {'error': {'code': 500, 'message': recorded['error'], 'status': 'INTERNAL'}}
+                    return recorded['status_code'], json.loads(recorded['body'])
+                key = request_key('gemini', {'method': 'POST', 'url': gemini_request_path(self.path), 'json': body})
+                return self._answer('gemini', key, build)
+
+            self._send(404, {'error': {'message': f'Unknown path {path}'}})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI/Gemini server for load and latency testing")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8780)
+    parser.add_argument('--cassettes', default=None, help="Answer matching requests from recorded cassettes")
+    parser.add_argument('--canned', default=None, help="JSON file with reply text per provider (openai, gemini)")
+    parser.add_argument('--latency', default='0', help="Latency spec for all requests")
+    parser.add_argument('--gemini-latency', default=None, help="Latency spec for Gemini requests")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests failed with 500")
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help="Fraction of requests failed with 429")
+    parser.add_argument('--rpm', type=int, default=0, help="Requests per minute per provider before 429s")
+    parser.add_argument('--retry-after', type=float, default=1.0, help="Retry-After seconds on 429")
+    parser.add_argument('--seed', type=int, default=None, help="Random seed")
+    args = parser.parse_args()
+
+    canned = None
+    if args.canned:
+        with open(args.canned, 'r', encoding='utf-8') as f:
+            canned = json.load(f)
+
+    state = FakeLLMState(args.cassettes, canned, args.latency, args.gemini_latency, args.error_rate,
+                         args.rate_limit_rate, args.rpm, args.retry_after, args.seed)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(state))
+    server.daemon_threads = True
+    recorded = sum(len(items) for items in state.responses.values())
+    print(f"🧪 Fake LLM server on http://{args.host}:{args.port} ({recorded} recorded responses)")
+    print(f"   OPENAI_BASE_URL=http://{args.host}:{args.port}/v1")
+    print(f"   GEMINI_BASE_URL=http://{args.host}:{args.port}/v1beta")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"📊 {json.dumps(state.snapshot())}")
+
+
+if __name__ == '__main__':
+    main()
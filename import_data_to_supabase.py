@@ -1,6 +1,9 @@
 #!/usr/bin/env python3
 """
 Import parts.csv and customer_list.csv data into Supabase database
+
+One-off full import. For recurring ERP refreshes use catalog_sync.py, which only writes
+the rows that changed.
 """
 
 import pandas as pd
@@ -0,0 +1,96 @@
+"""
+JSON Payload Codec
+Compact, compressed storage for Epicor JSON payloads (processing_results.raw_json_data).
+
+Stored values carry a version tag so reads stay backward compatible:
+    "gz1:<base64 gzip>"  - gzip (what is written)
+    "zs1:<base64 zstd>"  - zstandard, read only (needs the optional zstandard package)
+    anything else        - legacy uncompressed JSON text, returned unchanged
+
+Every host writing to the shared database must produce payloads every other host can read,
+so writes never depend on optional packages.
+"""
+
+import json
+import gzip
+import base64
+from typing import Any, Union
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+GZIP_TAG = 'gz1:'
+ZSTD_TAG = 'zs1:'
+
+# Small payloads ('{}', short edits) are not worth the base64 overhead
+MIN_COMPRESS_BYTES = 256
+
+
+def compact_json(data: Any) -> str:
+    """Serialize data as compact JSON (no indentation or padding)."""
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False, default=str)
+
+
+def encode_json_payload(payload: Union[str, dict, list, None]) -> str:
+    """
+    Compact and compress a JSON payload for storage.
+
+    Args:
+        payload: JSON text or a JSON-serializable object
+
+    Returns:
+        Tagged compressed string (or compact JSON text for tiny payloads)
+    """
+    if payload is None:
+        return '{}'
+    if isinstance(payload, str):
+        if is_encoded_payload(payload):
+            return payload
+        try:
+            payload = compact_json(json.loads(payload))
+        except (json.JSONDecodeError, ValueError):
+            pass  # Not JSON - store the text as-is (still compressed below)
+    else:
+        payload = compact_json(payload)
+
+    raw_bytes = payload.encode('utf-8')
+    if len(raw_bytes) < MIN_COMPRESS_BYTES:
+        return payload
+
+    compressed = gzip.compress(raw_bytes, compresslevel=9, mtime=0)
+    return GZIP_TAG + base64.b64encode(compressed).decode('ascii')
+
+
+def decode_json_payload(stored: Union[str, bytes, None]) -> str:
+    """
+    Decode a stored payload back to JSON text.
+
+    Args:
+        stored: Value read from the database (tagged compressed or legacy plain text)
+
+    Returns:
+        JSON text ('' when nothing is stored)
+    """
+    if stored is None:
+        return ''
+    if isinstance(stored, (bytes, memoryview)):
+        stored = bytes(stored).decode('utf-8')
+
+    try:
+        if stored.startswith(GZIP_TAG):
+            return gzip.decompress(base64.b64decode(stored[len(GZIP_TAG):])).decode('utf-8')
+        if stored.startswith(ZSTD_TAG):
+            if zstandard is None:
+                raise RuntimeError("zstandard package is required to read zs1 payloads")
+            return zstandard.ZstdDecompressor().decompress(base64.b64decode(stored[len(ZSTD_TAG):])).decode('utf-8')
+    except Exception as e:
+        print(f"❌ Error decoding stored JSON payload: {e}")
+        return ''
+    return stored
+
+
+def is_encoded_payload(value: Any) -> bool:
+    """Check whether a value is already in the tagged compressed format."""
+    return isinstance(value, str) and (value.startswith(GZIP_TAG) or value.startswith(ZSTD_TAG))
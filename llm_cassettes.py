@@ -0,0 +1,246 @@
+"""
+LLM Cassettes
+Record/replay of the pipeline's OpenAI and Gemini calls, so a PO can be processed
+offline with the exact LLM responses it got once from the live APIs.
+
+While a cassette is active, OpenAI chat completions (any OpenAI client) and requests
+calls to the Gemini API go through it:
+- record: the live call is made and its response appended to the cassette
+- replay: the response is served from the cassette; nothing is sent
+
+Interactions are keyed by a hash of the normalized request (model, messages/payload,
+parameters; the API key is left out), so parallel calls replay correctly regardless of
+order. A request that no longer hashes the same (e.g. a prompt change) falls back to the
+next unused interaction of the same provider, unless the cassette is strict.
+"""
+
+import json
+import time
+import hashlib
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+import requests
+
+CASSETTE_VERSION = 1
+GEMINI_HOST = 'generativelanguage.googleapis.com'
+
+_active_cassette: Optional['LLMCassette'] = None
+_install_lock = threading.Lock()
+_originals: Dict[str, Any] = {}
+
+
+class CassetteMiss(Exception):
+    """Replay found no recorded response for a request."""
+
+
+def request_key(provider: str, request: Dict[str, Any]) -> str:
+    """Stable hash of a request (OpenAI create() kwargs, or Gemini method/path/JSON body)."""
+    data = json.dumps({'provider': provider, **request}, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def gemini_request_path(url: str) -> str:
+    """
+    Path and query of a Gemini URL without the host and the ?key=... API key.
+
+    Keys do not depend on the API host, so a cassette also serves a Gemini stand-in
+    (fake_llm_server.py) and the API key never ends up in a cassette.
+    """
+    parsed = urlparse(url)
+    query = [(name, value) for name, value in parse_qsl(parsed.query) if name != 'key']
+    return urlunparse(parsed._replace(scheme='', netloc='', query=urlencode(query)))
+
+
+class LLMCassette:
+    """Recorded LLM interactions of one document (one JSON file)."""
+
+    def __init__(self, path, mode: str = 'replay', strict: bool = False, latency_scale: float = 0.0):
+        """
+        Initialize the cassette.
+
+        Args:
+            path: Cassette file
+            mode: 'record' (live calls, saved on save()) or 'replay' (no network)
+            strict: In replay, raise CassetteMiss instead of falling back to call order
+            latency_scale: In replay, sleep this fraction of the recorded call latency
+                (0 = measure local processing only, 1 = reproduce live latency)
+        """
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = Path(path)
+        self.mode = mode
+        self.strict = strict
+        self.latency_scale = latency_scale
+        self._lock = threading.Lock()
+        self.interactions: List[Dict[str, Any]] = []
+        self._used = set()
+        self.stats = {'recorded': 0, 'exact': 0, 'fallback': 0, 'missed': 0}
+
+        if mode == 'replay':
+            if not self.path.exists():
+                raise FileNotFoundError(f"No cassette at {self.path} (record it first)")
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.interactions = json.load(f).get('interactions', [])
+
+    def save(self):
+        """Write recorded interactions (record mode only)."""
+        if self.mode != 'record':
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': CASSETTE_VERSION, 'recorded_at': datetime.now().isoformat(),
+                       'interactions': self.interactions}, f, indent=1)
+        tmp_path.replace(self.path)
+
+    def record(self, provider: str, key: str, summary: Dict[str, Any], response: Dict[str, Any], elapsed: float):
+        with self._lock:
+            self.interactions.append({'provider': provider, 'key': key, 'request': summary,
+                                      'elapsed': round(elapsed, 3), 'response': response})
+            self.stats['recorded'] += 1
+
+    def lookup(self, provider: str, key: str, summary: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Recorded response for a request.
+
+        Returns:
+            The interaction (provider, key, request summary, elapsed, response)
+
+        Raises:
+            CassetteMiss: no matching interaction left
+        """
+        with self._lock:
+            index = self._next_unused(lambda item: item['key'] == key)
+            if index is not None:
+                self.stats['exact'] += 1
+            elif not self.strict:
+                index = self._next_unused(lambda item: item['provider'] == provider)
+                if index is not None:
+                    self.stats['fallback'] += 1
+            if index is None:
+                self.stats['missed'] += 1
+                raise CassetteMiss(f"No recorded {provider} response in {self.path.name} for {summary}")
+            self._used.add(index)
+            interaction = self.interactions[index]
+
+        if self.latency_scale > 0:
+            time.sleep(interaction.get('elapsed', 0) * self.latency_scale)
+        return interaction
+
+    def _next_unused(self, predicate) -> Optional[int]:
+        for index, item in enumerate(self.interactions):
+            if index not in self._used and predicate(item):
+                return index
+        return None
+
+
+# ----------------------------------------------------------------------
+# Patched call sites
+# ----------------------------------------------------------------------
+
+def _openai_create(self, *args, **kwargs):
+    cassette = _active_cassette
+    if cassette is None:
+        return _originals['openai_create'](self, *args, **kwargs)
+
+    from openai.types.chat import ChatCompletion
+    key = request_key('openai', kwargs)
+    summary = {'model': kwargs.get('model')}
+
+    if cassette.mode == 'replay':
+        response = cassette.lookup('openai', key, summary)['response']
+        if 'error' in response:
+            raise Exception(response['error'])
+        return ChatCompletion.model_validate(response['completion'])
+
+    start = time.perf_counter()
+    try:
+        completion = _originals['openai_create'](self, *args, **kwargs)
+    except Exception as e:
+        # Failures are part of the pipeline's behaviour too (fallback paths)
+        cassette.record('openai', key, summary, {'error': str(e)}, time.perf_counter() - start)
+        raise
+    cassette.record('openai', key, summary, {'completion': completion.model_dump(mode='json')},
+                    time.perf_counter() - start)
+    return completion
+
+
+def _gemini_request(method: str, url: str, **kwargs):
+    cassette = _active_cassette
+    original = _originals[f'requests_{method.lower()}']
+    if cassette is None or GEMINI_HOST not in url:
+        return original(url, **kwargs)
+
+    request_path = gemini_request_path(url)
+    key = request_key('gemini', {'method': method, 'url': request_path, 'json': kwargs.get('json')})
+    summary = {'method': method, 'url': request_path}
+
+    if cassette.mode == 'replay':
+        recorded = cassette.lookup('gemini', key, summary)['response']
+        if 'error' in recorded:
+            raise requests.exceptions.ConnectionError(recorded['error'])
+        response = requests.models.Response()
+        response.status_code = recorded['status_code']
+        response.headers['Content-Type'] = recorded.get('content_type', 'application/json')
+        response._content = recorded['body'].encode('utf-8')
+        response.encoding = 'utf-8'
+        response.url = url
+        return response
+
+    start = time.perf_counter()
+    try:
+        response = original(url, **kwargs)
+    except requests.exceptions.RequestException as e:
+        cassette.record('gemini', key, summary, {'error': str(e)}, time.perf_counter() - start)
+        raise
+    cassette.record('gemini', key, summary, {
+        'status_code': response.status_code,
+        'content_type': response.headers.get('Content-Type', 'application/json'),
+        'body': response.text
+    }, time.perf_counter() - start)
+    return response
+
+
+def _requests_post(url, **kwargs):
+    return _gemini_request('POST', url, **kwargs)
+
+
+def _requests_get(url, **kwargs):
+    return _gemini_request('GET', url, **kwargs)
+
+
+def install():
+    """Patch the OpenAI client and requests once per process (pass-through while no cassette is active)."""
+    with _install_lock:
+        if _originals:
+            return
+        from openai.resources.chat.completions import Completions
+        _originals['openai_create'] = Completions.create
+        _originals['requests_post'] = requests.post
+        _originals['requests_get'] = requests.get
+        Completions.create = _openai_create
+        requests.post = _requests_post
+        requests.get = _requests_get
+
+
+@contextmanager
+def use_cassette(cassette: LLMCassette):
+    """
+    Route LLM calls through a cassette for the duration of the block.
+
+    One cassette is active per process at a time (the benchmark runs documents sequentially).
+    """
+    global _active_cassette
+    install()
+    if _active_cassette is not None:
+        raise RuntimeError(f"Cassette {_active_cassette.path.name} is already active")
+    _active_cassette = cassette
+    try:
+        yield cassette
+    finally:
+        _active_cassette = None
@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+Load Test
+Open-loop load generator for the Flask app: sends a mix of PO uploads and review-UI
+requests (/api/files, /api/dashboard/metrics, /api/get_processed_email) at a target
+arrival rate, and samples the server's /metrics while it runs.
+
+Arrivals follow a Poisson process and do not wait for earlier requests, so a slow server
+builds a queue the way real traffic would; latency is measured from the scheduled arrival
+time, so that queueing is included. The report has latency percentiles and error rates
+per endpoint, plus worker saturation (uploads in flight vs live gunicorn workers) for sizing.
+
+Run the server against fake_llm_server.py to load-test without API cost.
+
+Usage:
+    python load_test.py --rate 2 --duration 300
+    python load_test.py --url http://staging:5000 --rate 0.5 --mix upload=1,files=6,dashboard=2,processed_email=4
+"""
+
+import sys
+import json
+import math
+import time
+import random
+import asyncio
+import argparse
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+
+from stage_timing import percentile
+
+DEFAULT_MIX = {'upload': 1, 'files': 4, 'dashboard': 2, 'processed_email': 3}
+# get_processed_email answers 404 when no processed file matches; that is not a failure
+EXPECTED_STATUS = {'processed_email': {200, 404}}
+SATURATION_METRICS = ('arzana_uploads_in_flight', 'arzana_worker_up', 'arzana_metrics_spool_depth')
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    """'upload=1,files=4' -> {'upload': 1.0, 'files': 4.0} (unknown endpoints rejected)."""
+    mix = {}
+    for part in spec.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in DEFAULT_MIX:
+            raise ValueError(f"Unknown endpoint in mix: {name} (choose from {', '.join(DEFAULT_MIX)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def parse_metrics(text: str) -> Dict[str, float]:
+    """Prometheus text exposition -> {metric name: value summed over label sets}."""
+    values: Dict[str, float] = {}
+    for line in text.splitlines():
+        if not line or line.startswith('#'):
+            continue
+        try:
+            series, value = line.rsplit(' ', 1)
+            name = series.split('{', 1)[0]
+            values[name] = values.get(name, 0.0) + float(value)
+        except ValueError:
+            continue
+    return values
+
+
+def _latency_summary(values: List[float]) -> Dict[str, float]:
+    values = sorted(values)
+    if not values:
+        return {}
+    return {
+        'mean': round(sum(values) / len(values), 3),
+        'p50': round(percentile(values, 50), 3),
+        'p95': round(percentile(values, 95), 3),
+        'p99': round(percentile(values, 99), 3),
+        'max': round(values[-1], 3)
+    }
+
+
+class LoadTest:
+    """Drives one open-loop load test run against a server."""
+
+    def __init__(self, base_url: str, rate: float, duration: float, mix: Dict[str, float], po_files: List[Path],
+                 warmup: float = 0.0, max_in_flight: int = 256, timeout: float = 300.0,
+                 sample_interval: float = 1.0, seed: Optional[int] = None):
+        """
+        Initialize the run.
+
+        Args:
+            base_url: Flask app root
+            rate: Target arrivals per second (all endpoints together)
+            duration: Seconds to generate arrivals for (in-flight requests are then awaited)
+            mix: Relative weight per endpoint (see DEFAULT_MIX)
+            po_files: Files to upload, picked at random
+            warmup: Leading seconds excluded from the statistics
+            max_in_flight: Client-side cap; arrivals beyond it are counted as dropped
+            timeout: Per-request timeout in seconds
+            sample_interval: Seconds between /metrics samples
+            seed: Random seed (repeatable arrival and endpoint sequence)
+        """
+        self.base_url = base_url.rstrip('/')
+        self.rate = rate
+        self.duration = duration
+        self.mix = mix
+        self.warmup = warmup
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.sample_interval = sample_interval
+        self.random = random.Random(seed)
+
+        # Uploads are read once; the client should not be the bottleneck
+        self.uploads = [(path.name, path.read_bytes()) for path in po_files]
+        self.samples: List[Dict[str, Any]] = []
+        self.server_samples: List[Dict[str, float]] = []
+        self.dropped = 0
+        self.in_flight = 0
+        self.max_seen_in_flight = 0
+        self._start = 0.0
+
+    def _request(self, endpoint: str):
+        """(method, path, kwargs) for one request of the given endpoint type."""
+        if endpoint == 'upload':
+            name, content = self.random.choice(self.uploads)
+            form = aiohttp.FormData()
+            form.add_field('file', content, filename=name, content_type='application/pdf')
+            return 'POST', '/upload', {'data': form}
+        if endpoint == 'files':
+            return 'GET', '/api/files', {'params': {'page': self.random.randint(1, 3), 'per_page': 20}}
+        if endpoint == 'dashboard':
+            return 'GET', '/api/dashboard/metrics', {}
+        name, _ = self.random.choice(self.uploads)
+        return 'GET', '/api/get_processed_email', {'params': {'attachment_name': name}}
+
+    async def _fire(self, session: aiohttp.ClientSession, endpoint: str, scheduled: float):
+        method, path, kwargs = self._request(endpoint)
+        self.in_flight += 1
+        self.max_seen_in_flight = max(self.max_seen_in_flight, self.in_flight)
+        sent = time.perf_counter()
+        status, error = None, None
+        try:
+            async with session.request(method, f'{self.base_url}{path}', **kwargs) as response:
+                await response.read()
+                status = response.status
+        except asyncio.TimeoutError:
+            error = 'timeout'
+        except aiohttp.ClientError as e:
+            error = f'{type(e).__name__}: {e}'
+        finally:
+            self.in_flight -= 1
+        finished = time.perf_counter()
+
+        ok = error is None and status in EXPECTED_STATUS.get(endpoint, {200})
+        self.samples.append({
+            'endpoint': endpoint,
+            'at': round(scheduled - self._start, 3),
+            'status': status,
+            'error': error,
+            'ok': ok,
+            'latency': finished - scheduled,  # From the scheduled arrival, so client lag is not hidden
+            'service': finished - sent
+        })
+
+    async def _sample_server(self, session: aiohttp.ClientSession, stop: asyncio.Event):
+        while not stop.is_set():
+            try:
+                async with session.get(f'{self.base_url}/metrics',
+                                       timeout=aiohttp.ClientTimeout(total=5)) as response:
+                    values = parse_metrics(await response.text())
+                sample = {name: values.get(name, 0.0) for name in SATURATION_METRICS}
+                sample['at'] = round(time.perf_counter() - self._start, 1)
+                sample['client_in_flight'] = self.in_flight
+                self.server_samples.append(sample)
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                pass  # A saturated server may not answer; the gap shows in the samples
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=self.sample_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run(self) -> Dict[str, Any]:
+        """Generate arrivals for the configured duration and wait for outstanding requests."""
+        endpoints, weights = zip(*self.mix.items())
+        connector = aiohttp.TCPConnector(limit=self.max_in_flight)
+        async with aiohttp.ClientSession(connector=connector,
+                                         timeout=aiohttp.ClientTimeout(total=self.timeout)) as session:
+            stop = asyncio.Event()
+            self._start = time.perf_counter()
+            sampler = asyncio.create_task(self._sample_server(session, stop))
+            tasks = set()
+            next_arrival = self._start
+            while next_arrival - self._start < self.duration:
+                delay = next_arrival - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                if self.in_flight >= self.max_in_flight:
+                    self.dropped += 1
+                else:
+                    endpoint = self.random.choices(endpoints, weights)[0]
+                    task = asyncio.create_task(self._fire(session, endpoint, next_arrival))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                next_arrival += self.random.expovariate(self.rate)
+
+            if tasks:
+                print(f"⏳ Arrivals done, waiting for {len(tasks)} requests in flight...")
+                await asyncio.gather(*tasks)
+            stop.set()
+            await sampler
+        return self.report(time.perf_counter() - self._start)
+
+    def report(self, wall_seconds: float) -> Dict[str, Any]:
+        """Aggregate samples into the run report."""
+        measured = [s for s in self.samples if s['at'] >= self.warmup]
+        window = max(self.duration - self.warmup, 1e-9)
+
+        endpoints = {}
+        for endpoint in self.mix:
+            rows = [s for s in measured if s['endpoint'] == endpoint]
+            if not rows:
+                continue
+            statuses: Dict[str, int] = {}
+            for row in rows:
+                key = str(row['status']) if row['status'] is not None else row['error'].split(':')[0]
+                statuses[key] = statuses.get(key, 0) + 1
+            errors = sum(1 for row in rows if not row['ok'])
+            endpoints[endpoint] = {
+                'requests': len(rows),
+                'rate_per_second': round(len(rows) / window, 3),
+                'errors': errors,
+                'error_rate': round(errors / len(rows), 4),
+                'status': statuses,
+                'latency': _latency_summary([row['latency'] for row in rows]),
+                'service_time': _latency_summary([row['service'] for row in rows if row['ok']])
+            }
+
+        server = {}
+        samples = [s for s in self.server_samples if s['at'] >= self.warmup]
+        if samples:
+            in_flight = sorted(s['arzana_uploads_in_flight'] for s in samples)
+            workers = max(s['arzana_worker_up'] for s in samples)
+            server = {
+                'samples': len(samples),
+                'workers': workers,
+                'uploads_in_flight': {'p50': percentile(in_flight, 50), 'p95': round(percentile(in_flight, 95), 1),
+                                      'max': in_flight[-1]},
+                # Sync gunicorn workers run one request at a time
+                'saturated_fraction': round(sum(1 for v in in_flight if workers and v >= workers) / len(samples), 3),
+                'metrics_spool_depth_max': max(s['arzana_metrics_spool_depth'] for s in samples)
+            }
+
+        sizing = {}
+        upload = endpoints.get('upload')
+        if upload and upload['service_time']:
+            # Little's law: busy workers = arrival rate x time each upload holds a worker
+            busy = upload['rate_per_second'] * upload['service_time']['mean']
+            sizing = {'upload_busy_workers': round(busy, 2),
+                      'workers_for_70pct_utilization': max(1, math.ceil(busy / 0.7))}
+
+        return {
+            'generated_at': datetime.now().isoformat(),
+            'config': {'url': self.base_url, 'rate': self.rate, 'duration': self.duration, 'warmup': self.warmup,
+                       'mix': self.mix, 'max_in_flight': self.max_in_flight, 'po_files': len(self.uploads)},
+            'totals': {
+                'requests': len(measured),
+                'errors': sum(1 for s in measured if not s['ok']),
+                'dropped': self.dropped,
+                'achieved_rate': round(len(measured) / window, 3),
+                'wall_seconds': round(wall_seconds, 1),
+                'client_max_in_flight': self.max_seen_in_flight
+            },
+            'endpoints': endpoints,
+            'server': server,
+            'sizing': sizing,
+            'server_samples': self.server_samples
+        }
+
+
+def print_report(report: Dict[str, Any]):
+    totals = report['totals']
+    print(f"\n📊 {totals['requests']} requests at {totals['achieved_rate']}/s "
+          f"(target {report['config']['rate']}/s), {totals['errors']} errors, {totals['dropped']} dropped")
+    for endpoint, stats in report['endpoints'].items():
+        latency = stats['latency']
+        print(f"   {endpoint:<16} n={stats['requests']:<5} err={stats['error_rate']:.1%} "
+              f"p50={latency['p50']:.2f}s p95={latency['p95']:.2f}s p99={latency['p99']:.2f}s "
+              f"max={latency['max']:.2f}s")
+    server = report['server']
+    if server:
+        print(f"🏭 Workers: {server['workers']:.0f}, uploads in flight p50={server['uploads_in_flight']['p50']:.1f} "
+              f"max={server['uploads_in_flight']['max']:.0f}, saturated {server['saturated_fraction']:.0%} of samples")
+    else:
+        print("⚠️ No /metrics samples (server metrics unavailable)")
+    if report['sizing']:
+        print(f"📐 Uploads keep {report['sizing']['upload_busy_workers']} workers busy on average; "
+              f"{report['sizing']['workers_for_70pct_utilization']} workers for 70% utilization "
+              f"(plus headroom for review traffic)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Open-loop load test of the Flask app")
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help="App root URL")
+    parser.add_argument('--rate', type=float, default=1.0, help="Target arrivals per second (all endpoints)")
+    parser.add_argument('--duration', type=float, default=120.0, help="Seconds to generate load")
+    parser.add_argument('--warmup', type=float, default=10.0, help="Leading seconds excluded from statistics")
+    parser.add_argument('--mix', default=','.join(f'{k}={v}' for k, v in DEFAULT_MIX.items()),
+                        help="Endpoint weights, e.g. upload=1,files=4,dashboard=2,processed_email=3")
+    parser.add_argument('--pos', nargs='+', default=['samplePOs'], help="PO files or directories to upload")
+    parser.add_argument('--max-in-flight', type=int, default=256, help="Client-side concurrency cap")
+    parser.add_argument('--timeout', type=float, default=300.0, help="Per-request timeout in seconds")
+    parser.add_argument('--seed', type=int, default=None, help="Random seed")
+    parser.add_argument('--output', default=None, help="Report path (default: load_tests/load_<timestamp>.json)")
+    args = parser.parse_args()
+
+    from batch_engine import find_po_files
+    po_files = find_po_files(args.pos)
+    mix = parse_mix(args.mix)
+    if mix.get('upload') and not po_files:
+        print("❌ No PO files found to upload")
+        return 1
+
+    test = LoadTest(args.url, args.rate, args.duration, mix, po_files, warmup=args.warmup,
+                    max_in_flight=args.max_in_flight, timeout=args.timeout, seed=args.seed)
+    print(f"🚀 {args.rate}/s for {args.duration:.0f}s against {args.url} (mix: {args.mix})")
+    report = asyncio.run(test.run())
+    print_report(report)
+
+    output = Path(args.output or f"load_tests/load_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"📁 Report: {output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,189 @@
+"""
+Local Catalog Search
+SQLite FTS5 equivalent of the search_parts_trgm / search_customers_trgm database functions,
+used when neither PostgreSQL nor the REST API is reachable.
+
+The catalog snapshot is indexed into FTS5 tables with the trigram tokenizer. A query's
+trigrams are OR-matched to pull a candidate pool ranked by bm25, and the pool is re-scored
+with the same formula as the database functions (pg_trgm-style similarity).
+"""
+
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Set
+
+import pandas as pd
+
+# Candidates pulled from FTS5 per requested result before re-scoring
+CANDIDATE_POOL_FACTOR = 10
+
+_WORD = re.compile(r'[a-z0-9]+')
+
+
+def trigrams(text: str) -> Set[str]:
+    """pg_trgm trigrams: lower-cased alphanumeric words padded with two leading and one trailing space."""
+    result = set()
+    for word in _WORD.findall(str(text).lower()):
+        padded = f"  {word} "
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+def similarity(a: str, b: str) -> float:
+    """Shared trigrams over all trigrams (pg_trgm similarity)."""
+    a_trigrams, b_trigrams = trigrams(a), trigrams(b)
+    if not a_trigrams or not b_trigrams:
+        return 0.0
+    return len(a_trigrams & b_trigrams) / len(a_trigrams | b_trigrams)
+
+
+def word_similarity(query: str, text: str) -> float:
+    """Share of the query's trigrams found in text (approximates pg_trgm word_similarity)."""
+    query_trigrams = trigrams(query)
+    if not query_trigrams:
+        return 0.0
+    return len(query_trigrams & trigrams(text)) / len(query_trigrams)
+
+
+def part_score(query: str, part_number: str, description: str) -> float:
+    """Same ranking as search_parts_trgm."""
+    upper_query, upper_part = query.upper(), str(part_number).upper()
+    if upper_part.startswith(upper_query):
+        tier = 0.9
+    elif upper_query in upper_part:
+        tier = 0.7
+    else:
+        tier = 0.0
+    return max(tier, similarity(query, part_number), word_similarity(query, description) * 0.8)
+
+
+def customer_score(query: str, company_name: str, address: str, city: str) -> float:
+    """Same ranking as search_customers_trgm."""
+    return max(word_similarity(query, company_name),
+               word_similarity(query, address) * 0.8,
+               word_similarity(query, city) * 0.7)
+
+
+def _match_expression(query: str) -> Optional[str]:
+    """FTS5 MATCH string OR-ing the query's raw trigrams (the trigram tokenizer needs 3+ chars)."""
+    text = query.lower()
+    grams = {text[i:i + 3] for i in range(len(text) - 2)}
+    grams = {gram for gram in grams if gram.strip()}
+    if not grams:
+        return None
+    return ' OR '.join('"' + gram.replace('"', '""') + '"' for gram in sorted(grams))
+
+
+class LocalCatalogSearch:
+    """FTS5 trigram index over the catalog snapshot."""
+
+    def __init__(self, db_path: str = "data/catalog_search.db"):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS search_meta (table_name TEXT PRIMARY KEY, version TEXT)")
+        self._conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS parts_fts USING fts5("
+            "part_number, description, tokenize='trigram')"
+        )
+        self._conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS customers_fts USING fts5("
+            "account_number UNINDEXED, company_name, address, city, state UNINDEXED, "
+            "postal_code UNINDEXED, country UNINDEXED, tokenize='trigram')"
+        )
+
+    def ensure_index(self, table: str, df: Optional[pd.DataFrame], version: str) -> None:
+        """
+        Rebuild a table's FTS index unless it already holds this catalog version.
+
+        Args:
+            table: 'parts' or 'customers'
+            df: Catalog rows (hybrid manager column names)
+            version: Catalog version key of df
+        """
+        if df is None:
+            return
+        with self._lock:
+            # BEGIN IMMEDIATE serializes rebuilds across workers sharing the file
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT version FROM search_meta WHERE table_name = ?", (table,)).fetchone()
+                if row and row[0] == version:
+                    self._conn.execute("COMMIT")
+                    return
+
+                self._conn.execute(f"DELETE FROM {table}_fts")
+                if table == 'parts':
+                    rows = df[['internal_part_number', 'description']].astype(str).itertuples(index=False, name=None)
+                    self._conn.executemany("INSERT INTO parts_fts VALUES (?, ?)", rows)
+                else:
+                    columns = ['account_number', 'company_name', 'address', 'city', 'state', 'postal_code', 'country']
+                    frame = df.reindex(columns=columns).fillna('').astype(str)
+                    self._conn.executemany("INSERT INTO customers_fts VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                           frame.itertuples(index=False, name=None))
+                self._conn.execute("INSERT OR REPLACE INTO search_meta VALUES (?, ?)", (table, version))
+                self._conn.execute("COMMIT")
+                print(f"✅ Built local {table} search index ({len(df)} rows)")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _candidates(self, table: str, columns: str, query: str, limit: int, prefix_column: str) -> List[tuple]:
+        expression = _match_expression(query)
+        pool = limit * CANDIDATE_POOL_FACTOR
+        with self._lock:
+            if expression is None:
+                # Too short for trigrams: prefix match (full scan of the FTS table)
+                return self._conn.execute(
+                    f"SELECT {columns} FROM {table}_fts WHERE {prefix_column} LIKE ? LIMIT ?",
+                    (f"{query}%", pool)
+                ).fetchall()
+            # Rows containing the whole query are the best candidates and the phrase match is selective;
+            # OR-ing every trigram (typos, reordered words) only runs when those do not fill the pool
+            rows = self._conn.execute(
+                f"SELECT {columns} FROM {table}_fts WHERE {table}_fts MATCH ? LIMIT ?",
+                ('"' + query.replace('"', '""') + '"', pool)
+            ).fetchall()
+            if len(rows) < pool:
+                seen = set(rows)
+                rows += [row for row in self._conn.execute(
+                    f"SELECT {columns} FROM {table}_fts WHERE {table}_fts MATCH ? ORDER BY bm25({table}_fts) LIMIT ?",
+                    (expression, pool)
+                ).fetchall() if row not in seen]
+            return rows
+
+    def search_parts(self, query: str, limit: int = 10) -> List[Dict]:
+        """Top-k parts, same result shape as the database search."""
+        candidates = self._candidates('parts', 'part_number, description', query, limit, 'part_number')
+        scored = [
+            (part_score(query, part_number, description), part_number, description)
+            for part_number, description in candidates
+        ]
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return [{
+            'internal_part_number': part_number,
+            'description': description,
+            'match_type': 'exact' if part_number.upper() == query.upper() else 'fuzzy',
+            'score': 1.0 if part_number.upper() == query.upper() else round(score, 4)
+        } for score, part_number, description in scored[:limit]]
+
+    def search_customers(self, query: str, limit: int = 10) -> List[Dict]:
+        """Top-k customers, same result shape as the database search."""
+        columns = 'account_number, company_name, address, city, state, postal_code, country'
+        candidates = self._candidates('customers', columns, query, limit, 'company_name')
+        scored = [(customer_score(query, row[1], row[2], row[3]), row) for row in candidates]
+        scored.sort(key=lambda item: (-item[0], item[1][1]))
+        return [{
+            'account_number': row[0],
+            'company_name': row[1],
+            'address': row[2],
+            'city': row[3],
+            'state': row[4],
+            'postal_code': row[5],
+            'country': row[6],
+            'score': round(score, 4)
+        } for score, row in scored[:limit]]
@@ -0,0 +1,397 @@
+"""
+Write-Behind Metrics Writer
+Takes processing-result status writes off the request path. Updates are appended to a
+local SQLite (WAL) spool, coalesced per result id, and flushed to the metrics database
+in batches by a background thread. Anything still in the spool after a crash or a
+database outage is replayed automatically.
+"""
+
+import os
+import json
+import time
+import atexit
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Any
+
+from step5_metrics_db_postgres import ProcessingResult, ProcessingStatus, ValidationStatus, ErrorType
+
+try:
+    import fcntl  # Serializes flushing across gunicorn workers sharing the spool
+except ImportError:  # Windows dev machines run a single process
+    fcntl = None
+
+# Spooled pseudo-column: error types to union into the stored list at flush time
+ADD_ERROR_TYPES_KEY = '__add_error_types'
+
+
+class WriteBehindMetricsDB:
+    """Drop-in wrapper around a metrics database that queues status updates."""
+
+    def __init__(self, metrics_db, spool_path: str = "data/metrics_spool.db",
+                 flush_interval: float = 2.0, batch_size: int = 100, max_attempts: int = 5):
+        """
+        Initialize the write-behind wrapper.
+
+        Args:
+            metrics_db: Underlying metrics database (ComprehensiveHybridDatabaseManager / MetricsDatabase)
+            spool_path: SQLite spool file shared by all workers on the host
+            flush_interval: Seconds between background flushes
+            batch_size: Maximum spooled rows drained per flush
+            max_attempts: Failures (while the database is otherwise reachable) before a result's
+                updates are moved to the dead letter table
+        """
+        self.metrics_db = metrics_db
+        self.spool_path = spool_path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+
+        self._lock = threading.Lock()
+        self._wake_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._backoff = 0.0
+
+        os.makedirs(os.path.dirname(spool_path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(spool_path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._init_spool()
+        self._lock_file = open(f"{spool_path}.lock", 'a') if fcntl else None
+
+        pending = self.get_spool_depth()
+        if pending:
+            print(f"🔁 Replaying {pending} spooled metrics updates")
+
+        self._flush_thread = threading.Thread(target=self._flush_loop, name="metrics-write-behind", daemon=True)
+        self._flush_thread.start()
+        atexit.register(self.close)
+
+    def _init_spool(self) -> None:
+        """Create the spool tables and switch the file to WAL mode."""
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS pending_updates (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    result_id INTEGER NOT NULL,
+                    payload TEXT NOT NULL,
+                    attempts INTEGER DEFAULT 0,
+                    created_at REAL NOT NULL
+                )
+            ''')
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_pending_result_id ON pending_updates(result_id)")
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS dead_letter_updates (
+                    seq INTEGER PRIMARY KEY,
+                    result_id INTEGER NOT NULL,
+                    payload TEXT NOT NULL,
+                    failed_at REAL NOT NULL
+                )
+            ''')
+
+    # Pass everything we do not intercept straight through (create, delete, metrics, catalog...)
+    def __getattr__(self, name):
+        if name == 'metrics_db':
+            raise AttributeError(name)
+        return getattr(self.metrics_db, name)
+
+    # ------------------------------------------------------------------
+    # Queued writes
+    # ------------------------------------------------------------------
+
+    def update_processing_result(self, result_id: int, **kwargs) -> bool:
+        """Queue an update; returns as soon as it is durable in the local spool."""
+        if not kwargs:
+            return True
+        try:
+            payload = json.dumps(self._serialize_fields(kwargs))
+            with self._lock:
+                self._conn.execute(
+                    "INSERT INTO pending_updates (result_id, payload, created_at) VALUES (?, ?, ?)",
+                    (result_id, payload, time.time())
+                )
+            return True
+        except Exception as e:
+            print(f"⚠️ Metrics spool write failed, writing through: {e}")
+            return self.metrics_db.update_processing_result(result_id, **kwargs)
+
+    def mark_as_correct(self, result_id: int) -> bool:
+        """Mark a processing result as correct."""
+        return self.update_processing_result(result_id, validation_status=ValidationStatus.CORRECT)
+
+    def mark_as_contains_error(self, result_id: int, error_types: List[ErrorType], error_details: str = "") -> bool:
+        """Mark a processing result as containing errors."""
+        return self.update_processing_result(
+            result_id,
+            validation_status=ValidationStatus.CONTAINS_ERROR,
+            error_types=error_types,
+            error_details=error_details
+        )
+
+    def update_raw_json_data(self, file_id: int, raw_json_data: str) -> bool:
+        """Update raw JSON data for a file."""
+        return self.update_processing_result(file_id, raw_json_data=raw_json_data)
+
+    def update_validation_status(self, file_id: int, validation_status: str) -> bool:
+        """Update validation status for a file."""
+        return self.update_processing_result(file_id, validation_status=validation_status)
+
+    def add_error_type(self, file_id: int, error_type: ErrorType) -> bool:
+        """Add an error type to a file (merged into the stored list at flush time)."""
+        return self.update_processing_result(file_id, **{ADD_ERROR_TYPES_KEY: [error_type]})
+
+    def delete_processing_result(self, result_id: int) -> bool:
+        """Delete a processing result and drop any updates still queued for it."""
+        with self._lock:
+            self._conn.execute("DELETE FROM pending_updates WHERE result_id = ?", (result_id,))
+        return self.metrics_db.delete_processing_result(result_id)
+
+    # ------------------------------------------------------------------
+    # Reads (overlay queued updates so callers see their own writes)
+    # ------------------------------------------------------------------
+
+    def get_processing_result(self, result_id: int) -> Optional[ProcessingResult]:
+        """Get a processing result with any queued updates applied."""
+        return self._apply_pending(self.metrics_db.get_processing_result(result_id))
+
+    def get_all_processing_results(self, limit: int = 100, offset: int = 0,
+                                   include_raw_json: bool = True) -> List[ProcessingResult]:
+        """Get all processing results with any queued updates applied."""
+        results = self.metrics_db.get_all_processing_results(limit=limit, offset=offset,
+                                                             include_raw_json=include_raw_json)
+        pending = self._load_pending()
+        if not include_raw_json:
+            for fields in pending.values():
+                fields.pop('raw_json_data', None)
+        return [self._apply_pending(result, pending) for result in results]
+
+    def get_raw_json_data(self, result_id: int) -> str:
+        """Get a raw JSON payload, preferring a queued (not yet flushed) update."""
+        queued = self._load_pending(result_id).get(result_id, {}).get('raw_json_data')
+        if queued is not None:
+            return queued
+        return self.metrics_db.get_raw_json_data(result_id)
+
+    def get_processing_result_by_filename(self, filename: str) -> Optional[ProcessingResult]:
+        """Get a processing result by filename with any queued updates applied."""
+        return self._apply_pending(self.metrics_db.get_processing_result_by_filename(filename))
+
+    def get_spool_depth(self) -> int:
+        """Number of updates waiting in the spool."""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM pending_updates").fetchone()[0]
+
+    # ------------------------------------------------------------------
+    # Flushing
+    # ------------------------------------------------------------------
+
+    def flush(self) -> int:
+        """
+        Drain up to batch_size spooled rows into the metrics database.
+
+        Returns:
+            Number of spooled rows applied
+        """
+        if self._lock_file is not None:
+            try:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return 0  # Another worker is flushing
+        try:
+            return self._flush_batch()
+        finally:
+            if self._lock_file is not None:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _flush_batch(self) -> int:
+        """Coalesce and apply one batch of spooled rows."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, result_id, payload, attempts FROM pending_updates ORDER BY seq LIMIT ?",
+                (self.batch_size,)
+            ).fetchall()
+        if not rows:
+            return 0
+
+        # Coalesce: later writes to the same result win, error type additions accumulate
+        merged: Dict[int, Dict[str, Any]] = {}
+        seqs: Dict[int, List[int]] = {}
+        attempts: Dict[int, int] = {}
+        for seq, result_id, payload, row_attempts in rows:
+            fields = merged.setdefault(result_id, {})
+            for key, value in json.loads(payload).items():
+                if key == ADD_ERROR_TYPES_KEY:
+                    fields.setdefault(key, [])
+                    fields[key].extend(v for v in value if v not in fields[key])
+                else:
+                    fields[key] = value
+            seqs.setdefault(result_id, []).append(seq)
+            attempts[result_id] = max(attempts.get(result_id, 0), row_attempts)
+
+        applied, failed = [], []
+        for result_id, fields in merged.items():
+            if self._apply_update(result_id, fields):
+                applied.append(result_id)
+            else:
+                failed.append(result_id)
+
+        # A batch of only failures is either an outage or rows the database rejects
+        # (e.g. a deleted result); only the latter may count towards dead-lettering
+        reachable = bool(applied) or (bool(failed) and self._database_reachable())
+
+        with self._lock:
+            for result_id in applied:
+                self._delete_seqs(seqs[result_id])
+            for result_id in failed:
+                # Only count attempts while the database is reachable, so outages never dead-letter
+                if reachable and attempts[result_id] + 1 >= self.max_attempts:
+                    self._dead_letter(seqs[result_id])
+                elif reachable:
+                    self._conn.execute(
+                        f"UPDATE pending_updates SET attempts = attempts + 1 WHERE seq IN ({','.join('?' * len(seqs[result_id]))})",
+                        seqs[result_id]
+                    )
+
+        if failed and not reachable:
+            self._backoff = min(max(self._backoff * 2, self.flush_interval), 60.0)
+            print(f"⚠️ Metrics DB unavailable, {len(rows)} spooled updates kept for replay (retry in {self._backoff:.0f}s)")
+        else:
+            self._backoff = 0.0
+        return sum(len(seqs[result_id]) for result_id in applied)
+
+    def _database_reachable(self) -> bool:
+        """Ping the metrics database (backends without ping() are assumed down, so nothing is dead-lettered)."""
+        ping = getattr(self.metrics_db, 'ping', None)
+        if ping is None:
+            return False
+        try:
+            return bool(ping())
+        except Exception:
+            return False
+
+    def _apply_update(self, result_id: int, fields: Dict[str, Any]) -> bool:
+        """Write one coalesced update through to the metrics database."""
+        fields = dict(fields)
+        add_error_types = fields.pop(ADD_ERROR_TYPES_KEY, None)
+        if add_error_types:
+            if 'error_types' in fields:
+                current = list(fields['error_types'])
+            else:
+                result = self.metrics_db.get_processing_result(result_id)
+                if not result:
+                    return False
+                current = [e.value if hasattr(e, 'value') else e for e in result.error_types]
+            fields['error_types'] = current + [e for e in add_error_types if e not in current]
+        if not fields:
+            return True
+        return self.metrics_db.update_processing_result(result_id, **fields)
+
+    def _delete_seqs(self, seq_list: List[int]) -> None:
+        """Remove applied rows from the spool."""
+        self._conn.execute(f"DELETE FROM pending_updates WHERE seq IN ({','.join('?' * len(seq_list))})", seq_list)
+
+    def _dead_letter(self, seq_list: List[int]) -> None:
+        """Move rows that keep failing out of the spool so they stop blocking replay."""
+        placeholders = ','.join('?' * len(seq_list))
+        self._conn.execute(
+            f"INSERT OR REPLACE INTO dead_letter_updates (seq, result_id, payload, failed_at) "
+            f"SELECT seq, result_id, payload, ? FROM pending_updates WHERE seq IN ({placeholders})",
+            [time.time()] + seq_list
+        )
+        self._delete_seqs(seq_list)
+        print(f"❌ Moved {len(seq_list)} metrics updates to dead_letter_updates")
+
+    def _flush_loop(self) -> None:
+        """Background loop draining the spool."""
+        while not self._stop_event.is_set():
+            self._wake_event.wait(self.flush_interval + self._backoff)
+            self._wake_event.clear()
+            try:
+                # Keep draining while full batches come back
+                while self.flush() >= self.batch_size:
+                    pass
+            except Exception as e:
+                print(f"❌ Error flushing metrics spool: {e}")
+
+    def close(self) -> None:
+        """Stop the background thread and make a final flush attempt."""
+        if self._stop_event.is_set():
+            return
+        self._stop_event.set()
+        self._wake_event.set()
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"❌ Error during final metrics flush: {e}")
+
+    # ------------------------------------------------------------------
+    # Helpers
+    # ------------------------------------------------------------------
+
+    def _serialize_fields(self, fields: Dict[str, Any]) -> Dict[str, Any]:
+        """Convert enums and datetimes into JSON-safe spool values."""
+        serialized = {}
+        for key, value in fields.items():
+            if isinstance(value, list):
+                value = [v.value if hasattr(v, 'value') else v for v in value]
+            elif hasattr(value, 'value'):  # Enum
+                value = value.value
+            elif isinstance(value, datetime):
+                value = value.isoformat()
+            serialized[key] = value
+        return serialized
+
+    def _load_pending(self, result_id: Optional[int] = None) -> Dict[int, Dict[str, Any]]:
+        """Load spooled updates coalesced per result id."""
+        with self._lock:
+            if result_id is None:
+                rows = self._conn.execute("SELECT result_id, payload FROM pending_updates ORDER BY seq").fetchall()
+            else:
+                rows = self._conn.execute(
+                    "SELECT result_id, payload FROM pending_updates WHERE result_id = ? ORDER BY seq", (result_id,)
+                ).fetchall()
+
+        pending: Dict[int, Dict[str, Any]] = {}
+        for row_result_id, payload in rows:
+            fields = pending.setdefault(row_result_id, {})
+            for key, value in json.loads(payload).items():
+                if key == ADD_ERROR_TYPES_KEY:
+                    fields.setdefault(key, [])
+                    fields[key].extend(value)
+                else:
+                    fields[key] = value
+        return pending
+
+    def _apply_pending(self, result: Optional[ProcessingResult],
+                       pending: Optional[Dict[int, Dict[str, Any]]] = None) -> Optional[ProcessingResult]:
+        """Overlay queued updates onto a result read from the database."""
+        if result is None or result.id is None:
+            return result
+        if pending is None:
+            pending = self._load_pending(result.id)
+        fields = pending.get(result.id)
+        if not fields:
+            return result
+
+        for key, value in fields.items():
+            try:
+                if key == 'processing_status':
+                    value = ProcessingStatus(value)
+                elif key == 'validation_status':
+                    value = ValidationStatus(value)
+                elif key in ('processing_end_time', 'processing_start_time') and isinstance(value, str):
+                    value = datetime.fromisoformat(value)
+                elif key == 'error_types':
+                    value = [ErrorType(v) for v in value]
+                elif key == ADD_ERROR_TYPES_KEY:
+                    for error_value in value:
+                        error_type = ErrorType(error_value)
+                        if error_type not in result.error_types:
+                            result.error_types.append(error_type)
+                    continue
+                if hasattr(result, key):
+                    setattr(result, key, value)
+            except ValueError:
+                continue
+        return result
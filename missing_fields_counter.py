@@ -0,0 +1,133 @@
+"""
+Missing Fields Counter
+Batches missing-field increments in memory and flushes them to the metrics database
+as atomic counter updates, so concurrent gunicorn workers never lose counts.
+"""
+
+import os
+import json
+import time
+import atexit
+import threading
+from collections import Counter
+from typing import Dict, List, Optional
+
+from app_metrics import record_cache_access
+
+
+class MissingFieldsCounter:
+    """Thread-safe batched counter backed by the missing_field_counts table."""
+
+    def __init__(self, metrics_db, flush_interval: float = 10.0, stats_ttl: float = 30.0,
+                 legacy_tracker_path: Optional[str] = None):
+        """
+        Initialize the counter.
+
+        Args:
+            metrics_db: Database manager exposing increment_missing_field_counts / get_missing_field_counts
+            flush_interval: Seconds between background flushes
+            stats_ttl: Seconds a dashboard read is served from memory before re-querying
+            legacy_tracker_path: Old JSON tracker to fold into the table once
+        """
+        self.metrics_db = metrics_db
+        self.flush_interval = flush_interval
+        self.stats_ttl = stats_ttl
+
+        self._lock = threading.Lock()
+        self._pending = Counter()
+        self._cached_counts: Dict[str, int] = {}
+        self._cached_at = 0.0
+        self._stop_event = threading.Event()
+
+        if legacy_tracker_path:
+            self._import_legacy_tracker(legacy_tracker_path)
+
+        self._flush_thread = threading.Thread(target=self._flush_loop, name="missing-fields-flush", daemon=True)
+        self._flush_thread.start()
+        atexit.register(self.close)
+
+    def increment(self, missing_fields_list: List[str]) -> None:
+        """Record one upload's missing fields (no database round trip)."""
+        if not missing_fields_list:
+            return
+        with self._lock:
+            self._pending.update(missing_fields_list)
+
+    def flush(self) -> bool:
+        """Push pending increments to the database; keeps them queued on failure."""
+        with self._lock:
+            if not self._pending:
+                return True
+            batch = dict(self._pending)
+            self._pending.clear()
+
+        if self.metrics_db.increment_missing_field_counts(batch):
+            with self._lock:
+                for field, count in batch.items():
+                    self._cached_counts[field] = self._cached_counts.get(field, 0) + count
+            return True
+
+        # Re-queue so the next flush retries the same increments
+        with self._lock:
+            self._pending.update(batch)
+        print(f"⚠️ Missing fields flush failed, {sum(batch.values())} increments re-queued")
+        return False
+
+    def get_counts(self) -> Dict[str, int]:
+        """Get merged persisted + pending counts, re-querying at most once per TTL."""
+        now = time.time()
+        cache_hit = now - self._cached_at <= self.stats_ttl
+        record_cache_access('missing_fields_stats', cache_hit)
+        if not cache_hit:
+            persisted = self.metrics_db.get_missing_field_counts()
+            with self._lock:
+                if persisted or not self._cached_counts:
+                    self._cached_counts = persisted
+                self._cached_at = now
+
+        with self._lock:
+            counts = dict(self._cached_counts)
+            for field, count in self._pending.items():
+                counts[field] = counts.get(field, 0) + count
+        return counts
+
+    def get_pending_total(self) -> int:
+        """Number of increments waiting for the next flush."""
+        with self._lock:
+            return sum(self._pending.values())
+
+    def close(self) -> None:
+        """Stop the background thread and flush whatever is left."""
+        self._stop_event.set()
+        self.flush()
+
+    def _flush_loop(self) -> None:
+        """Background loop flushing pending increments every flush_interval seconds."""
+        while not self._stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"❌ Error flushing missing fields: {e}")
+
+    def _import_legacy_tracker(self, tracker_path: str) -> None:
+        """Fold the old JSON tracker into the table once, then rename it so it is not re-imported."""
+        if not os.path.exists(tracker_path):
+            return
+        migrated_path = f"{tracker_path}.migrated"
+        try:
+            # Rename first so only one worker ever imports the file
+            os.replace(tracker_path, migrated_path)
+        except OSError:
+            return
+
+        try:
+            with open(migrated_path, 'r') as f:
+                tracker = json.load(f)
+            legacy = {field: int(count) for field, count in tracker.items() if int(count) > 0}
+            if legacy and self.metrics_db.increment_missing_field_counts(legacy):
+                print(f"✅ Imported legacy missing fields tracker ({len(legacy)} fields)")
+            elif legacy:
+                with self._lock:
+                    self._pending.update(legacy)
+        except Exception as e:
+            print(f"❌ Error importing legacy missing fields tracker: {e}")
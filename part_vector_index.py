@@ -0,0 +1,245 @@
+"""
+Part Vector Index
+Offline similarity search over part descriptions: TF-IDF vectors of character n-grams and
+description words, queried by cosine top-k. No network or model download is involved.
+
+Character n-grams tolerate the abbreviations, typos and run-together words customers use in
+PO line items ("NOZ 1.2MM" vs "NOZZLE 1.2 MM"), which exact keyword lookups miss.
+
+The matrix is stored column-wise (per feature: row positions + L2-normalized weights) as
+plain arrays, so it can be memory-mapped through SharedCatalogIndexStore.open_or_build_arrays
+and shared by every worker. Rows are parts_df positions, like the other catalog indexes.
+"""
+
+import gc
+import re
+import itertools
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from shared_catalog_index import MappedStrings, _encode_strings
+
+# Character n-gram sizes taken from each space-padded word
+NGRAM_SIZES = (3, 4)
+
+# Word features are prefixed so they never collide with n-grams (which only hold [a-z0-9 ])
+WORD_FEATURE_PREFIX = '#'
+
+_TOKEN = re.compile(r'[a-z0-9]+')
+
+
+def _word_features(word: str) -> List[str]:
+    padded = f" {word} "
+    features = [WORD_FEATURE_PREFIX + word]
+    for size in NGRAM_SIZES:
+        features.extend(padded[i:i + size] for i in range(len(padded) - size + 1))
+    return features
+
+
+def text_features(text: str) -> List[str]:
+    """Features of one text (with repeats, so counts give term frequency)."""
+    return list(itertools.chain.from_iterable(_word_features(word) for word in _TOKEN.findall(str(text).lower())))
+
+
+def build_vector_arrays(descriptions: pd.Series) -> Dict[str, np.ndarray]:
+    """
+    Build the TF-IDF matrix for a description column.
+
+    Features are computed once per distinct word and gathered per row, so the cost is
+    dominated by one sort of the (feature, row) pairs.
+
+    Returns:
+        Arrays for PartVectorIndex: vocabulary blob/ends, per-feature offsets, rows, weights, idf
+    """
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        texts = descriptions.astype(str).tolist()
+        n_rows = len(texts)
+        token_lists = [_TOKEN.findall(text.lower()) for text in texts]
+        token_counts = np.fromiter(map(len, token_lists), dtype=np.int64, count=n_rows)
+        tokens = np.fromiter(itertools.chain.from_iterable(token_lists), dtype=object, count=int(token_counts.sum()))
+        token_rows = np.repeat(np.arange(n_rows, dtype=np.int64), token_counts)
+
+        # Features per distinct word, as ids into a vocabulary
+        word_codes, words = pd.factorize(tokens)
+        vocabulary: Dict[str, int] = {}
+        word_feature_ids = []
+        for word in words:
+            word_feature_ids.append([vocabulary.setdefault(feature, len(vocabulary))
+                                     for feature in _word_features(word)])
+        feature_counts = np.fromiter(map(len, word_feature_ids), dtype=np.int64, count=len(word_feature_ids))
+        flat_features = np.fromiter(itertools.chain.from_iterable(word_feature_ids), dtype=np.int64,
+                                    count=int(feature_counts.sum()))
+        feature_starts = np.concatenate(([0], np.cumsum(feature_counts)[:-1])) if len(words) else np.zeros(0, np.int64)
+
+        # Gather every token occurrence's feature ids
+        occurrence_counts = feature_counts[word_codes]
+        total = int(occurrence_counts.sum())
+        block_starts = np.repeat(feature_starts[word_codes] - (np.cumsum(occurrence_counts) - occurrence_counts),
+                                 occurrence_counts)
+        pair_features = flat_features[block_starts + np.arange(total)]
+        pair_rows = np.repeat(token_rows, occurrence_counts)
+
+        # Vocabulary in sorted order so queries can bisect it
+        names = np.array(list(vocabulary), dtype=object)
+        name_order = np.argsort(names.astype(str), kind='stable')
+        rank = np.empty(len(names), dtype=np.int64)
+        rank[name_order] = np.arange(len(names))
+        pair_ids, term_frequency = np.unique(rank[pair_features] * max(n_rows, 1) + pair_rows, return_counts=True)
+        features, rows = np.divmod(pair_ids, max(n_rows, 1))
+
+        document_frequency = np.bincount(features, minlength=len(names))
+        idf = np.log((1.0 + n_rows) / (1.0 + document_frequency)) + 1.0
+        weights = (1.0 + np.log(term_frequency)) * idf[features]
+        norms = np.sqrt(np.bincount(rows, weights=weights * weights, minlength=n_rows))
+        weights = weights / norms[rows]
+
+        offsets = np.zeros(len(names) + 1, dtype=np.int64)
+        np.cumsum(document_frequency, out=offsets[1:])
+        blob, ends = _encode_strings(names[name_order].tolist())
+        return {
+            'vocabulary_blob': blob,
+            'vocabulary_ends': ends,
+            'offsets': offsets,
+            'rows': rows.astype(np.uint32),
+            'weights': weights.astype(np.float32),
+            'idf': idf.astype(np.float32)
+        }
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+class PartVectorIndex:
+    """Cosine top-k over a TF-IDF matrix built by build_vector_arrays."""
+
+    def __init__(self, arrays: Dict[str, np.ndarray], n_rows: int):
+        self.vocabulary = MappedStrings(arrays['vocabulary_blob'], arrays['vocabulary_ends'])
+        self._offsets = arrays['offsets']
+        self._rows = arrays['rows']
+        self._weights = arrays['weights']
+        self._idf = arrays['idf']
+        self.n_rows = n_rows
+
+    @classmethod
+    def build(cls, parts_df: pd.DataFrame) -> 'PartVectorIndex':
+        """Build in memory (callers that share across workers use open_or_build_arrays)."""
+        return cls(build_vector_arrays(parts_df['description']), len(parts_df))
+
+    def text_vector(self, text: str) -> Dict[int, float]:
+        """
+        L2-normalized TF-IDF vector of a text over this index's vocabulary.
+
+        Returns:
+            {vocabulary position: weight}; features unknown to the vocabulary are dropped
+        """
+        feature_counts: Dict[int, int] = {}
+        for feature in text_features(text):
+            position = self.vocabulary.find(feature)
+            if position >= 0:
+                feature_counts[position] = feature_counts.get(position, 0) + 1
+        if not feature_counts:
+            return {}
+
+        positions = np.fromiter(feature_counts, dtype=np.int64, count=len(feature_counts))
+        weights = (1.0 + np.log(np.fromiter(feature_counts.values(), dtype=np.float64,
+                                            count=len(feature_counts)))) * self._idf[positions]
+        weights /= np.linalg.norm(weights)
+        return dict(zip(positions.tolist(), weights.tolist()))
+
+    def top_k(self, text: str, k: int = 10, min_score: float = 0.0) -> List[Tuple[int, float]]:
+        """
+        Rows most similar to text.
+
+        Args:
+            text: Query (description, or part number plus description)
+            k: Number of rows to return
+            min_score: Drop rows with a lower cosine similarity (0-1)
+
+        Returns:
+            [(row position, cosine similarity)] best first
+        """
+        query = self.text_vector(text)
+        if not query or self.n_rows == 0:
+            return []
+
+        positions = np.fromiter(query, dtype=np.int64, count=len(query))
+        query_weights = np.fromiter(query.values(), dtype=np.float64, count=len(query))
+
+        starts, ends = self._offsets[positions], self._offsets[positions + 1]
+        lengths = ends - starts
+        gather = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) + np.arange(int(lengths.sum()))
+        scores = np.bincount(self._rows[gather],
+                             weights=self._weights[gather] * np.repeat(query_weights, lengths),
+                             minlength=self.n_rows)
+
+        k = min(k, self.n_rows)
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best], kind='stable')]
+        return [(int(row), float(scores[row])) for row in best if scores[row] > min_score]
+
+
+class IncrementalVectorIndex:
+    """
+    PartVectorIndex that accepts row edits without a rebuild.
+
+    Edited rows are masked out of the base matrix and their new descriptions are scored
+    separately (with the base vocabulary and idf; features new since the build are ignored
+    until the next full build), then merged with the base top-k. Row operations mirror
+    IncrementalPartIndexes, so positions stay in step with parts_df.
+    """
+
+    def __init__(self, base: PartVectorIndex):
+        self.base = base
+        self.n_rows = base.n_rows
+        self._masked: Set[int] = set()  # Base rows whose vector is stale
+        self._edited: Dict[int, Dict[int, float]] = {}  # Row -> vector of its current description
+
+    @classmethod
+    def build(cls, parts_df: pd.DataFrame) -> 'IncrementalVectorIndex':
+        return cls(PartVectorIndex.build(parts_df))
+
+    def _set(self, row: int, description: str) -> None:
+        if row < self.base.n_rows:
+            self._masked.add(row)
+        self._edited[row] = self.base.text_vector(description)
+
+    def _drop(self, row: int) -> None:
+        if row < self.base.n_rows:
+            self._masked.add(row)
+        self._edited.pop(row, None)
+
+    def append_row(self, description: str) -> None:
+        """Index a row appended at the end of parts_df."""
+        self._set(self.n_rows, description)
+        self.n_rows += 1
+
+    def update_row(self, row: int, description: str) -> None:
+        """Re-index a row whose description changed."""
+        self._set(row, description)
+
+    def remove_row(self, row: int, moved_description: Optional[str]) -> None:
+        """Remove a row; the last row (moved_description) takes its position, as in remove_row of the part indexes."""
+        last = self.n_rows - 1
+        if row != last:
+            self._set(row, moved_description)
+        self._drop(last)
+        self.n_rows = last
+
+    def top_k(self, text: str, k: int = 10, min_score: float = 0.0) -> List[Tuple[int, float]]:
+        """Rows most similar to text, as PartVectorIndex.top_k."""
+        if self.n_rows == 0:
+            return []
+        results = [(row, score) for row, score in self.base.top_k(text, k=k + len(self._masked), min_score=min_score)
+                   if row not in self._masked]
+        if self._edited:
+            query = self.base.text_vector(text)
+            for row, vector in self._edited.items():
+                score = sum(weight * vector.get(feature, 0.0) for feature, weight in query.items())
+                if score > min_score:
+                    results.append((row, score))
+            results.sort(key=lambda item: -item[1])
+        return results[:k]
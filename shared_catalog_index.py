@@ -0,0 +1,636 @@
+"""
+Shared Catalog Index
+Read-only, memory-mapped search indexes shared by every gunicorn worker on the host.
+
+An index is built once per catalog version into data/catalog_index/<version>/ and every
+worker maps the same files with numpy, so the pages live once in the OS page cache instead
+of once per worker heap. Each index is stored CSR-style:
+
+    <name>.keys.blob / <name>.keys.offsets  - sorted UTF-8 keys (one blob + end offsets)
+    <name>.offsets                          - postings start offset per key
+    <name>.postings                         - row indexes (uint32)
+
+Lookups bisect the sorted keys, so the mapped objects behave like the read-only dicts they
+replace (parts_by_exact_match, description_words), and prefix queries are a contiguous
+slice of the postings (PartKeywordIndex).
+"""
+
+import gc
+import os
+import re
+import json
+import shutil
+import bisect
+import hashlib
+import itertools
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl  # Only one worker builds a given version; the others wait and map it
+except ImportError:  # Windows dev machines run a single process
+    fcntl = None
+
+# Bump when the on-disk layout or what goes into the indexes changes
+INDEX_FORMAT_VERSION = 3
+
+# Sorts after any character a key can contain, so [prefix, prefix + sentinel) spans the prefix
+PREFIX_SENTINEL = chr(0x10FFFF)
+
+# Description tokenizers (see build_part_indexes)
+REGEX_WORD_PATTERN = r'\b[a-zA-Z0-9]{2,}\b'
+WORD_STRIP_CHARS = '.,!?;:"()[]{}'
+_REGEX_WORD = re.compile(REGEX_WORD_PATTERN)
+
+# Versions kept on disk (older ones may still be mapped by workers that have not reloaded)
+KEEP_VERSIONS = 2
+
+
+class MappedStrings:
+    """Sequence of strings backed by a mapped UTF-8 blob and an end-offset array."""
+
+    def __init__(self, blob: np.ndarray, ends: np.ndarray):
+        self._blob = blob
+        self._ends = ends
+
+    def __len__(self) -> int:
+        return len(self._ends)
+
+    def __getitem__(self, position: int) -> str:
+        start = int(self._ends[position - 1]) if position > 0 else 0
+        return self._blob[start:int(self._ends[position])].tobytes().decode('utf-8')
+
+    def __iter__(self) -> Iterator[str]:
+        for position in range(len(self)):
+            yield self[position]
+
+    def find(self, key: str) -> int:
+        """Position of key, or -1 (keys must be sorted)."""
+        position = bisect.bisect_left(self, key)
+        if position < len(self) and self[position] == key:
+            return position
+        return -1
+
+    def prefix_range(self, prefix: str) -> Tuple[int, int]:
+        """Half-open position range of the keys starting with prefix."""
+        return bisect.bisect_left(self, prefix), bisect.bisect_left(self, prefix + PREFIX_SENTINEL)
+
+    def positions_containing(self, text: str) -> List[int]:
+        """Sorted positions of the strings containing text (one byte search over the blob)."""
+        needle = text.encode('utf-8')
+        if not needle or not len(self._ends):
+            return []
+        blob = self._blob.tobytes()
+        positions = []
+        start = blob.find(needle)
+        while start >= 0:
+            position = int(np.searchsorted(self._ends, start, side='right'))
+            end = int(self._ends[position])
+            if start + len(needle) <= end:
+                positions.append(position)
+                start = blob.find(needle, end)
+            else:
+                # Occurrence straddles two strings; retry inside the next one
+                start = blob.find(needle, start + 1)
+        return positions
+
+
+class MappedPostingIndex:
+    """Read-only mapping of key -> row indexes (or a single row index when unique=True)."""
+
+    def __init__(self, keys: MappedStrings, offsets: np.ndarray, postings: np.ndarray, unique: bool = False):
+        self.keys_array = keys
+        self._offsets = offsets
+        self._postings = postings
+        self.unique = unique
+
+    def _postings_at(self, position: int) -> np.ndarray:
+        start = int(self._offsets[position])
+        end = int(self._offsets[position + 1]) if position + 1 < len(self._offsets) else len(self._postings)
+        return self._postings[start:end]
+
+    def rows_with_prefix(self, prefix: str) -> np.ndarray:
+        """Row indexes of every key starting with prefix (one contiguous postings slice)."""
+        lo, hi = self.keys_array.prefix_range(prefix)
+        if lo >= hi:
+            return self._postings[0:0]
+        start = int(self._offsets[lo])
+        end = int(self._offsets[hi]) if hi < len(self._offsets) else len(self._postings)
+        return self._postings[start:end]
+
+    def __getitem__(self, key: str):
+        position = self.keys_array.find(key)
+        if position < 0:
+            raise KeyError(key)
+        postings = self._postings_at(position)
+        return int(postings[0]) if self.unique else postings.tolist()
+
+    def get(self, key: str, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key) -> bool:
+        return isinstance(key, str) and self.keys_array.find(key) >= 0
+
+    def __len__(self) -> int:
+        return len(self.keys_array)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys_array)
+
+    def keys(self) -> Iterator[str]:
+        return iter(self.keys_array)
+
+    def items(self) -> Iterator:
+        for position, key in enumerate(self.keys_array):
+            postings = self._postings_at(position)
+            yield key, (int(postings[0]) if self.unique else postings.tolist())
+
+    def keys_containing(self, text: str) -> Iterator[str]:
+        """Keys containing text as a substring, in key order."""
+        for position in self.keys_array.positions_containing(text):
+            yield self.keys_array[position]
+
+    def last_rows(self) -> 'MappedPostingIndex':
+        """Unique view keeping each key's highest row (postings are sorted within a key)."""
+        ends = np.append(np.asarray(self._offsets[1:], dtype=np.int64), len(self._postings)) - 1
+        return MappedPostingIndex(self.keys_array, np.arange(len(self._offsets), dtype=np.uint32),
+                                  np.asarray(self._postings)[ends], unique=True)
+
+    def to_arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """(key blob, key end offsets, postings offsets, postings) for serialization."""
+        return self.keys_array._blob, self.keys_array._ends, self._offsets, self._postings
+
+
+def catalog_version_key(*frames: Optional[pd.DataFrame]) -> str:
+    """Content hash of the catalog frames (vectorized, a few ms for the full catalog)."""
+    digest = hashlib.sha1(f"v{INDEX_FORMAT_VERSION}".encode())
+    for frame in frames:
+        if frame is None or frame.empty:
+            digest.update(b'-')
+            continue
+        digest.update(','.join(map(str, frame.columns)).encode())
+        digest.update(pd.util.hash_pandas_object(frame, index=False).values.tobytes())
+    return digest.hexdigest()[:16]
+
+
+def _encode_strings(values: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    encoded = [value.encode('utf-8') for value in values]
+    ends = np.cumsum([len(value) for value in encoded], dtype=np.uint64) if encoded else np.zeros(0, np.uint64)
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), ends
+
+
+def posting_index_from_pairs(keys, rows, unique: bool = False) -> MappedPostingIndex:
+    """
+    Build an in-memory index from parallel key / row arrays without a per-key Python loop.
+
+    Args:
+        keys: Key per pair (strings)
+        rows: Row position per pair (duplicate pairs are dropped)
+        unique: Keep one row per key (the highest, matching dict assignment in row order)
+
+    Returns:
+        MappedPostingIndex over in-memory arrays
+    """
+    keys = np.asarray(keys, dtype=object)
+    rows = np.asarray(rows, dtype=np.int64)
+
+    codes, uniques = pd.factorize(keys, sort=False)
+    uniques = np.asarray(uniques, dtype=object)
+    # Fixed-width unicode sorts in C with the same code-point order as Python str comparison
+    key_order = np.argsort(uniques.astype(str), kind='stable')
+    rank = np.empty(len(uniques), dtype=np.int64)
+    rank[key_order] = np.arange(len(uniques))
+    key_rank = rank[codes]
+
+    pair_order = np.lexsort((rows, key_rank))
+    key_rank, rows = key_rank[pair_order], rows[pair_order]
+    if len(rows) > 1:
+        distinct = np.ones(len(rows), dtype=bool)
+        distinct[1:] = (key_rank[1:] != key_rank[:-1]) | (rows[1:] != rows[:-1])
+        key_rank, rows = key_rank[distinct], rows[distinct]
+
+    counts = np.bincount(key_rank, minlength=len(uniques))
+    offsets = np.zeros(len(uniques), dtype=np.uint32)
+    if len(uniques) > 1:
+        np.cumsum(counts[:-1], out=offsets[1:])
+    postings = rows.astype(np.uint32)
+    if unique:
+        postings = postings[np.cumsum(counts) - 1]
+        offsets = np.arange(len(uniques), dtype=np.uint32)
+
+    return MappedPostingIndex(MappedStrings(*_encode_strings(uniques[key_order].tolist())), offsets, postings,
+                              unique=unique)
+
+
+def posting_index_from_dict(index: Dict[str, object], unique: bool = False) -> MappedPostingIndex:
+    """Build an in-memory index from a dict of key -> row (or list of rows)."""
+    keys, rows = [], []
+    for key, value in index.items():
+        values = [value] if isinstance(value, (int, np.integer)) else list(value)
+        keys.extend([key] * len(values))
+        rows.extend(values)
+    return posting_index_from_pairs(keys, rows, unique=unique)
+
+
+def _description_tokens(descriptions: pd.Series, word_style: str) -> pd.Series:
+    """Exploded description words indexed by row position."""
+    texts = descriptions.astype(str).tolist()
+    if word_style == 'regex_lower':
+        # DatabaseManager: alphanumeric runs of 2+ characters, lower case
+        token_lists = [_REGEX_WORD.findall(text.lower()) for text in texts]
+    else:
+        # Hybrid / Supabase managers (_extract_words): whitespace split
+        token_lists = [text.split() for text in texts]
+
+    counts = np.fromiter(map(len, token_lists), dtype=np.int64, count=len(token_lists))
+    raw_tokens = np.fromiter(itertools.chain.from_iterable(token_lists), dtype=object, count=int(counts.sum()))
+    rows = np.repeat(np.arange(len(texts)), counts)
+    if word_style == 'regex_lower':
+        return pd.Series(raw_tokens, index=rows, dtype=object)
+
+    # len > 2 before stripping punctuation, then upper case. Raw tokens repeat heavily, so
+    # the string work runs once per distinct token.
+    codes, distinct = pd.factorize(raw_tokens)
+    distinct = pd.Series(distinct, dtype=object)
+    keep = (distinct.str.len() > 2).to_numpy()[codes]
+    words = distinct.str.strip(WORD_STRIP_CHARS).str.upper().to_numpy(dtype=object)[codes]
+    return pd.Series(words[keep], index=rows[keep], dtype=object)
+
+
+def build_part_indexes(parts_df: pd.DataFrame, word_style: str = 'split_upper') -> Dict[str, MappedPostingIndex]:
+    """
+    Build every parts index in bulk with vectorized string operations.
+
+    Postings hold row positions (iloc), not index labels.
+
+    Args:
+        parts_df: Catalog frame with internal_part_number and description columns
+        word_style: 'split_upper' (_extract_words tokens) or 'regex_lower' (DatabaseManager tokens)
+
+    Returns:
+        {'parts_by_exact_match': upper part number -> row (last wins),
+         'part_numbers': upper part number -> rows,
+         'description_words': word -> rows}
+    """
+    # The build allocates millions of short-lived strings and lists but no reference cycles;
+    # pausing the cyclic GC avoids repeated full-heap scans (roughly halves build time)
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        positions = np.arange(len(parts_df))
+        part_numbers = parts_df['internal_part_number'].astype(str).str.strip().str.upper().to_numpy(dtype=object)
+        tokens = _description_tokens(parts_df['description'], word_style)
+        part_number_index = posting_index_from_pairs(part_numbers, positions)
+
+        return {
+            'parts_by_exact_match': part_number_index.last_rows(),
+            'part_numbers': part_number_index,
+            'description_words': posting_index_from_pairs(tokens.to_numpy(dtype=object), tokens.index.to_numpy())
+        }
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+def write_posting_index(directory: str, name: str, index) -> None:
+    """
+    Serialize an index to CSR files.
+
+    Args:
+        directory: Target directory
+        name: Index name (file prefix)
+        index: MappedPostingIndex, or a dict of key -> row / list of rows
+    """
+    if isinstance(index, dict):
+        index = posting_index_from_dict(index)
+    blob, ends, offsets, postings = index.to_arrays()
+    prefix = os.path.join(directory, name)
+    np.save(f"{prefix}.keys.blob.npy", blob)
+    np.save(f"{prefix}.keys.offsets.npy", ends)
+    np.save(f"{prefix}.offsets.npy", offsets)
+    np.save(f"{prefix}.postings.npy", postings)
+
+
+def read_posting_index(directory: str, name: str, unique: bool = False) -> MappedPostingIndex:
+    """Map a CSR index written by write_posting_index."""
+    prefix = os.path.join(directory, name)
+    keys = MappedStrings(np.load(f"{prefix}.keys.blob.npy", mmap_mode='r'),
+                         np.load(f"{prefix}.keys.offsets.npy", mmap_mode='r'))
+    return MappedPostingIndex(keys,
+                              np.load(f"{prefix}.offsets.npy", mmap_mode='r'),
+                              np.load(f"{prefix}.postings.npy", mmap_mode='r'),
+                              unique=unique)
+
+
+class PartKeywordIndex:
+    """
+    Keyword lookups over the part-number and description-word indexes.
+
+    Answers the same queries as the old exploded keyword dict (part number in upper or lower
+    case, any upper-case part-number prefix of 3+ characters, any description word) without
+    storing a key per prefix: prefixes are a bisect range over the sorted part numbers.
+    """
+
+    def __init__(self, part_numbers: MappedPostingIndex, description_words: MappedPostingIndex):
+        self.part_numbers = part_numbers
+        self.description_words = description_words
+
+    def lookup(self, keyword: str) -> List[int]:
+        """Sorted row indexes matching keyword."""
+        if not isinstance(keyword, str) or not keyword:
+            return []
+        upper = keyword.upper()
+        chunks = [np.asarray(self.description_words.get(keyword, []), dtype=np.uint32)]
+        if len(keyword) >= 3 and keyword == upper:
+            chunks.append(self.part_numbers.rows_with_prefix(upper))  # Includes the exact part number
+        elif keyword == upper or keyword == upper.lower():
+            chunks.append(np.asarray(self.part_numbers.get(upper, []), dtype=np.uint32))
+        return np.unique(np.concatenate(chunks)).tolist()
+
+    def __getitem__(self, keyword: str) -> List[int]:
+        rows = self.lookup(keyword)
+        if not rows:
+            raise KeyError(keyword)
+        return rows
+
+    def get(self, keyword: str, default=None):
+        return self.lookup(keyword) or default
+
+    def __contains__(self, keyword) -> bool:
+        return bool(self.lookup(keyword))
+
+
+class IncrementalPostingIndex:
+    """
+    A compact base index plus a small in-memory delta, so catalog edits cost O(changed rows).
+
+    Edited or deleted rows are tombstoned in the base; their current keys live in the delta.
+    Lookups return base rows minus tombstones plus delta rows. Views created with
+    unique_view() share the same state and return one row per key (the highest).
+    """
+
+    def __init__(self, base: MappedPostingIndex, unique: bool = False, _state: Optional[tuple] = None):
+        self.base = base
+        self.unique = unique
+        # (tombstoned base rows, key -> added rows, row -> its added keys)
+        self._removed, self._added, self._keys_by_row = _state or (set(), {}, {})
+
+    def unique_view(self) -> 'IncrementalPostingIndex':
+        """View over the same data returning a single row per key."""
+        return IncrementalPostingIndex(self.base, unique=True,
+                                       _state=(self._removed, self._added, self._keys_by_row))
+
+    def insert(self, row: int, keys) -> None:
+        """Index row under keys (row must be new or previously deleted)."""
+        row_keys = self._keys_by_row.setdefault(row, set())
+        for key in keys:
+            self._added.setdefault(key, set()).add(row)
+            row_keys.add(key)
+
+    def delete(self, row: int) -> None:
+        """Remove every posting of row."""
+        self._removed.add(row)
+        for key in self._keys_by_row.pop(row, ()):
+            rows = self._added.get(key)
+            if rows is not None:
+                rows.discard(row)
+                if not rows:
+                    del self._added[key]
+
+    def rows(self, key: str) -> List[int]:
+        """Sorted rows indexed under key."""
+        base_rows = self.base.get(key, [])
+        if self.base.unique and base_rows != []:
+            base_rows = [base_rows]
+        rows = [row for row in base_rows if row not in self._removed] if self._removed else list(base_rows)
+        added = self._added.get(key)
+        if added:
+            rows = sorted(set(rows).union(added))
+        return rows
+
+    def rows_with_prefix(self, prefix: str) -> List[int]:
+        """Rows of every key starting with prefix."""
+        rows = {int(row) for row in self.base.rows_with_prefix(prefix) if row not in self._removed}
+        for key, added in self._added.items():
+            if key.startswith(prefix):
+                rows.update(added)
+        return sorted(rows)
+
+    def __getitem__(self, key: str):
+        rows = self.rows(key)
+        if not rows:
+            raise KeyError(key)
+        return rows[-1] if self.unique else rows
+
+    def get(self, key: str, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key) -> bool:
+        return isinstance(key, str) and bool(self.rows(key))
+
+    def keys(self) -> Iterator[str]:
+        for key, _ in self.items():
+            yield key
+
+    def __iter__(self) -> Iterator[str]:
+        return self.keys()
+
+    def __len__(self) -> int:
+        if not self._removed and not self._added:
+            return len(self.base)
+        return sum(1 for _ in self.items())
+
+    def keys_containing(self, text: str) -> Iterator[str]:
+        """Keys containing text as a substring, in the same order as items()."""
+        for key in self.base.keys_containing(text):
+            if (not self._removed and key not in self._added) or self.rows(key):
+                yield key
+        for key in list(self._added):
+            if text in key and key not in self.base:
+                yield key
+
+    def items(self) -> Iterator:
+        for key, base_rows in self.base.items():
+            rows = self.rows(key) if (self._removed or key in self._added) else (
+                [base_rows] if self.base.unique else base_rows)
+            if rows:
+                yield key, (rows[-1] if self.unique else rows)
+        for key in list(self._added):
+            if key not in self.base:
+                rows = sorted(self._added[key])
+                yield key, (rows[-1] if self.unique else rows)
+
+
+def description_words_for(description: str, word_style: str = 'split_upper') -> set:
+    """Distinct index words of one description (same tokens as build_part_indexes)."""
+    text = str(description)
+    if word_style == 'regex_lower':
+        return set(_REGEX_WORD.findall(text.lower()))
+    return {word.strip(WORD_STRIP_CHARS).upper() for word in text.split() if len(word) > 2}
+
+
+class IncrementalPartIndexes:
+    """Exact-match, part-number and description-word indexes that accept row edits."""
+
+    def __init__(self, indexes: Dict[str, MappedPostingIndex], word_style: str = 'split_upper'):
+        self.word_style = word_style
+        self.part_numbers = IncrementalPostingIndex(indexes['part_numbers'])
+        self.parts_by_exact_match = self.part_numbers.unique_view()
+        self.description_words = IncrementalPostingIndex(indexes['description_words'])
+        self.parts_by_keywords = PartKeywordIndex(self.part_numbers, self.description_words)
+
+    @classmethod
+    def build(cls, parts_df: pd.DataFrame, word_style: str = 'split_upper') -> 'IncrementalPartIndexes':
+        """Bulk-build the base indexes for parts_df."""
+        return cls(build_part_indexes(parts_df, word_style), word_style)
+
+    def insert(self, row: int, part_number: str, description: str) -> None:
+        """Index a new (or re-indexed) row."""
+        self.part_numbers.insert(row, [str(part_number).strip().upper()])
+        self.description_words.insert(row, description_words_for(description, self.word_style))
+
+    def delete(self, row: int) -> None:
+        """Drop a row from every index."""
+        self.part_numbers.delete(row)
+        self.description_words.delete(row)
+
+    def update(self, row: int, part_number: str, description: str) -> None:
+        """Re-index a row whose values changed."""
+        self.delete(row)
+        self.insert(row, part_number, description)
+
+    def append_row(self, parts_df: pd.DataFrame, part_number: str, description: str) -> pd.DataFrame:
+        """Append a part to parts_df and index it; returns the new frame."""
+        row = len(parts_df)
+        new_row = pd.DataFrame({'internal_part_number': [part_number], 'description': [description]})
+        parts_df = pd.concat([parts_df, new_row], ignore_index=True)
+        self.insert(row, part_number, description)
+        return parts_df
+
+    def update_row(self, parts_df: pd.DataFrame, row: int, description: str) -> None:
+        """Change a part's description in place and re-index it."""
+        parts_df.iloc[row, parts_df.columns.get_loc('description')] = description
+        self.update(row, parts_df.iloc[row]['internal_part_number'], description)
+
+    def remove_row(self, parts_df: pd.DataFrame, row: int) -> pd.DataFrame:
+        """
+        Remove a part, keeping row positions dense: the last row moves into the hole, so only
+        the removed and the moved row are re-indexed. Returns the new frame.
+        """
+        last = len(parts_df) - 1
+        self.delete(row)
+        if row != last:
+            moved = parts_df.iloc[last]
+            self.delete(last)
+            parts_df.iloc[row] = moved
+            self.insert(row, moved['internal_part_number'], moved['description'])
+        return parts_df.iloc[:last].copy()
+
+
+class SharedCatalogIndexStore:
+    """Builds each catalog version's indexes once per host and maps them in every worker."""
+
+    def __init__(self, base_dir: str = "data/catalog_index"):
+        self.base_dir = base_dir
+        os.makedirs(self.base_dir, exist_ok=True)
+        self._lock_path = os.path.join(self.base_dir, "build.lock")
+
+    def open_or_build(self, version: str, builder: Callable[[], Dict[str, object]],
+                      unique: Optional[List[str]] = None) -> Dict[str, MappedPostingIndex]:
+        """
+        Map the indexes for a catalog version, building them first if no worker has yet.
+
+        Args:
+            version: Catalog version key (see catalog_version_key)
+            builder: Returns {index name: MappedPostingIndex or dict}; only called by the building worker
+            unique: Index names whose values are a single row index
+
+        Returns:
+            {index name: MappedPostingIndex}
+        """
+        unique = set(unique or [])
+        version_dir = self._ensure_built(version, builder, self._write_indexes)
+        with open(os.path.join(version_dir, "manifest.json"), 'r') as f:
+            names = json.load(f)['indexes']
+        return {name: read_posting_index(version_dir, name, unique=name in unique) for name in names}
+
+    def open_or_build_arrays(self, version: str, builder: Callable[[], Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+        """
+        Map a bundle of plain arrays for a catalog version (e.g. a vector index), building it once.
+
+        Args:
+            version: Catalog version key
+            builder: Returns {array name: np.ndarray}; only called by the building worker
+
+        Returns:
+            {array name: read-only memory-mapped array}
+        """
+        version_dir = self._ensure_built(version, builder, self._write_arrays)
+        with open(os.path.join(version_dir, "manifest.json"), 'r') as f:
+            names = json.load(f)['arrays']
+        return {name: np.load(os.path.join(version_dir, f"{name}.npy"), mmap_mode='r') for name in names}
+
+    def _ensure_built(self, version: str, builder: Callable[[], Dict[str, object]],
+                      writer: Callable[[str, Dict[str, object]], Dict[str, object]]) -> str:
+        """Build a version directory under the host-wide lock unless it already exists."""
+        version_dir = os.path.join(self.base_dir, version)
+        if not self._is_complete(version_dir):
+            lock_file = open(self._lock_path, 'a')
+            try:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                if not self._is_complete(version_dir):
+                    self._build(version_dir, builder(), writer)
+                    self._prune_old_versions(keep=version)
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                lock_file.close()
+        return version_dir
+
+    def _is_complete(self, version_dir: str) -> bool:
+        return os.path.exists(os.path.join(version_dir, "manifest.json"))
+
+    def _build(self, version_dir: str, contents: Dict[str, object],
+               writer: Callable[[str, Dict[str, object]], Dict[str, object]]) -> None:
+        """Write everything into a temp dir, then rename it into place."""
+        tmp_dir = f"{version_dir}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        manifest = writer(tmp_dir, contents)
+        manifest['format_version'] = INDEX_FORMAT_VERSION
+        with open(os.path.join(tmp_dir, "manifest.json"), 'w') as f:
+            json.dump(manifest, f)
+        shutil.rmtree(version_dir, ignore_errors=True)
+        os.rename(tmp_dir, version_dir)
+
+    @staticmethod
+    def _write_indexes(directory: str, indexes: Dict[str, object]) -> Dict[str, object]:
+        for name, index in indexes.items():
+            write_posting_index(directory, name, index)
+        return {'indexes': sorted(indexes)}
+
+    @staticmethod
+    def _write_arrays(directory: str, arrays: Dict[str, np.ndarray]) -> Dict[str, object]:
+        for name, array in arrays.items():
+            np.save(os.path.join(directory, f"{name}.npy"), np.asarray(array))
+        return {'arrays': sorted(arrays)}
+
+    def _prune_old_versions(self, keep: str) -> None:
+        """Remove all but the newest KEEP_VERSIONS builds (mapped files stay valid until unmapped)."""
+        versions = []
+        for entry in os.listdir(self.base_dir):
+            path = os.path.join(self.base_dir, entry)
+            if os.path.isdir(path) and not entry.endswith('.tmp'):
+                versions.append((os.path.getmtime(path), entry))
+        for _, entry in sorted(versions, reverse=True)[KEEP_VERSIONS:]:
+            if entry != keep:
+                shutil.rmtree(os.path.join(self.base_dir, entry), ignore_errors=True)
@@ -0,0 +1,193 @@
+"""
+Stage Timing
+Lightweight timing-span API for the processing pipeline. An upload opens a collector with
+collect_timings(); DocumentProcessor, PartNumberMapper and the database managers wrap their
+stages in timing_span() and report LLM calls with record_llm_call(). The collected stage
+durations and LLM call counts are persisted per processing result (stage_timings column).
+"""
+
+import json
+import time
+import threading
+import contextvars
+import functools
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Any, Callable
+
+_current_collector: contextvars.ContextVar = contextvars.ContextVar('stage_timing_collector', default=None)
+
+# Process-wide listeners (e.g. the /metrics registry); called for every span and LLM call,
+# whether or not a collector is active
+_span_listeners: List[Callable[[str, float], None]] = []
+_llm_listeners: List[Callable[[str, Optional[int]], None]] = []
+
+
+class TimingCollector:
+    """Accumulates stage durations and LLM call counts for one processing result."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages: Dict[str, float] = {}
+        self.stage_counts: Dict[str, int] = {}
+        self.llm_calls: Dict[str, int] = {}
+        self.llm_tokens: Dict[str, int] = {}
+        self.started_at = time.perf_counter()
+
+    def add_span(self, stage: str, duration: float) -> None:
+        """Add a finished span (repeated stages accumulate)."""
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + duration
+            self.stage_counts[stage] = self.stage_counts.get(stage, 0) + 1
+
+    def add_llm_call(self, call_site: str, tokens: Optional[int] = None) -> None:
+        """Count one LLM request made from call_site."""
+        with self._lock:
+            self.llm_calls[call_site] = self.llm_calls.get(call_site, 0) + 1
+            if tokens:
+                self.llm_tokens[call_site] = self.llm_tokens.get(call_site, 0) + int(tokens)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serializable summary (durations in seconds)."""
+        with self._lock:
+            return {
+                'stages': {stage: round(duration, 4) for stage, duration in self.stages.items()},
+                'stage_counts': dict(self.stage_counts),
+                'llm_calls': dict(self.llm_calls),
+                'llm_tokens': dict(self.llm_tokens),
+                'total': round(time.perf_counter() - self.started_at, 4)
+            }
+
+    def to_json(self) -> str:
+        """Compact JSON for the stage_timings column."""
+        return json.dumps(self.to_dict(), separators=(',', ':'))
+
+
+@contextmanager
+def collect_timings():
+    """Open a collector for the current request; nested spans report into it."""
+    collector = TimingCollector()
+    token = _current_collector.set(collector)
+    try:
+        yield collector
+    finally:
+        _current_collector.reset(token)
+
+
+def add_span_listener(listener: Callable[[str, float], None]) -> None:
+    """Register listener(stage, duration) for every finished span."""
+    _span_listeners.append(listener)
+
+
+def add_llm_listener(listener: Callable[[str, Optional[int]], None]) -> None:
+    """Register listener(call_site, tokens) for every recorded LLM call."""
+    _llm_listeners.append(listener)
+
+
+def _notify(listeners: List[Callable], *args) -> None:
+    for listener in listeners:
+        try:
+            listener(*args)
+        except Exception as e:
+            print(f"⚠️ Timing listener failed: {e}")
+
+
+def current_collector() -> Optional[TimingCollector]:
+    """Collector for the current context, if any."""
+    return _current_collector.get()
+
+
+@contextmanager
+def timing_span(stage: str):
+    """Time a block as `stage`. A no-op beyond two clock reads when nothing is collecting."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        collector = _current_collector.get()
+        if collector is not None:
+            collector.add_span(stage, duration)
+        if _span_listeners:
+            _notify(_span_listeners, stage, duration)
+
+
+def timed(stage: str) -> Callable:
+    """Decorator form of timing_span."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timing_span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_llm_call(call_site: str, tokens: Optional[int] = None) -> None:
+    """Count an LLM request against the current collector."""
+    collector = _current_collector.get()
+    if collector is not None:
+        collector.add_llm_call(call_site, tokens)
+    if _llm_listeners:
+        _notify(_llm_listeners, call_site, tokens)
+
+
+def run_in_context(func: Callable) -> Callable:
+    """Bind func to the caller's context so executor threads report into the same collector."""
+    context = contextvars.copy_context()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return context.copy().run(func, *args, **kwargs)
+    return wrapper
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Linear-interpolated percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    rank = (len(sorted_values) - 1) * pct / 100.0
+    lower = int(rank)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (rank - lower)
+
+
+def summarize_stage_timings(stage_timings_rows: List[Any]) -> Dict[str, Any]:
+    """
+    Compute p50/p95/p99 per stage from stored stage_timings values.
+
+    Args:
+        stage_timings_rows: stage_timings column values (JSON text or dicts)
+
+    Returns:
+        {'stages': {stage: {'p50', 'p95', 'p99', 'count'}}, 'llm_calls_avg': {call_site: avg}}
+        with durations in seconds
+    """
+    durations: Dict[str, List[float]] = {}
+    llm_calls: Dict[str, List[int]] = {}
+    for raw in stage_timings_rows:
+        try:
+            data = json.loads(raw) if isinstance(raw, str) else (raw or {})
+        except (json.JSONDecodeError, ValueError):
+            continue
+        for stage, duration in data.get('stages', {}).items():
+            durations.setdefault(stage, []).append(float(duration))
+        if 'total' in data:
+            durations.setdefault('total', []).append(float(data['total']))
+        for call_site, count in data.get('llm_calls', {}).items():
+            llm_calls.setdefault(call_site, []).append(int(count))
+
+    summary = {}
+    for stage, values in durations.items():
+        values.sort()
+        summary[stage] = {
+            'p50': round(percentile(values, 50), 3),
+            'p95': round(percentile(values, 95), 3),
+            'p99': round(percentile(values, 99), 3),
+            'count': len(values)
+        }
+    return {
+        'stages': summary,
+        'llm_calls_avg': {site: round(sum(counts) / len(counts), 2) for site, counts in llm_calls.items()}
+    }
@@ -18,10 +18,13 @@ from openai import OpenAI
 from dotenv import load_dotenv
 import requests
 import fitz  # PyMuPDF
+from stage_timing import timing_span, record_llm_call, run_in_context
 
 # Load environment variables
 load_dotenv()
 
+DEFAULT_GEMINI_BASE_URL = "https://generativelanguage.googleapis.com/v1beta"
+
 @dataclass
 class LineItem:
     """Represents a line item from the purchase order."""
@@ -59,26 +62,32 @@ class PurchaseOrderData:
 class DocumentProcessor:
     """Processes various document types to extract purchase order information."""
     
-    def __init__(self, openai_api_key: Optional[str] = None, gemini_api_key: Optional[str] = None):
+    def __init__(self, openai_api_key: Optional[str] = None, gemini_api_key: Optional[str] = None,
+                 openai_base_url: Optional[str] = None, gemini_base_url: Optional[str] = None):
         """
         Initialize the document processor.
         
         Args:
             openai_api_key: OpenAI API key for AI processing
             gemini_api_key: Google Gemini API key for image processing
+            openai_base_url: OpenAI-compatible endpoint (default: OPENAI_BASE_URL, else api.openai.com)
+            gemini_base_url: Gemini API root (default: GEMINI_BASE_URL, else generativelanguage.googleapis.com)
         """
         # Ensure environment variables are loaded
         load_dotenv('config.env')
         
         self.openai_api_key = openai_api_key or os.getenv('OPENAI_API_KEY')
         self.gemini_api_key = gemini_api_key or os.getenv('GEMINI_API_KEY')
+        # Point both at fake_llm_server.py for load and latency testing
+        self.openai_base_url = openai_base_url or os.getenv('OPENAI_BASE_URL') or None
+        self.gemini_base_url = (gemini_base_url or os.getenv('GEMINI_BASE_URL') or DEFAULT_GEMINI_BASE_URL).rstrip('/')
         self.client = None
         self.gemini_model = None
         
         # Initialize OpenAI
         if self.openai_api_key:
             try:
-                self.client = OpenAI(api_key=self.openai_api_key)
+                self.client = OpenAI(api_key=self.openai_api_key, base_url=self.openai_base_url)
             except Exception as e:
                 self.client = None
         
@@ -86,7 +95,7 @@ class DocumentProcessor:
         if self.gemini_api_key:
             try:
                 # Test the API key by making a simple request
-                test_url = f"https://generativelanguage.googleapis.com/v1beta/models?key={self.gemini_api_key}"
+                test_url = f"{self.gemini_base_url}/models?key={self.gemini_api_key}"
                 test_response = requests.get(test_url, timeout=10)
                 if test_response.status_code == 200:
                     self.gemini_model = True  # Flag to indicate Gemini is available
@@ -193,7 +202,7 @@ IMPORTANT: The company in the header/letterhead is the CUSTOMER (who issued the
 Return the complete text content of this document, maintaining the original formatting and structure as much as possible."""
             
             # Prepare the API request
-            url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash-exp:generateContent?key={self.gemini_api_key}"
+            url = f"{self.gemini_base_url}/models/gemini-2.0-flash-exp:generateContent?key={self.gemini_api_key}"
             
             payload = {
                 "contents": [{
@@ -215,6 +224,7 @@ Return the complete text content of this document, maintaining the original form
             
             # Make the API request
             response = requests.post(url, json=payload, headers=headers, timeout=30)
+            record_llm_call('extract_with_gemini_image_ai', self._gemini_token_count(response))
             
             if response.status_code == 200:
                 result = response.json()
@@ -231,6 +241,13 @@ Return the complete text content of this document, maintaining the original form
             # Fall back to OCR
             return self.extract_text_from_image_ocr(file_path)
     
+    def _gemini_token_count(self, response) -> Optional[int]:
+        """Read total token usage from a Gemini REST response (None if unavailable)."""
+        try:
+            return response.json().get('usageMetadata', {}).get('totalTokenCount')
+        except Exception:
+            return None
+    
     def extract_addresses_with_gemini(self, file_path: str) -> Dict[str, str]:
         """
         Extract billing and shipping addresses directly from image using Gemini.
@@ -313,7 +330,7 @@ FORMATTING:
 🚨 If you see KOIKE or ARONSON anywhere, that is the SUPPLIER, NOT the customer billing address!"""
             
             # Prepare the API request
-            url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash-exp:generateContent?key={self.gemini_api_key}"
+            url = f"{self.gemini_base_url}/models/gemini-2.0-flash-exp:generateContent?key={self.gemini_api_key}"
             
             payload = {
                 "contents": [{
@@ -330,6 +347,7 @@ FORMATTING:
             }
             
             response = requests.post(url, json=payload)
+            record_llm_call('extract_addresses_with_gemini', self._gemini_token_count(response))
             result = response.json()
             
             if 'error' in result:
@@ -787,6 +805,7 @@ Text to process:
                         max_tokens=1500,
                         temperature=0.0
                     )
+                    record_llm_call('process_with_ai_parallel', getattr(response.usage, 'total_tokens', None))
                     
                     result_text = response.choices[0].message.content.strip()
                     
@@ -807,7 +826,8 @@ Text to process:
                     print(f"Error in {prompt_type} extraction: {str(e)}")
                     return None
             
-            # Execute all prompts in parallel
+            # Execute all prompts in parallel (bound to this request's timing collector)
+            call_openai = run_in_context(call_openai)
             with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
                 # Submit all three tasks
                 shipping_future = executor.submit(call_openai, shipping_prompt, "shipping")
@@ -1045,6 +1065,7 @@ Text to process:
                 max_tokens=2000,
                 temperature=0.0
             )
+            record_llm_call('process_with_ai_fallback', getattr(response.usage, 'total_tokens', None))
             
             result_text = response.choices[0].message.content.strip()
             
@@ -1546,17 +1567,20 @@ Text to process:
         """
         try:
             # Step 1: Extract text from document
-            text = self.extract_text_from_file(file_path)
+            with timing_span('text_extraction'):
+                text = self.extract_text_from_file(file_path)
             
             if not text or len(text.strip()) < 10:
                 raise ValueError("No meaningful text could be extracted from the document")
             
             # Step 2: Process with AI to get structured data
-            structured_data = self.process_with_ai(text, file_path)
+            with timing_span('ai_extraction'):
+                structured_data = self.process_with_ai(text, file_path)
             
             # Step 2.5: Use Gemini to extract addresses with IMMEDIATE VALIDATION and retry logic
             print("🔍 Using Gemini to extract addresses with validation...")
-            gemini_addresses = self.extract_addresses_with_validation_retry(file_path)
+            with timing_span('address_extraction'):
+                gemini_addresses = self.extract_addresses_with_validation_retry(file_path)
             if gemini_addresses:
                 # Override the addresses with Gemini's validated extraction
                 company_info = structured_data.get('company_info', {})
@@ -1573,14 +1597,15 @@ Text to process:
             structured_data['_file_path'] = file_path
             structured_data['_raw_text'] = text
             
-            # Step 3: Validate the structure (pass raw text and file path for voting mechanism)
-            self.validate_structure(structured_data, raw_text=text, file_path=file_path)
-            
-            # Step 4: Filter out Koike as customer (hardcoded business rule)
-            self.filter_koike_from_customer(structured_data)
-            
-            # Step 5: Extract missing phone numbers from raw text
-            self.extract_phone_from_raw_text(structured_data, text)
+            with timing_span('structure_validation'):
+                # Step 3: Validate the structure (pass raw text and file path for voting mechanism)
+                self.validate_structure(structured_data, raw_text=text, file_path=file_path)
+                
+                # Step 4: Filter out Koike as customer (hardcoded business rule)
+                self.filter_koike_from_customer(structured_data)
+                
+                # Step 5: Extract missing phone numbers from raw text
+                self.extract_phone_from_raw_text(structured_data, text)
             
             # Clean up internal fields before returning
             structured_data.pop('_file_path', None)
@@ -1973,7 +1998,7 @@ FORMATTING:
                 base_prompt += f"\n\n🚨🚨🚨 SUPPLIER CONSTRAINT - Koike/Aronson Policy 🚨🚨🚨\n{constraints['koike_constraint']}"
             
             # Prepare the API request
-            url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash-exp:generateContent?key={self.gemini_api_key}"
+            url = f"{self.gemini_base_url}/models/gemini-2.0-flash-exp:generateContent?key={self.gemini_api_key}"
             
             payload = {
                 "contents": [{
@@ -1996,6 +2021,7 @@ FORMATTING:
             
             # Make API request
             response = requests.post(url, json=payload, timeout=30)
+            record_llm_call('extract_addresses_with_constraints', self._gemini_token_count(response))
             response.raise_for_status()
             
             result = response.json()
@@ -10,9 +10,26 @@ from dataclasses import dataclass
 from fuzzywuzzy import fuzz, process
 import re
 from collections import defaultdict
-import pickle
 import hashlib
 
+from app_metrics import record_cache_access
+from catalog_snapshot import CatalogSnapshot
+from shared_catalog_index import (IncrementalPartIndexes, SharedCatalogIndexStore,
+                                  build_part_indexes, catalog_version_key)
+from part_vector_index import IncrementalVectorIndex, PartVectorIndex, build_vector_arrays
+
+# Bump when the cached tables or index structures change (4: columnar tables + mapped indexes)
+CACHE_VERSION = 4
+
+# Pickle cache files written before CACHE_VERSION 4
+LEGACY_CACHE_FILES = ("parts_indexes.pkl", "customers_data.pkl", "cache_metadata.pkl")
+
+# Source files are hashed in 1 MB chunks when hash verification is enabled
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Nearest descriptions (TF-IDF cosine) re-scored with fuzz.ratio by find_part_by_description
+DESCRIPTION_CANDIDATES = 50
+
 @dataclass
 class Part:
     """Represents a part in the parts database."""
@@ -30,29 +47,35 @@ class Customer:
 class DatabaseManager:
     """Manages parts and customers databases."""
     
-    def __init__(self, parts_db_path: str = "data/parts.csv", customers_db_path: str = "data/customer_list.xlsx"):
+    def __init__(self, parts_db_path: str = "data/parts.csv", customers_db_path: str = "data/customer_list.xlsx",
+                 verify_cache_hash: bool = False):
         """
         Initialize the database manager.
         
         Args:
             parts_db_path: Path to the parts CSV file
             customers_db_path: Path to the customers Excel file
+            verify_cache_hash: When a source file's size or mtime changed, compare content hashes
+                before rebuilding (keeps the cache across copies/checkouts that only touch mtime)
         """
         self.parts_db_path = parts_db_path
         self.customers_db_path = customers_db_path
+        self.verify_cache_hash = verify_cache_hash
         self.parts_df = None
         self.customers_df = None
         
-        # Cache file paths
+        # Cache: cleaned tables in columnar form plus memory-mapped part indexes
         self.cache_dir = "data/cache"
-        self.parts_cache_path = os.path.join(self.cache_dir, "parts_indexes.pkl")
-        self.customers_cache_path = os.path.join(self.cache_dir, "customers_data.pkl")
-        self.cache_metadata_path = os.path.join(self.cache_dir, "cache_metadata.pkl")
+        self.table_cache = CatalogSnapshot(os.path.join(self.cache_dir, "tables"))
+        self.index_store = SharedCatalogIndexStore(os.path.join(self.cache_dir, "part_indexes"))
+        self.vector_store = SharedCatalogIndexStore(os.path.join(self.cache_dir, "part_vectors"))
         
         # Search optimization indexes
         self.parts_by_exact_match = {}  # Exact part number lookup
         self.parts_by_keywords = defaultdict(list)  # Keyword-based lookup
         self.description_words = {}  # Word-based description index
+        self.part_indexes = None  # IncrementalPartIndexes backing the lookups above
+        self.part_vectors = None  # IncrementalVectorIndex over descriptions (None = build on next use)
         
         # Create data directory if it doesn't exist
         os.makedirs(os.path.dirname(parts_db_path), exist_ok=True)
@@ -62,21 +85,32 @@ class DatabaseManager:
     
     def load_databases(self) -> None:
         """Load both parts and customers databases with caching."""
-        # Try to load from cache first
-        if self._load_from_cache():
-            print("Loaded databases from cache")
-            return
+        self._remove_legacy_cache()
         
-        # If cache is invalid or doesn't exist, load from source files
-        print("Loading databases from source files...")
-        self.load_parts_database_from_source()
-        self.load_customers_database()
+        # Each table is cached separately, so editing one source never re-reads the other
+        parts_df = self._load_cached_table('parts', self.parts_db_path)
+        if parts_df is not None:
+            self.parts_df = parts_df
+        else:
+            print("Loading parts database from source file...")
+            self.load_parts_database_from_source()
+            self._save_cached_table('parts', self.parts_df, self.parts_db_path)
         
-        # Build search indexes after loading from source
-        self._build_search_indexes()
+        customers_df = self._load_cached_table('customers', self.customers_db_path)
+        if customers_df is not None:
+            self.customers_df = customers_df
+        else:
+            print("Loading customers database from source file...")
+            self.load_customers_database()
+            self._save_cached_table('customers', self.customers_df, self.customers_db_path)
         
-        # Save to cache for next time
-        self._save_to_cache()
+        cache_hit = parts_df is not None and customers_df is not None
+        record_cache_access('catalog_file_cache', cache_hit)
+        if cache_hit:
+            print("Loaded databases from cache")
+        
+        # Maps the cached indexes for this catalog version, building them on a miss
+        self._build_search_indexes()
     
     def load_parts_database_from_source(self) -> None:
         """Load the parts database from CSV file (without building indexes)."""
@@ -124,92 +158,82 @@ class DatabaseManager:
             self.parts_df = pd.DataFrame(columns=['internal_part_number', 'description'])
     
     def _get_file_hash(self, file_path: str) -> str:
-        """Get MD5 hash of a file for cache invalidation."""
+        """Get a content hash of a file for cache validation."""
         if not os.path.exists(file_path):
             return ""
         
-        hash_md5 = hashlib.md5()
+        file_hash = hashlib.blake2b(digest_size=20)
         with open(file_path, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                hash_md5.update(chunk)
-        return hash_md5.hexdigest()
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                file_hash.update(chunk)
+        return file_hash.hexdigest()
     
-    def _is_cache_valid(self) -> bool:
-        """Check if cache is valid by comparing file hashes."""
-        if not os.path.exists(self.cache_metadata_path):
-            return False
-        
+    def _get_source_stamp(self, file_path: str, with_hash: bool = False) -> Optional[Dict[str, Any]]:
+        """Cheap identity of a source file (size and mtime, optionally its content hash)."""
         try:
-            with open(self.cache_metadata_path, 'rb') as f:
-                metadata = pickle.load(f)
-            
-            # Check if source files have changed
-            parts_hash = self._get_file_hash(self.parts_db_path)
-            customers_hash = self._get_file_hash(self.customers_db_path)
-            
-            return (metadata.get('parts_hash') == parts_hash and 
-                    metadata.get('customers_hash') == customers_hash)
-        except Exception:
-            return False
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        stamp = {
+            'cache_version': CACHE_VERSION,
+            'path': os.path.abspath(file_path),
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns
+        }
+        if with_hash:
+            stamp['hash'] = self._get_file_hash(file_path)
+        return stamp
     
-    def _load_from_cache(self) -> bool:
-        """Load databases from cache if valid."""
-        if not self._is_cache_valid():
-            return False
+    def _load_cached_table(self, table: str, source_path: str) -> Optional[pd.DataFrame]:
+        """
+        Load a cleaned table from the cache if it was built from the current source file.
         
-        try:
-            # Load parts indexes
-            if os.path.exists(self.parts_cache_path):
-                with open(self.parts_cache_path, 'rb') as f:
-                    cache_data = pickle.load(f)
-                    self.parts_by_exact_match = cache_data['parts_by_exact_match']
-                    self.description_words = cache_data['description_words']
-                    # Convert defaultdict back from regular dict
-                    self.parts_by_keywords = defaultdict(list, cache_data['parts_by_keywords'])
-            
-            # Load customers data
-            if os.path.exists(self.customers_cache_path):
-                with open(self.customers_cache_path, 'rb') as f:
-                    cache_data = pickle.load(f)
-                    self.parts_df = cache_data['parts_df']
-                    self.customers_df = cache_data['customers_df']
+        Args:
+            table: 'parts' or 'customers'
+            source_path: CSV/Excel file the table is built from
             
-            return True
-        except Exception as e:
-            print(f"Error loading from cache: {e}")
-            return False
+        Returns:
+            Cached DataFrame, or None when the cache is missing or stale
+        """
+        manifest = self.table_cache.get_manifest(table)
+        cached = (manifest or {}).get('source')
+        current = self._get_source_stamp(source_path)
+        if not cached or current is None:
+            return None
+        if cached.get('cache_version') != CACHE_VERSION or cached.get('path') != current['path']:
+            return None
+        
+        same_stat = cached.get('size') == current['size'] and cached.get('mtime_ns') == current['mtime_ns']
+        if not same_stat:
+            # Only worth hashing when the size still matches (e.g. a fresh checkout or copy)
+            if not (self.verify_cache_hash and cached.get('hash') and cached.get('size') == current['size']):
+                return None
+            current['hash'] = self._get_file_hash(source_path)
+            if current['hash'] != cached['hash']:
+                return None
+        
+        df, _ = self.table_cache.load(table)
+        if df is not None and not same_stat:
+            # Content unchanged: re-stamp so the next start skips the hash
+            self.table_cache.save(table, df, None, source=current)
+        return df
     
-    def _save_to_cache(self) -> None:
-        """Save databases to cache."""
-        try:
-            # Save parts indexes
-            cache_data = {
-                'parts_by_exact_match': self.parts_by_exact_match,
-                'description_words': self.description_words,
-                'parts_by_keywords': dict(self.parts_by_keywords)  # Convert defaultdict to dict
-            }
-            with open(self.parts_cache_path, 'wb') as f:
-                pickle.dump(cache_data, f)
-            
-            # Save customers data
-            cache_data = {
-                'parts_df': self.parts_df,
-                'customers_df': self.customers_df
-            }
-            with open(self.customers_cache_path, 'wb') as f:
-                pickle.dump(cache_data, f)
-            
-            # Save metadata with file hashes
-            metadata = {
-                'parts_hash': self._get_file_hash(self.parts_db_path),
-                'customers_hash': self._get_file_hash(self.customers_db_path)
-            }
-            with open(self.cache_metadata_path, 'wb') as f:
-                pickle.dump(metadata, f)
-            
-            print("Cached databases saved successfully")
-        except Exception as e:
-            print(f"Error saving to cache: {e}")
+    def _save_cached_table(self, table: str, df: Optional[pd.DataFrame], source_path: str) -> None:
+        """Write a cleaned table to the cache, stamped with the source file it came from."""
+        stamp = self._get_source_stamp(source_path, with_hash=self.verify_cache_hash)
+        if df is None or stamp is None:
+            return
+        self.table_cache.save(table, df, None, source=stamp)
+    
+    def _remove_legacy_cache(self) -> None:
+        """Delete pickle caches from before CACHE_VERSION 4."""
+        for file_name in LEGACY_CACHE_FILES:
+            path = os.path.join(self.cache_dir, file_name)
+            if os.path.exists(path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
     
     def load_customers_database(self) -> None:
         """Load the customers database from Excel file."""
@@ -272,34 +296,37 @@ class DatabaseManager:
         
         print("Building search indexes for faster lookups...")
         
-        # Clear existing indexes
-        self.parts_by_exact_match.clear()
-        self.parts_by_keywords.clear()
-        self.description_words.clear()
-        
-        for idx, row in self.parts_df.iterrows():
-            part_number = row['internal_part_number']
-            description = row['description'].lower()
-            
-            # Exact part number lookup (for direct matches)
-            self.parts_by_exact_match[part_number.upper()] = Part(
-                internal_part_number=part_number,
-                description=row['description']
-            )
-            
-            # Extract keywords from description for faster searching
-            # Split on common separators and clean
-            words = re.findall(r'\b[a-zA-Z0-9]{2,}\b', description)
-            
-            for word in words:
-                word_clean = word.lower().strip()
-                if len(word_clean) >= 2:  # Skip very short words
-                    if word_clean not in self.description_words:
-                        self.description_words[word_clean] = []
-                    self.description_words[word_clean].append(idx)
+        # Exact part number -> row position, and lower-case description word -> row positions.
+        # Built once per catalog version and memory-mapped from the cache afterwards.
+        parts_df = self.parts_df
+        version = catalog_version_key(parts_df[['internal_part_number', 'description']])
+        indexes = self.index_store.open_or_build(
+            version, lambda: build_part_indexes(parts_df, word_style='regex_lower'),
+            unique=['parts_by_exact_match']
+        )
+        self.part_indexes = IncrementalPartIndexes(indexes, word_style='regex_lower')
+        self._bind_part_indexes()
+        
+        # Description vectors for description-only line items
+        arrays = self.vector_store.open_or_build_arrays(version, lambda: build_vector_arrays(parts_df['description']))
+        self.part_vectors = IncrementalVectorIndex(PartVectorIndex(arrays, len(parts_df)))
         
         print(f"Indexed {len(self.parts_by_exact_match)} parts with {len(self.description_words)} unique keywords")
     
+    def _bind_part_indexes(self) -> None:
+        """Point the lookup attributes at the current incremental indexes."""
+        self.parts_by_exact_match = self.part_indexes.parts_by_exact_match
+        self.description_words = self.part_indexes.description_words
+        self.parts_by_keywords = defaultdict(list)
+    
+    def _part_at(self, position: int) -> Part:
+        """Build a Part for a row position from the exact-match index."""
+        row = self.parts_df.iloc[position]
+        return Part(
+            internal_part_number=row['internal_part_number'],
+            description=row['description']
+        )
+    
     def find_part_by_exact_number(self, part_number: str) -> Optional[Part]:
         """Find part by exact part number match (fastest lookup)."""
         if not part_number:
@@ -308,35 +335,69 @@ class DatabaseManager:
         # Try exact match first (case insensitive)
         part_upper = part_number.upper().strip()
         if part_upper in self.parts_by_exact_match:
-            return self.parts_by_exact_match[part_upper]
+            return self._part_at(self.parts_by_exact_match[part_upper])
         
         # Simple KOI prefix removal: "KOI 30623" -> "30623" or "ΚΟΙ 30623" -> "30623"
         if part_upper.startswith(('KOI ', 'ΚΟΙ ')):  # Handle both Latin and Greek characters
             simple_number = part_upper[4:].strip()  # Remove "KOI " or "ΚΟΙ "
             if simple_number and simple_number in self.parts_by_exact_match:
                 print(f"Simple KOI prefix removal: '{part_upper}' -> '{simple_number}'")
-                return self.parts_by_exact_match[simple_number]
+                return self._part_at(self.parts_by_exact_match[simple_number])
         
         # Try Koike part number transformations: "KOIZA323-2050" -> "ZA3232050"
         koike_transformed = self._transform_koike_part_number(part_upper)
         if koike_transformed and koike_transformed in self.parts_by_exact_match:
             print(f"Koike transformation match: '{part_upper}' -> '{koike_transformed}'")
-            return self.parts_by_exact_match[koike_transformed]
+            return self._part_at(self.parts_by_exact_match[koike_transformed])
         
         # Try partial matches for cases like "ZA3232062" vs "3232062" or "KOI KJ12250013" vs "KJ12250013"
-        for stored_part, part_obj in self.parts_by_exact_match.items():
-            # More precise partial matching - require substantial overlap
-            if len(part_upper) > 3 and len(stored_part) > 3:
-                # Check if one is a prefix/suffix of the other with significant overlap
-                if (stored_part in part_upper and len(stored_part) >= len(part_upper) * 0.6) or \
-                   (part_upper in stored_part and len(part_upper) >= len(stored_part) * 0.6):
-                    # Additional check: ensure it's not just a small number contained in a larger string
-                    if len(stored_part) >= 5 or len(part_upper) >= 5:  # Avoid matching single digits
-                        print(f"Partial match found: '{part_upper}' matches '{stored_part}'")
-                        return part_obj
+        stored_part = self._find_partial_part_number(part_upper)
+        if stored_part:
+            print(f"Partial match found: '{part_upper}' matches '{stored_part}'")
+            return self._part_at(self.parts_by_exact_match[stored_part])
         
         return None
     
+    def _find_partial_part_number(self, part_upper: str) -> Optional[str]:
+        """
+        Stored part number that contains, or is contained in, part_upper with substantial overlap.
+        
+        Instead of scanning every key, candidates come from the two directions of the match:
+        substrings of part_upper are looked up directly (bisect on the sorted keys), and keys
+        containing part_upper come from one byte search over the index's key blob.
+        
+        Args:
+            part_upper: Upper-cased, stripped part number
+            
+        Returns:
+            The first matching stored part number in key order, or None
+        """
+        if len(part_upper) <= 3:
+            return None
+        
+        def overlaps(stored_part: str) -> bool:
+            # More precise partial matching - require substantial overlap
+            if len(stored_part) <= 3:
+                return False
+            # Check if one is a prefix/suffix of the other with significant overlap
+            if (stored_part in part_upper and len(stored_part) >= len(part_upper) * 0.6) or \
+               (part_upper in stored_part and len(part_upper) >= len(stored_part) * 0.6):
+                # Additional check: ensure it's not just a small number contained in a larger string
+                return len(stored_part) >= 5 or len(part_upper) >= 5  # Avoid matching single digits
+            return False
+        
+        if not hasattr(self.parts_by_exact_match, 'keys_containing'):
+            return next((stored for stored in self.parts_by_exact_match if overlaps(stored)), None)
+        
+        matches = {
+            part_upper[start:start + length]
+            for length in range(4, len(part_upper) + 1)
+            for start in range(len(part_upper) - length + 1)
+        }
+        matches = {stored for stored in matches if overlaps(stored) and stored in self.parts_by_exact_match}
+        matches.update(stored for stored in self.parts_by_exact_match.keys_containing(part_upper) if overlaps(stored))
+        return min(matches) if matches else None
+    
     def _normalize_company_name(self, company_name: str) -> str:
         """
         Normalize company name by removing common company type indicators.
@@ -401,6 +462,9 @@ class DatabaseManager:
         """
         Find internal part number by matching description using optimized search.
         
+        The nearest descriptions by TF-IDF cosine are re-scored with fuzz.ratio, so the
+        threshold keeps its meaning without a fuzzy scan over the whole catalog.
+        
         Args:
             description: Description to search for
             threshold: Minimum similarity score (0-100)
@@ -414,52 +478,37 @@ class DatabaseManager:
         if not description or description.strip() == '':
             return None
         
-        # First, try keyword-based pre-filtering for speed
-        description_lower = description.lower()
-        description_words = re.findall(r'\b[a-zA-Z0-9]{2,}\b', description_lower)
+        candidates = self.find_similar_parts(description, top_n=DESCRIPTION_CANDIDATES)
+        if not candidates:
+            return None
         
-        candidate_indices = set()
+        match = process.extractOne(description, [part.description for part, _ in candidates], scorer=fuzz.ratio)
+        if match and match[1] >= threshold:
+            return next(part for part, _ in candidates if part.description == match[0])
         
-        # Find parts that contain matching keywords
-        for word in description_words:
-            if word in self.description_words:
-                candidate_indices.update(self.description_words[word])
+        return None
+    
+    def find_similar_parts(self, text: str, top_n: int = 3, min_score: float = 0.0) -> List[Tuple[Part, float]]:
+        """
+        Parts whose descriptions are most similar to text (character n-gram TF-IDF, offline).
         
-        # If we have candidates, search only among them (much faster)
-        if candidate_indices:
-            candidate_descriptions = []
-            candidate_indices_list = list(candidate_indices)
-            
-            for idx in candidate_indices_list:
-                if idx < len(self.parts_df):
-                    candidate_descriptions.append(self.parts_df.iloc[idx]['description'])
+        Args:
+            text: Description (optionally with the external part number)
+            top_n: Number of parts to return
+            min_score: Minimum cosine similarity (0-1)
             
-            if candidate_descriptions:
-                # Fuzzy match only among candidates
-                match = process.extractOne(description, candidate_descriptions, scorer=fuzz.ratio)
-                
-                if match and match[1] >= threshold:
-                    # Find the original row
-                    matching_row = self.parts_df[self.parts_df['description'] == match[0]].iloc[0]
-                    return Part(
-                        internal_part_number=matching_row['internal_part_number'],
-                        description=matching_row['description']
-                    )
+        Returns:
+            List of (Part, similarity) best first
+        """
+        if self.parts_df is None or self.parts_df.empty or not text:
+            return []
         
-        # Fallback to full search if no keyword matches (but with higher threshold)
-        if threshold <= 85:  # Only do full search for high-confidence requests
-            print(f"Performing full database search for: {description[:50]}...")
-            descriptions = self.parts_df['description'].tolist()
-            match = process.extractOne(description, descriptions, scorer=fuzz.ratio)
-            
-            if match and match[1] >= threshold:
-                matching_row = self.parts_df[self.parts_df['description'] == match[0]].iloc[0]
-                return Part(
-                    internal_part_number=matching_row['internal_part_number'],
-                    description=matching_row['description']
-                )
+        if self.part_vectors is None:
+            # Search indexes were never built for this frame
+            self.part_vectors = IncrementalVectorIndex.build(self.parts_df)
         
-        return None
+        return [(self._part_at(row), score)
+                for row, score in self.part_vectors.top_k(text, k=top_n, min_score=min_score)]
     
     def find_customer_by_company_name(self, company_name: str, billing_address: str = "", threshold: int = 85) -> Optional[Customer]:
         """
@@ -713,7 +762,7 @@ class DatabaseManager:
                 print("  No OpenAI API key found, skipping LLM comparison")
                 return None
             
-            client = OpenAI(api_key=openai_api_key)
+            client = OpenAI(api_key=openai_api_key, base_url=os.getenv('OPENAI_BASE_URL') or None)
             
             # Build candidate list with company names for each address
             candidates_list = []
@@ -835,7 +884,7 @@ REASONING: [brief explanation]"""
                 print("No OpenAI API key found, skipping LLM matching")
                 return None
             
-            client = OpenAI(api_key=openai_api_key)
+            client = OpenAI(api_key=openai_api_key, base_url=os.getenv('OPENAI_BASE_URL') or None)
             
             # Get top 30 fuzzy matches as candidates for LLM to evaluate
             # Using more candidates gives LLM better context to choose from
@@ -1070,7 +1119,7 @@ CONFIDENCE: 0"""
                 print("No OpenAI API key found, skipping LLM matching")
                 return None, 0.0
             
-            client = OpenAI(api_key=openai_api_key)
+            client = OpenAI(api_key=openai_api_key, base_url=os.getenv('OPENAI_BASE_URL') or None)
             
             # Get top 10 fuzzy matches as candidates for LLM to evaluate
             candidates = process.extract(search_name, company_names, scorer=fuzz.ratio, limit=10)
@@ -1290,18 +1339,74 @@ REASONING: No suitable match found"""
                 print(f"Part {internal_part_number} already exists")
                 return False
             
-            # Add new part
-            new_part = pd.DataFrame({
-                'internal_part_number': [internal_part_number],
-                'description': [description]
-            })
-            self.parts_df = pd.concat([self.parts_df, new_part], ignore_index=True)
+            # Add new part and index just that row
+            if self.part_indexes is None:
+                new_part = pd.DataFrame({
+                    'internal_part_number': [internal_part_number],
+                    'description': [description]
+                })
+                self.parts_df = pd.concat([self.parts_df, new_part], ignore_index=True)
+                self._build_search_indexes()
+            else:
+                self.parts_df = self.part_indexes.append_row(self.parts_df, internal_part_number, description)
+                if self.part_vectors is not None:
+                    self.part_vectors.append_row(description)
             
             return True
         except Exception as e:
             print(f"Error adding part: {e}")
             return False
     
+    def update_part(self, internal_part_number: str, description: str) -> bool:
+        """
+        Change a part's description and re-index only that row.
+        
+        Args:
+            internal_part_number: Internal part number (case insensitive)
+            description: New description
+            
+        Returns:
+            True if updated, False if the part does not exist
+        """
+        try:
+            position = self.parts_by_exact_match.get(str(internal_part_number).strip().upper())
+            if position is None:
+                print(f"Part {internal_part_number} not found")
+                return False
+            
+            self.part_indexes.update_row(self.parts_df, position, description)
+            if self.part_vectors is not None:
+                self.part_vectors.update_row(position, description)
+            return True
+        except Exception as e:
+            print(f"Error updating part: {e}")
+            return False
+    
+    def delete_part(self, internal_part_number: str) -> bool:
+        """
+        Remove a part; only the removed row (and the row moved into its slot) are re-indexed.
+        
+        Args:
+            internal_part_number: Internal part number (case insensitive)
+            
+        Returns:
+            True if removed, False if the part does not exist
+        """
+        try:
+            position = self.parts_by_exact_match.get(str(internal_part_number).strip().upper())
+            if position is None:
+                print(f"Part {internal_part_number} not found")
+                return False
+            
+            self.parts_df = self.part_indexes.remove_row(self.parts_df, position)
+            if self.part_vectors is not None:
+                moved = self.parts_df.iloc[position]['description'] if position < len(self.parts_df) else None
+                self.part_vectors.remove_row(position, moved)
+            return True
+        except Exception as e:
+            print(f"Error deleting part: {e}")
+            return False
+    
     def add_customer(self, company_name: str, account_number: str) -> bool:
         """
         Add a new customer to the database.
@@ -9,6 +9,7 @@ from collections import defaultdict
 from typing import List, Dict, Optional, Tuple
 from dataclasses import dataclass
 from database_config import db_config
+from shared_catalog_index import IncrementalPartIndexes
 
 @dataclass
 class Part:
@@ -39,6 +40,7 @@ class SupabaseDatabaseManager:
         self.parts_by_exact_match = {}  # Exact part number lookup
         self.parts_by_keywords = defaultdict(list)  # Keyword-based lookup
         self.description_words = {}  # Word-based description index
+        self.part_indexes = None  # IncrementalPartIndexes backing the lookups above
         
         self.load_databases()
     
@@ -114,50 +116,11 @@ class SupabaseDatabaseManager:
     def _build_search_indexes(self) -> None:
         """Build search indexes for efficient lookups."""
         if self.parts_df is not None and not self.parts_df.empty:
-            # Build exact match index
-            self.parts_by_exact_match = {}
-            for idx, row in self.parts_df.iterrows():
-                part_num = str(row['internal_part_number']).strip().upper()
-                self.parts_by_exact_match[part_num] = idx
-            
-            # Build keyword index
-            self.parts_by_keywords = defaultdict(list)
-            self.description_words = {}
-            
-            for idx, row in self.parts_df.iterrows():
-                part_num = str(row['internal_part_number']).strip()
-                description = str(row['description']).strip()
-                
-                # Add to keyword index
-                keywords = self._extract_keywords(part_num, description)
-                for keyword in keywords:
-                    self.parts_by_keywords[keyword].append(idx)
-                
-                # Add to description words index
-                words = self._extract_words(description)
-                for word in words:
-                    if word not in self.description_words:
-                        self.description_words[word] = []
-                    self.description_words[word].append(idx)
-    
-    def _extract_keywords(self, part_number: str, description: str) -> List[str]:
-        """Extract searchable keywords from part number and description."""
-        keywords = set()
-        
-        # Add part number variations
-        keywords.add(part_number.upper())
-        keywords.add(part_number.lower())
-        
-        # Add description words
-        words = self._extract_words(description)
-        keywords.update(words)
-        
-        # Add partial part numbers
-        if len(part_number) > 3:
-            for i in range(3, len(part_number) + 1):
-                keywords.add(part_number[:i].upper())
-        
-        return list(keywords)
+            self.part_indexes = IncrementalPartIndexes.build(self.parts_df)
+            self.parts_by_exact_match = self.part_indexes.parts_by_exact_match
+            self.description_words = self.part_indexes.description_words
+            # Keyword lookups (including part-number prefixes) bisect the sorted part numbers
+            self.parts_by_keywords = self.part_indexes.parts_by_keywords
     
     def _extract_words(self, text: str) -> List[str]:
         """Extract individual words from text for indexing."""
@@ -316,15 +279,26 @@ class SupabaseDatabaseManager:
         return None
     
     def add_part(self, part_number: str, description: str) -> bool:
-        """Add a new part to the database."""
+        """Add (or update) a part; only the changed row is re-indexed."""
         try:
             if db_config.is_postgres:
-                sql = "INSERT INTO parts (part_number, description) VALUES (%s, %s) ON CONFLICT (part_number) DO UPDATE SET description = EXCLUDED.description"
-                db_config.execute_raw_sql(sql, (part_number, description))
+                sql = """
+                    INSERT INTO parts (part_number, description) VALUES (:part_number, :description)
+                    ON CONFLICT (part_number) DO UPDATE SET description = EXCLUDED.description, updated_at = NOW()
+                """
+                db_config.execute_write_sql(sql, {'part_number': part_number, 'description': description})
                 
-                # Reload the database to update indexes
-                self.load_parts_database()
-                self._build_search_indexes()
+                position = self.parts_by_exact_match.get(str(part_number).strip().upper())
+                if position is not None:
+                    self.part_indexes.update_row(self.parts_df, position, description)
+                elif self.part_indexes is not None:
+                    self.parts_df = self.part_indexes.append_row(self.parts_df, part_number, description)
+                else:
+                    self.parts_df = pd.concat([self.parts_df, pd.DataFrame({
+                        'internal_part_number': [part_number],
+                        'description': [description]
+                    })], ignore_index=True)
+                    self._build_search_indexes()
                 return True
             else:
                 print("⚠️ Cannot add parts - not using PostgreSQL")
@@ -333,15 +307,54 @@ class SupabaseDatabaseManager:
             print(f"❌ Error adding part: {e}")
             return False
     
+    def delete_part(self, part_number: str) -> bool:
+        """Delete a part; only the removed row (and the row moved into its slot) are re-indexed."""
+        try:
+            if db_config.is_postgres:
+                position = self.parts_by_exact_match.get(str(part_number).strip().upper())
+                if position is None:
+                    print(f"⚠️ Part {part_number} not found")
+                    return False
+                
+                stored_part_number = self.parts_df.iloc[position]['internal_part_number']
+                db_config.execute_write_sql("DELETE FROM parts WHERE part_number = :part_number",
+                                            {'part_number': stored_part_number})
+                self.parts_df = self.part_indexes.remove_row(self.parts_df, position)
+                return True
+            else:
+                print("⚠️ Cannot delete parts - not using PostgreSQL")
+                return False
+        except Exception as e:
+            print(f"❌ Error deleting part: {e}")
+            return False
+    
     def add_customer(self, account_number: str, company_name: str, address: str = "", state: str = "") -> bool:
-        """Add a new customer to the database."""
+        """Add (or update) a customer and apply the change to customers_df in place."""
         try:
             if db_config.is_postgres:
-                sql = "INSERT INTO customers (customer_id, company_name, address, state_prov) VALUES (%s, %s, %s, %s) ON CONFLICT (customer_id) DO UPDATE SET company_name = EXCLUDED.company_name, address = EXCLUDED.address, state_prov = EXCLUDED.state_prov"
-                db_config.execute_raw_sql(sql, (int(account_number), company_name, address, state))
+                sql = """
+                    INSERT INTO customers (customer_id, company_name, address, state_prov)
+                    VALUES (:customer_id, :company_name, :address, :state_prov)
+                    ON CONFLICT (customer_id) DO UPDATE SET company_name = EXCLUDED.company_name,
+                        address = EXCLUDED.address, state_prov = EXCLUDED.state_prov, updated_at = NOW()
+                """
+                db_config.execute_write_sql(sql, {
+                    'customer_id': int(account_number),
+                    'company_name': company_name,
+                    'address': address,
+                    'state_prov': state
+                })
                 
-                # Reload the database to update indexes
-                self.load_customers_database()
+                account_number = str(int(account_number))
+                values = {'company_name': company_name, 'address': address, 'state': state}
+                matches = self.customers_df.index[self.customers_df['account_number'] == account_number]
+                if len(matches):
+                    for column, value in values.items():
+                        self.customers_df.loc[matches[0], column] = value
+                else:
+                    new_customer = pd.DataFrame([{'account_number': account_number, 'city': '',
+                                                  'postal_code': '', 'country': '', **values}])
+                    self.customers_df = pd.concat([self.customers_df, new_customer], ignore_index=True)
                 return True
             else:
                 print("⚠️ Cannot add customers - not using PostgreSQL")
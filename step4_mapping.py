@@ -8,6 +8,10 @@ import json
 from typing import Dict, List, Optional, Any
 from dataclasses import dataclass, asdict
 from step3_databases import DatabaseManager, Part, Customer
+from stage_timing import timing_span, record_llm_call
+
+# Minimum description similarity (0-100) for a description-only line item to be proposed for review
+SEMANTIC_MATCH_MIN_CONFIDENCE = 60
 
 @dataclass
 class MappedLineItem:
@@ -70,6 +74,7 @@ class PartNumberMapper:
         
         self.db_manager = db_manager or DatabaseManager()
         self.openai_api_key = openai_api_key or os.getenv('OPENAI_API_KEY')
+        self.openai_base_url = os.getenv('OPENAI_BASE_URL') or None  # e.g. fake_llm_server.py
         self.mapping_stats = {
             "parts_processed": 0,
             "parts_mapped": 0,
@@ -144,8 +149,19 @@ class PartNumberMapper:
                     from fuzzywuzzy import fuzz
                     confidence = fuzz.ratio(description.lower(), matching_part.description.lower())
                 else:
-                    matching_part = None
-                    confidence = 0.0
+                    # Nearest descriptions by character n-gram similarity (tolerates abbreviations and typos);
+                    # shaped like fuzzy_candidates so the review branches below offer them as suggestions
+                    fuzzy_candidates = [
+                        {'internal_part_number': c['internal_part_number'], 'fuzzy_score': c['confidence'], 'part': c['part']}
+                        for c in self._ai_similarity_search(description, top_n=3)
+                    ]
+                    if fuzzy_candidates and fuzzy_candidates[0]['fuzzy_score'] >= SEMANTIC_MATCH_MIN_CONFIDENCE:
+                        # Never auto-map on similarity alone: cap below the 95 auto-select threshold
+                        matching_part = fuzzy_candidates[0]['part']
+                        confidence = min(fuzzy_candidates[0]['fuzzy_score'], 94.0)
+                    else:
+                        matching_part = None
+                        confidence = 0.0
             else:
                 matching_part = None
                 confidence = 0.0
@@ -465,7 +481,7 @@ class PartNumberMapper:
                 openai_key = os.getenv('OPENAI_API_KEY')
                 if not openai_key:
                     raise Exception("No OpenAI API key")
-                client = OpenAI(api_key=openai_key)
+                client = OpenAI(api_key=openai_key, base_url=os.getenv('OPENAI_BASE_URL') or None)
             except Exception:
                 client = None
                 print("No OpenAI client available, using fuzzy score as confidence")
@@ -483,6 +499,7 @@ class PartNumberMapper:
                 max_tokens=500,
                 temperature=0  # Deterministic
             )
+            record_llm_call('_llm_select_best_part', getattr(response.usage, 'total_tokens', None))
             
             result_text = response.choices[0].message.content.strip()
             
@@ -567,9 +584,10 @@ class PartNumberMapper:
             primary_term = search_terms[0] if search_terms else None
             
             if primary_term:
-                # Fast text search using pandas
-                matching_rows = self.db_manager.parts_df[
-                    self.db_manager.parts_df['description'].str.contains(primary_term, case=False, na=False)
+                # Fast text search using pandas (one frame reference; a catalog reload may swap it)
+                parts_df = self.db_manager.parts_df
+                matching_rows = parts_df[
+                    parts_df['description'].str.contains(primary_term, case=False, na=False)
                 ]
                 
                 all_matches = []
@@ -595,11 +613,29 @@ class PartNumberMapper:
         return candidates
     
     def _ai_similarity_search(self, combined_description: str, top_n: int = 3) -> List[Dict[str, Any]]:
-        """AI-powered semantic similarity search for part matching."""
-        # This would use OpenAI embeddings for semantic search
-        # For now, return empty to use keyword fallback
-        print("AI similarity search not yet implemented, using keyword fallback")
-        return []
+        """
+        Offline similarity search over part descriptions (character n-gram TF-IDF vectors).
+        
+        Args:
+            combined_description: Line item description (optionally with the external part number)
+            top_n: Number of candidates to return
+            
+        Returns:
+            Candidates with internal_part_number, description, confidence (0-100) and part
+        """
+        if not hasattr(self.db_manager, 'find_similar_parts'):
+            return []
+        try:
+            similar_parts = self.db_manager.find_similar_parts(combined_description, top_n=top_n)
+        except Exception as e:
+            print(f"⚠️ Similarity search failed: {e}")
+            return []
+        return [{
+            'internal_part_number': part.internal_part_number,
+            'description': part.description,
+            'confidence': round(score * 100, 1),
+            'part': part
+        } for part, score in similar_parts]
     
     def lookup_customer_account(self, company_info: Dict[str, Any], confidence_threshold: int = 85) -> MappedCompanyInfo:
         """
@@ -840,20 +876,22 @@ class PartNumberMapper:
         }
         
         # Process company information
-        mapped_company_info = self.lookup_customer_account(
-            po_data.get('company_info', {}), 
-            customer_confidence_threshold
-        )
+        with timing_span('customer_lookup'):
+            mapped_company_info = self.lookup_customer_account(
+                po_data.get('company_info', {}), 
+                customer_confidence_threshold
+            )
         
         # Process line items (filter out shipping/handling charges)
         mapped_line_items = []
-        for line_item in po_data.get('line_items', []):
-            # Skip shipping and handling charges - they don't have part numbers
-            if self._is_shipping_charge(line_item):
-                continue
-                
-            mapped_item = self.map_line_item(line_item, part_confidence_threshold)
-            mapped_line_items.append(mapped_item)
+        with timing_span('part_mapping'):
+            for line_item in po_data.get('line_items', []):
+                # Skip shipping and handling charges - they don't have part numbers
+                if self._is_shipping_charge(line_item):
+                    continue
+                    
+                mapped_item = self.map_line_item(line_item, part_confidence_threshold)
+                mapped_line_items.append(mapped_item)
         
         # Create processing summary
         processing_summary = {
@@ -973,7 +1011,7 @@ class PartNumberMapper:
             if not self.openai_api_key:
                 raise Exception("No OpenAI API key available")
             
-            client = OpenAI(api_key=self.openai_api_key)
+            client = OpenAI(api_key=self.openai_api_key, base_url=self.openai_base_url)
             
             prompt = f"""
 Parse this shipping address into its components. Return ONLY valid JSON with no additional text.
@@ -1015,6 +1053,7 @@ Parse this address:
                 max_tokens=200,
                 temperature=0.0
             )
+            record_llm_call('_llm_parse_address', getattr(response.usage, 'total_tokens', None))
             
             result_text = response.choices[0].message.content.strip()
             
@@ -1185,7 +1224,8 @@ Parse this address:
             Dictionary in Epicor format
         """
         # Always use unvalidated format - it handles MISSING fields properly
-        return self._generate_epicor_format_unvalidated(mapped_data)
+        with timing_span('epicor_export'):
+            return self._generate_epicor_format_unvalidated(mapped_data)
     
     def _generate_epicor_format_unvalidated(self, mapped_data: MappedPurchaseOrderData) -> Dict[str, Any]:
         """
@@ -1300,7 +1340,7 @@ Parse this address:
             # Export in custom format to allow manual review items
             json_data = self.export_to_json(mapped_data)
             with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(json_data, f, indent=2, ensure_ascii=False)
+                json.dump(json_data, f, separators=(',', ':'), ensure_ascii=False)  # Compact: machine-read only
             return True
         except Exception as e:
             print(f"Error saving mapped data: {e}")
@@ -2140,6 +2180,7 @@ Parse this address:
                 max_tokens=1000,
                 temperature=0.0
             )
+            record_llm_call('_llm_select_best_customer', getattr(response.usage, 'total_tokens', None))
             
             result_text = response.choices[0].message.content.strip()
             
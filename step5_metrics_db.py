@@ -86,6 +86,15 @@ class MetricsDatabase:
         self.db_path = db_path
         self.init_database()
     
+    def ping(self) -> bool:
+        """Check that the database file can be opened and queried."""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.execute("SELECT 1")
+            return True
+        except sqlite3.Error:
+            return False
+    
     def init_database(self):
         """Initialize the metrics database with required tables."""
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
@@ -161,6 +170,13 @@ class MetricsDatabase:
                 # Column already exists, ignore the error
                 pass
             
+            # Add stage_timings column if it doesn't exist (migration)
+            try:
+                cursor.execute("ALTER TABLE processing_results ADD COLUMN stage_timings TEXT NOT NULL DEFAULT '{}'")
+            except sqlite3.OperationalError:
+                # Column already exists, ignore the error
+                pass
+            
             conn.commit()
     
     def create_processing_result(self, 
@@ -394,6 +410,20 @@ class MetricsDatabase:
                 'max_processing_time': round(time_stats[2], 2) if time_stats[2] else 0
             }
     
+    def get_stage_latency_percentiles(self, limit: int = 500) -> Dict[str, Any]:
+        """Get p50/p95/p99 per pipeline stage over the most recent processing results."""
+        from stage_timing import summarize_stage_timings
+        
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT stage_timings FROM processing_results
+                WHERE stage_timings != '{}'
+                ORDER BY created_at DESC
+                LIMIT ?
+            ''', (limit,))
+            return summarize_stage_timings([row[0] for row in cursor.fetchall()])
+    
     def delete_processing_result(self, result_id: int) -> bool:
         """Delete a processing result from the database."""
         try:
@@ -10,6 +10,7 @@ from typing import Dict, List, Optional, Any, Tuple
 from dataclasses import dataclass, asdict
 from enum import Enum
 from database_config import db_config
+from json_payload_codec import encode_json_payload, decode_json_payload
 
 class ProcessingStatus(Enum):
     PENDING = "pending"
@@ -135,7 +136,7 @@ class MetricsDatabase:
                 'missing_info_count': result.missing_info_count,
                 'processed_file_path': result.processed_file_path,
                 'epicor_json_path': result.epicor_json_path,
-                'raw_json_data': result.raw_json_data,
+                'raw_json_data': encode_json_payload(result.raw_json_data),
                 'notes': result.notes,
                 'created_at': result.created_at,
                 'updated_at': result.updated_at
@@ -227,7 +228,7 @@ class MetricsDatabase:
                     missing_info_count=row[21] or 0,
                     processed_file_path=row[22] or '',
                     epicor_json_path=row[23],
-                    raw_json_data=row[24] or '',
+                    raw_json_data=decode_json_payload(row[24]),
                     notes=row[25] or '',
                     created_at=row[26],
                     updated_at=row[27]
@@ -281,7 +282,7 @@ class MetricsDatabase:
                     missing_info_count=row[21] or 0,
                     processed_file_path=row[22] or '',
                     epicor_json_path=row[23],
-                    raw_json_data=row[24] or '',
+                    raw_json_data=decode_json_payload(row[24]),
                     notes=row[25] or '',
                     created_at=row[26],
                     updated_at=row[27]
@@ -335,7 +336,7 @@ class MetricsDatabase:
                     missing_info_count=row[21] or 0,
                     processed_file_path=row[22] or '',
                     epicor_json_path=row[23],
-                    raw_json_data=row[24] or '',
+                    raw_json_data=decode_json_payload(row[24]),
                     notes=row[25] or '',
                     created_at=row[26],
                     updated_at=row[27]
@@ -409,7 +410,7 @@ class MetricsDatabase:
                 'validation_status': validation_status.value,
                 'processing_start_time': processing_start_time,
                 'processed_file_path': processed_file_path,
-                'raw_json_data': raw_json_data,
+                'raw_json_data': encode_json_payload(raw_json_data),
                 'notes': notes,
                 'created_at': now,
                 'updated_at': now
@@ -434,7 +435,9 @@ class MetricsDatabase:
             params = {}
             
             for key, value in kwargs.items():
-                if key == 'error_types' and isinstance(value, list):
+                if key == 'raw_json_data':
+                    value = encode_json_payload(value)
+                elif key == 'error_types' and isinstance(value, list):
                     value = json.dumps([e.value if hasattr(e, 'value') else e for e in value])
                 elif hasattr(value, 'value'):  # Enum
                     value = value.value
@@ -513,7 +516,7 @@ class MetricsDatabase:
                     missing_info_count=row[21] or 0,
                     processed_file_path=row[22] or '',
                     epicor_json_path=row[23],
-                    raw_json_data=row[24] or '',
+                    raw_json_data=decode_json_payload(row[24]),
                     notes=row[25] or '',
                     created_at=row[26],
                     updated_at=row[27]
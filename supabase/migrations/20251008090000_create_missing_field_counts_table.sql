@@ -0,0 +1,21 @@
+-- Create missing_field_counts table (replaces data/missing_fields_tracker.json)
+CREATE TABLE IF NOT EXISTS missing_field_counts (
+    field_name TEXT PRIMARY KEY,
+    count BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Atomic batch increment used by the REST API fallback
+-- Usage: POST /rest/v1/rpc/increment_missing_field_counts {"counts": {"CustNum": 2, "PONum": 1}}
+CREATE OR REPLACE FUNCTION increment_missing_field_counts(counts JSONB)
+RETURNS VOID AS $$
+BEGIN
+    INSERT INTO missing_field_counts (field_name, count, updated_at)
+    SELECT key, value::BIGINT, CURRENT_TIMESTAMP
+    FROM jsonb_each_text(counts)
+    ORDER BY key
+    ON CONFLICT (field_name) DO UPDATE SET
+        count = missing_field_counts.count + EXCLUDED.count,
+        updated_at = EXCLUDED.updated_at;
+END;
+$$ LANGUAGE plpgsql;
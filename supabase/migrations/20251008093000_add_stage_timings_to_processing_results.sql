@@ -0,0 +1,7 @@
+-- Per-stage durations and LLM call counts for each processing result
+-- Format: {"stages": {"ai_extraction": 12.3, ...}, "stage_counts": {...}, "llm_calls": {...}, "llm_tokens": {...}, "total": 41.2}
+ALTER TABLE processing_results ADD COLUMN IF NOT EXISTS stage_timings TEXT NOT NULL DEFAULT '{}';
+
+-- Dashboard percentiles read the most recent rows that have timings
+CREATE INDEX IF NOT EXISTS idx_processing_results_timed_created_at
+    ON processing_results(created_at DESC) WHERE stage_timings <> '{}';
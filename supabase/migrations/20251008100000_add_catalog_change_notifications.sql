@@ -0,0 +1,34 @@
+-- Keep updated_at current on catalog edits so workers can fetch only changed rows
+DROP TRIGGER IF EXISTS update_parts_updated_at ON parts;
+CREATE TRIGGER update_parts_updated_at
+    BEFORE UPDATE ON parts
+    FOR EACH ROW
+    EXECUTE FUNCTION update_updated_at_column();
+
+DROP TRIGGER IF EXISTS update_customers_updated_at ON customers;
+CREATE TRIGGER update_customers_updated_at
+    BEFORE UPDATE ON customers
+    FOR EACH ROW
+    EXECUTE FUNCTION update_updated_at_column();
+
+-- Tell listening app workers that a catalog table changed (one notification per statement)
+-- Payload: {"table": "parts", "op": "UPDATE"}
+CREATE OR REPLACE FUNCTION notify_catalog_changed()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('catalog_changed', json_build_object('table', TG_TABLE_NAME, 'op', TG_OP)::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS notify_parts_changed ON parts;
+CREATE TRIGGER notify_parts_changed
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON parts
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION notify_catalog_changed();
+
+DROP TRIGGER IF EXISTS notify_customers_changed ON customers;
+CREATE TRIGGER notify_customers_changed
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON customers
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION notify_catalog_changed();
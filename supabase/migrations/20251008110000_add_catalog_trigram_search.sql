@@ -0,0 +1,58 @@
+-- Trigram candidate generation for part and customer search
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Exact part lookups compare UPPER(part_number)
+CREATE INDEX IF NOT EXISTS idx_parts_part_number_upper ON parts (UPPER(part_number));
+
+-- GiST on the short part number column serves %, ILIKE and <-> (nearest part numbers)
+CREATE INDEX IF NOT EXISTS idx_parts_part_number_trgm ON parts USING gist (part_number gist_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_parts_description_trgm ON parts USING gin (description gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_customers_company_name_trgm ON customers USING gin (company_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_customers_address_trgm ON customers USING gin (address gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_customers_city_trgm ON customers USING gin (city gin_trgm_ops);
+
+-- Top-k parts: part numbers similar to / containing the query, descriptions containing it as
+-- a word, plus the nearest part numbers by trigram distance (catches typos below the % threshold)
+-- Score: part number prefix 0.9 / substring 0.7 / trigram similarity, description word similarity x0.8
+CREATE OR REPLACE FUNCTION search_parts_trgm(query TEXT, max_results INTEGER DEFAULT 10)
+RETURNS TABLE (part_number VARCHAR, description TEXT, score REAL) AS $$
+    WITH candidates AS (
+        SELECT p.id FROM parts p
+        WHERE p.part_number % query
+           OR p.part_number ILIKE '%' || query || '%'
+           OR query <% p.description
+        UNION
+        (SELECT p.id FROM parts p ORDER BY p.part_number <-> query LIMIT max_results)
+    )
+    SELECT p.part_number, p.description,
+           GREATEST(
+               CASE WHEN p.part_number ILIKE query || '%' THEN 0.9
+                    WHEN p.part_number ILIKE '%' || query || '%' THEN 0.7
+                    ELSE 0 END,
+               similarity(p.part_number, query),
+               word_similarity(query, p.description) * 0.8
+           )::REAL AS score
+    FROM parts p
+    JOIN candidates c ON c.id = p.id
+    ORDER BY score DESC, p.part_number
+    LIMIT max_results
+$$ LANGUAGE sql STABLE;
+
+-- Top-k customers by word similarity on company name, address and city
+CREATE OR REPLACE FUNCTION search_customers_trgm(query TEXT, max_results INTEGER DEFAULT 10)
+RETURNS TABLE (account_number TEXT, company_name VARCHAR, address TEXT, city VARCHAR,
+               state_prov VARCHAR, postal_code VARCHAR, country VARCHAR, score REAL) AS $$
+    SELECT c.customer_id::TEXT, c.company_name, c.address, c.city, c.state_prov, c.postal_code, c.country,
+           GREATEST(
+               word_similarity(query, c.company_name),
+               word_similarity(query, c.address) * 0.8,
+               word_similarity(query, c.city) * 0.7
+           )::REAL AS score
+    FROM customers c
+    WHERE query <% c.company_name
+       OR query <% c.address
+       OR query <% c.city
+    ORDER BY score DESC, c.company_name
+    LIMIT max_results
+$$ LANGUAGE sql STABLE;